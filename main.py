@@ -4,7 +4,10 @@ import os
 from src.retrievers.retrievers import load_config
 from src.background.streamlit_ui import (
     configure_ui, render_chat_interface, render_chat_history_with_scroll, render_model_selector,
-    safe_initialize_rag, render_file_uploader, render_sidebar_image, render_evaluation_button)
+    safe_initialize_rag, render_file_uploader, render_sidebar_image, render_evaluation_button,
+    render_pipeline_memory, render_build_status, render_query_telemetry, render_run_comparison)
+from src.retrievers.registry import pipeline_build_status
+from src.telemetry.telemetry import configure_telemetry
 from src.background.bgstyle import (render_title_and_background_buttons, apply_background_style)
 
 def main():
@@ -13,10 +16,11 @@ def main():
 
     # Cargar configuración
     config = load_config("config.yaml")
+    configure_telemetry(config)
     model_name = config.get("rag", "Modelo RAG")
 
     # Configurar la interfaz
-    configure_ui()
+    configure_ui(config)
 
     # Aplicar el estilo de fondo
     apply_background_style()
@@ -26,29 +30,32 @@ def main():
 
     # Renderizar barra lateral
     render_sidebar_image(image_path="src/background/miauc.png", caption="Modelo PinkBro")
-    render_model_selector("config.yaml")
-    render_file_uploader()
+    config = render_model_selector(config)
+    render_file_uploader(config)
     render_evaluation_button(config)
+    render_run_comparison(config)
     
     # Inicializar componentes RAG
     rag_chain, retriever, chunks = safe_initialize_rag(config)
+    render_pipeline_memory()
+    render_query_telemetry()
     if rag_chain:
         st.session_state.rag_chain = rag_chain
         st.session_state.retriever = retriever
         st.session_state.chunks = chunks
 
-    # Inicializar historial de chat si no existe
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-
-    # Renderizar historial de chat (una sola vez)
+    # Renderizar la página visible del historial de chat (una sola vez por rerun)
     render_chat_history_with_scroll()
 
+    # Mostrar el avance de los índices mientras se construyen en segundo plano
+    if any(stats.get("status") not in ("ready", "error") for stats in pipeline_build_status().values()):
+        render_build_status(config["rag"])
+
     # Renderizar interfaz de entrada de chat
     if rag_chain:
         render_chat_interface()
     else:
-        st.warning("El modelo no está disponible.")
+        st.info("El modelo se está construyendo; el chat se habilitará apenas haya una parte del corpus indexada.")
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,66 @@
 import streamlit as st
-import yaml
 import os
-from src.retrievers.retrievers import initialize_rag
-from src.chunking.chunking import show_chunks_streamlit
+from collections import deque
+from src.ingestion.ingestion import get_ingestion_queue
+from src.retrievers.registry import (
+    start_pipeline_builds, get_pipeline, pipeline_build_status, pipeline_memory_report)
 from src.evaluation.evaluation import evaluate_and_save_results
+from src.telemetry.telemetry import invoke_with_telemetry, telemetry_summary
+from src.run_store.run_store import (list_runs, compare_runs, load_run_results, export_to_excel, list_chunk_snapshots,
+                                    load_chunks)
 
 
-def configure_ui():
-    """Configura la interfaz inicial de Streamlit, incluyendo el historial de chat."""
+def configure_ui(config=None):
+    """
+    Configura la interfaz inicial de Streamlit, incluyendo el historial de chat y su archivo compactado.
+
+    Args:
+        config (dict, opcional): Configuración cargada; "chat_archive_max_messages" fija el tamaño del archivo.
+            Por defecto se usa la configuración de la sesión.
+    """
+    config = config if config is not None else st.session_state.get("config", {})
     if "chat_history" not in st.session_state:
         st.session_state["chat_history"] = []
-        
+    if "chat_archive" not in st.session_state:
+        st.session_state["chat_archive"] = deque(maxlen=config.get("chat_archive_max_messages", 500))
+    if "chat_history_page" not in st.session_state:
+        st.session_state["chat_history_page"] = 0
+
+def append_chat_message(sender, message):
+    """
+    Agrega un mensaje al historial y compacta los más antiguos para que la memoria de la sesión quede acotada.
+
+    Los mensajes que exceden "chat_history_max_messages" pasan al archivo de la sesión, un deque de tamaño
+    "chat_archive_max_messages" que guarda solo los primeros "chat_archive_message_chars" caracteres de cada uno.
+
+    Args:
+        sender (str): "user" o "bot".
+        message (str): Texto del mensaje.
+    """
+    config = st.session_state.get("config", {})
+    configure_ui(config)
+    history = st.session_state["chat_history"]
+    history.append({"sender": sender, "message": message})
+
+    max_messages = config.get("chat_history_max_messages", 100)
+    max_chars = config.get("chat_archive_message_chars", 300)
+    if len(history) > max_messages:
+        overflow = len(history) - max_messages
+        for entry in history[:overflow]:
+            text = entry["message"]
+            st.session_state["chat_archive"].append({
+                "sender": entry["sender"],
+                "message": text if len(text) <= max_chars else text[:max_chars] + "…",
+            })
+        del history[:overflow]
+
+def render_chat_message(entry):
+    """Renderiza un mensaje del historial."""
+    if entry["sender"] == "user":
+        st.markdown(f"👤 **Tú**: {entry['message']}")
+    elif entry["sender"] == "bot":
+        st.markdown(f"🤖 **Bot**: {entry['message']}")
+
 def process_user_query():
     """
     Procesa la consulta del usuario y actualiza el historial.
@@ -27,74 +77,168 @@ def process_user_query():
         return
 
     # Generar respuesta usando el modelo RAG
-    response = rag_chain.invoke(query)
+    response = invoke_with_telemetry(rag_chain, query, source="chat", rag=config.get("rag"))
     model_used = config.get("rag", "Desconocido")  # Determina el modelo (naive o super)
 
     # Actualizar el historial
-    st.session_state["chat_history"].append({
-        "question": query,
-        "response": response,
-        "model": model_used  # Agrega el modelo usado
-    })
+    append_chat_message("user", query)
+    append_chat_message("bot", f"{response} ({model_used})")
 
     # Limpiar el campo de entrada
     st.session_state["query"] = ""
 
-    # Renderizar historial actualizado
-    render_chat_history_with_scroll()
+def render_model_selector(config):
+    """
+    Renderiza un selector de modelo (super o naive) para la sesión actual.
+
+    La selección se guarda en session_state y no modifica el archivo de configuración compartido.
 
-def render_model_selector(config_path="config.yaml"):
-    """Renderiza un selector de modelo (super o naive) y actualiza el archivo de configuración."""
+    Args:
+        config (dict): Configuración cargada; su clave "rag" es el modelo por defecto de las sesiones nuevas.
+
+    Returns:
+        dict: Copia de la configuración con la clave "rag" de la sesión.
+    """
     st.sidebar.markdown("### Selección de Modelo")
-    with open(config_path, "r") as file:
-        config = yaml.safe_load(file)
+    if "rag" not in st.session_state:
+        st.session_state["rag"] = config.get("rag", "super")
 
     selected_model = st.sidebar.radio(
         "Selecciona el modelo RAG a utilizar:",
         options=["super", "naive"],
-        index=0 if config.get("rag") == "super" else 1,
+        index=0 if st.session_state["rag"] == "super" else 1,
     )
-
-    if selected_model != config.get("rag"):
-        config["rag"] = selected_model
-        with open(config_path, "w") as file:
-            yaml.safe_dump(config, file)
-        st.success(f"Configuración actualizada: ahora se usa el modelo '{selected_model}'.")
+    st.session_state["rag"] = selected_model
+    session_config = {**config, "rag": selected_model}
+    st.session_state["config"] = session_config
+    return session_config
 
 def safe_initialize_rag(config):
-    """Inicializa los componentes RAG de manera segura y los almacena en session_state."""
-    if "rag_chain" not in st.session_state:
-        try:
-            rag_chain, retriever, chunks = initialize_rag(config)
-            st.session_state["rag_chain"] = rag_chain
-            st.session_state["retriever"] = retriever
-            st.session_state["chunks"] = chunks
-            st.success("Modelo RAG cargado exitosamente.")
-        except Exception as e:
-            st.error(f"Error al cargar el modelo RAG: {e}")
-            st.session_state["rag_chain"] = None
-            st.session_state["retriever"] = None
-            st.session_state["chunks"] = []
+    """
+    Asocia la sesión al pipeline RAG residente seleccionado sin bloquear la interfaz.
+
+    Ambos pipelines se construyen una sola vez por proceso en segundo plano; la sesión adopta la versión parcial
+    apenas existe y la reemplaza por la final cuando termina la construcción.
+    """
+    start_pipeline_builds(config, first=config["rag"])
+    rag_type = config["rag"]
+    pipeline = get_pipeline(rag_type)
+
+    if pipeline["status"] in ("partial", "ready"):
+        if (st.session_state.get("active_rag"), st.session_state.get("active_version")) != (rag_type, pipeline["version"]):
+            st.session_state["rag_chain"] = pipeline["rag_chain"]
+            st.session_state["retriever"] = pipeline["retriever"]
+            st.session_state["chunks"] = pipeline["chunks"]
+            st.session_state["active_rag"] = rag_type
+            st.session_state["active_version"] = pipeline["version"]
+    else:
+        if pipeline["status"] == "error":
+            st.error(f"Error al cargar el modelo RAG: {pipeline.get('error')}")
+        st.session_state["rag_chain"] = None
+        st.session_state["retriever"] = None
+        st.session_state["chunks"] = []
+        st.session_state["active_rag"] = None
+        st.session_state["active_version"] = None
     return (
         st.session_state.get("rag_chain"),
         st.session_state.get("retriever"),
         st.session_state.get("chunks"),
     )
 
+@st.fragment(run_every=2)
+def render_build_status(rag_type):
+    """
+    Muestra el avance de la construcción de los índices y refresca la página cuando el pipeline de la sesión
+    publica una nueva versión (parcial o final).
+
+    Args:
+        rag_type (str): Pipeline seleccionado en la sesión.
+    """
+    status = pipeline_build_status()
+    for name, stats in status.items():
+        if stats.get("status") in ("building", "partial"):
+            label = "consultable, " if stats["status"] == "partial" else ""
+            st.progress(stats.get("progress", 0.0), text=f"Índice '{name}' ({label}{stats.get('stage', '')})")
+        elif stats.get("status") == "pending":
+            st.caption(f"Índice '{name}': en cola")
+
+    pipeline = get_pipeline(rag_type)
+    if pipeline.get("version") != st.session_state.get("active_version"):
+        st.rerun()
+
+def render_pipeline_memory():
+    """Muestra en la barra lateral la memoria usada por los índices residentes."""
+    report = pipeline_memory_report()
+    st.sidebar.markdown("### Memoria de los índices")
+    for rag_type, stats in report.items():
+        if rag_type == "process":
+            st.sidebar.caption(f"RSS del proceso: {stats['rss_bytes'] / 2**20:.0f} MiB")
+        elif stats.get("status") == "ready":
+            text = (f"{stats['text_bytes'] / 2**20:.1f} MiB de texto" if "text_bytes" in stats
+                    else "texto leído desde el almacén")
+            st.sidebar.caption(
+                f"{rag_type}: {stats['num_chunks']} fragmentos, {text}, +{stats['rss_delta_bytes'] / 2**20:.0f} MiB RSS "
+                f"(pico {stats['peak_rss_bytes'] / 2**20:.0f} MiB, estable {stats['steady_rss_bytes'] / 2**20:.0f} MiB)"
+            )
+        else:
+            st.sidebar.caption(f"{rag_type}: {stats.get('status')}")
+
+def render_query_telemetry():
+    """
+    Muestra en la barra lateral los percentiles p50/p95 de latencia y tokens de las consultas recientes.
+    """
+    summary = telemetry_summary()
+    if not summary:
+        return
+
+    labels = {
+        "total_ms": "Latencia total (ms)",
+        "embedding_ms": "Embedding de la consulta (ms)",
+        "search_ms": "Búsqueda (ms)",
+        "llm_ms": "LLM (ms)",
+        "prompt_tokens": "Tokens de prompt",
+        "completion_tokens": "Tokens de respuesta",
+        "retrieved_chunks": "Chunks recuperados",
+        "retrieved_chars": "Caracteres recuperados",
+    }
+    with st.sidebar.expander("Telemetría de consultas"):
+        for field, label in labels.items():
+            if field in summary:
+                stats = summary[field]
+                st.write(f"{label}: p50 {stats['p50']:.0f} · p95 {stats['p95']:.0f} (n={stats['count']})")
+
 def render_chat_history_with_scroll():
     """
-    Renderiza el historial de chat en un formato conversacional con íconos.
+    Renderiza una página del historial de chat en un formato conversacional con íconos.
+
+    Solo se dibujan los últimos "chat_history_window" mensajes (o la página anterior elegida), sumando los mensajes
+    vivos y los compactados del archivo, de modo que el costo por rerun no crece con la sesión.
     Muestra un mensaje inicial solo si el historial está vacío.
     """
+    configure_ui()
     st.markdown("### Historial de Chat")
-    if "chat_history" in st.session_state and st.session_state.chat_history:
-        for entry in st.session_state.chat_history:
-            if entry["sender"] == "user":
-                st.markdown(f"👤 **Tú**: {entry['message']}")
-            elif entry["sender"] == "bot":
-                st.markdown(f"🤖 **Bot**: {entry['message']}")
-    else:
+    archive = st.session_state["chat_archive"]
+    history = st.session_state["chat_history"]
+    total = len(archive) + len(history)
+    if not total:
         st.markdown("No hay historial de chat disponible.")  # Solo aparece si está vacío
+        return
+
+    window = st.session_state.get("config", {}).get("chat_history_window", 20)
+    pages = -(-total // window)
+    page = min(st.session_state["chat_history_page"], pages - 1)
+
+    if pages > 1:
+        older, position, newer = st.columns([1, 2, 1])
+        if older.button("◀ Anteriores", disabled=page >= pages - 1):
+            st.session_state["chat_history_page"] = page = page + 1
+        if newer.button("Recientes ▶", disabled=page == 0):
+            st.session_state["chat_history_page"] = page = page - 1
+        position.caption(f"Página {page + 1} de {pages} · {total} mensajes ({len(archive)} compactados)")
+
+    end = total - page * window
+    for index in range(max(end - window, 0), end):
+        render_chat_message(archive[index] if index < len(archive) else history[index - len(archive)])
 
             
 def render_chat_interface():
@@ -105,15 +249,10 @@ def render_chat_interface():
     # Entrada del usuario
     user_input = st.chat_input("Escribe tu mensaje...")  # Entrada interactiva del usuario
     if user_input:
-        # Inicializar el historial si no existe
-        if "chat_history" not in st.session_state:
-            st.session_state.chat_history = []
-
-        # Agregar la pregunta al historial
-        st.session_state.chat_history.append({"sender": "user", "message": user_input})
-
-        # Renderizar el historial inmediatamente con la pregunta añadida
-        render_chat_history_with_scroll()
+        # Agregar la pregunta al historial y mostrar solo el mensaje nuevo; el resto ya se dibujó en `main`
+        append_chat_message("user", user_input)
+        st.session_state["chat_history_page"] = 0
+        render_chat_message({"sender": "user", "message": user_input})
 
         # Crear un marcador temporal para la respuesta del bot
         bot_response_placeholder = st.empty()
@@ -121,12 +260,13 @@ def render_chat_interface():
 
         # Generar la respuesta del modelo
         try:
-            response = st.session_state.rag_chain.invoke(user_input)
+            response = invoke_with_telemetry(st.session_state.rag_chain, user_input, source="chat",
+                                             rag=st.session_state.get("active_rag"))
         except Exception as e:
             response = f"Error al generar respuesta: {e}"
 
         # Agregar la respuesta al historial
-        st.session_state.chat_history.append({"sender": "bot", "message": response})
+        append_chat_message("bot", response)
 
         # Actualizar el marcador con la respuesta final
         bot_response_placeholder.markdown(f"🤖 **Bot**: {response}")
@@ -146,6 +286,7 @@ def render_evaluation_button(config):
                     st.session_state.rag_chain,
                     st.session_state.retriever,
                     config,
+                    chunks=st.session_state.get("chunks"),
                 )
                 st.markdown("### Resultados de la evaluación")
                 st.dataframe(evaluation_results)
@@ -155,6 +296,72 @@ def render_evaluation_button(config):
             st.warning("El modelo no está disponible para evaluación.")
 
 
+def render_chunk_snapshots(config, db_path):
+    """
+    Permite recorrer los fragmentos guardados de cada construcción de pipeline, por ventanas y filtrando por título.
+
+    Args:
+        config (dict): Configuración con la clave opcional "show_chunks" (fragmentos por ventana, por defecto 3).
+        db_path (str): Ruta del almacén de corridas.
+    """
+    snapshots = list_chunk_snapshots(db_path)
+    if snapshots.empty:
+        return
+
+    with st.expander("Fragmentos indexados"):
+        labels = {
+            snapshot_id: f"#{snapshot_id} · {rag} · {created_at} · {num_chunks} fragmentos"
+            for snapshot_id, rag, created_at, num_chunks in snapshots[["snapshot_id", "rag", "created_at", "num_chunks"]].itertuples(index=False)
+        }
+        snapshot_id = st.selectbox("Instantánea", list(labels), format_func=labels.get)
+        num_chunks = int(snapshots.set_index("snapshot_id").loc[snapshot_id, "num_chunks"])
+        show_chunks = config.get("show_chunks", 3)
+        title = st.text_input("Filtrar por título", key="chunk_snapshot_title")
+        # Por defecto se muestran los últimos fragmentos, como antes de guardar la lista completa.
+        offset = st.number_input("Desde la posición", min_value=0, max_value=max(num_chunks - 1, 0),
+                                 value=max(num_chunks - show_chunks, 0), key=f"chunk_snapshot_offset_{snapshot_id}")
+        st.dataframe(load_chunks(db_path, snapshot_id, int(offset), show_chunks, title or None))
+
+def render_run_comparison(config):
+    """
+    Permite recorrer los fragmentos guardados, elegir corridas de evaluación, comparar sus métricas y parámetros,
+    y exportarlas a Excel.
+
+    Args:
+        config (dict): Configuración con las claves opcionales "run_store_path" y "show_chunks".
+    """
+    db_path = config.get("run_store_path", "data/runs.sqlite")
+    if not os.path.exists(db_path):
+        return
+
+    render_chunk_snapshots(config, db_path)
+    runs = list_runs(db_path)
+    if runs.empty:
+        return
+
+    with st.expander("Comparar corridas de evaluación"):
+        labels = {
+            run_id: f"#{run_id} · {rag} · {created_at} · {config_hash}"
+            for run_id, rag, created_at, config_hash in runs[["run_id", "rag", "created_at", "config_hash"]].itertuples(index=False)
+        }
+        selected = st.multiselect("Corridas", list(labels), default=list(labels)[:2], format_func=labels.get)
+        if not selected:
+            return
+
+        metrics, differing = compare_runs(db_path, selected)
+        st.markdown("**Promedio de métricas por corrida**")
+        st.dataframe(metrics.style.format("{:.3f}"))
+        if not differing.empty:
+            st.markdown("**Parámetros que difieren**")
+            st.dataframe(differing)
+
+        st.download_button(
+            "Exportar a Excel",
+            data=export_to_excel({"metricas": metrics, "parametros": differing,
+                                  "resultados": load_run_results(db_path, selected)}),
+            file_name=f"corridas_{'_'.join(map(str, selected))}.xlsx",
+        )
+
 def render_sidebar_image(image_path="background/miauc.png", caption="Modelo RAG"):
     """
     Renderiza una imagen en la barra lateral con un título opcional.
@@ -169,11 +376,12 @@ def render_sidebar_image(image_path="background/miauc.png", caption="Modelo RAG"
         use_container_width=True,
     )
     
-def render_file_uploader(upload_folder="../practicos-rag/data"):
+def render_file_uploader(config, upload_folder="../practicos-rag/data"):
     """
-    Renderiza la bandeja de carga de archivos en la barra lateral y gestiona la subida de archivos.
+    Renderiza la bandeja de carga de archivos en la barra lateral y encola los archivos para indexarlos en vivo.
     
     Args:
+        config (dict): Configuración del proyecto, usada por la cola de ingesta.
         upload_folder (str): Ruta donde se guardarán los archivos subidos.
     """
     st.sidebar.header("Subir documentos")
@@ -182,18 +390,58 @@ def render_file_uploader(upload_folder="../practicos-rag/data"):
         type=["pdf", "txt", "docx"],
         accept_multiple_files=True,
     )
-
-    # Crear la carpeta si no existe
-    if not os.path.exists(upload_folder):
-        os.makedirs(upload_folder)
+    queue = get_ingestion_queue(config, upload_folder)
 
     # Botón para subir archivos
     if st.sidebar.button("Subir documentos"):
         if uploaded_files:
             for uploaded_file in uploaded_files:
-                file_path = os.path.join(upload_folder, uploaded_file.name)
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-            st.sidebar.success(f"Se subieron {len(uploaded_files)} archivo(s) correctamente a '{upload_folder}'.")
+                queue.submit(uploaded_file.name, uploaded_file.getvalue())
+            st.sidebar.success(f"Se encolaron {len(uploaded_files)} archivo(s) para indexar.")
         else:
-            st.sidebar.warning("No se seleccionaron archivos para cargar.")
\ No newline at end of file
+            st.sidebar.warning("No se seleccionaron archivos para cargar.")
+
+    if queue.status():
+        with st.sidebar:
+            render_ingestion_status(queue)
+
+def render_ingestion_status(queue):
+    """
+    Muestra el estado de los trabajos de ingesta y se actualiza solo mientras haya trabajos en curso; con la cola
+    vacía se dibuja una vez, sin refresco periódico.
+
+    Args:
+        queue (IngestionQueue): Cola de ingesta compartida.
+    """
+    if queue.has_pending_jobs():
+        poll_ingestion_status(queue)
+    else:
+        show_ingestion_jobs(queue)
+
+@st.fragment(run_every=2)
+def poll_ingestion_status(queue):
+    """
+    Refresca el estado de la ingesta cada 2 segundos. Cuando ya no quedan trabajos en curso, vuelve a ejecutar la
+    página completa: `render_ingestion_status` deja de llamar a este fragmento y el refresco se detiene.
+
+    Args:
+        queue (IngestionQueue): Cola de ingesta compartida.
+    """
+    show_ingestion_jobs(queue)
+    if not queue.has_pending_jobs():
+        st.rerun()
+
+def show_ingestion_jobs(queue):
+    """
+    Muestra el estado de cada trabajo de ingesta.
+
+    Args:
+        queue (IngestionQueue): Cola de ingesta compartida.
+    """
+    st.markdown("### Ingesta de documentos")
+    for job in queue.status():
+        detail = f"{job['chunks']} fragmentos" if job["status"] == "listo" else job.get("error", "")
+        duplicates = sum(len(duplicate_map) for duplicate_map in job.get("duplicate_map", {}).values())
+        if duplicates:
+            detail += f", {duplicates} casi duplicados descartados"
+        st.caption(f"{job['filename']}: {job['status']} ({job['seconds']}s) {detail}")
@@ -0,0 +1 @@
+# A placeholder file to make the directory a package
\ No newline at end of file
@@ -0,0 +1,256 @@
+import os
+import json
+import math
+import time
+import logging
+import argparse
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import pandas as pd
+import psutil
+
+from src.benchmark.synthetic_corpus import generate_synthetic_corpus
+from src.chunking.chunking import load_pdf_all_documents, combine_sentences, assign_metadata_to_chunks_with_context
+from src.chunking.segmenter import split_sentences
+from src.embedding.embedding import calculate_cosine_distances, split_into_chunks, split_into_chunks_bounded
+from src.loaders.loaders import load_pdf, split_pdf_documents
+from src.retrievers.retrievers import remove_duplicate_chunks, load_config
+from src.telemetry.memory import PeakMemorySampler
+from src.vector_store_client.vector_store_client import create_qdrant_store, create_qdrant_store_naive
+
+
+SUPERLINEAR_EXPONENT = 1.2
+
+
+@contextmanager
+def measure_stage(rows: List[Dict], path: str, scale: int, stage: str) -> Iterator[Dict]:
+    """
+    Mide el tiempo y el pico de RSS de una etapa y agrega una fila a `rows`.
+
+    El bloque debe completar en la fila devuelta las claves "pages", "sentences" o "chunks" que procesó.
+
+    Args:
+        rows (List[Dict]): Resultados acumulados.
+        path (str): "super" o "naive".
+        scale (int): Escala del corpus.
+        stage (str): Nombre de la etapa.
+
+    Yields:
+        Dict: Fila de la etapa.
+    """
+    row = {"path": path, "scale": scale, "stage": stage}
+    start_rss = psutil.Process().memory_info().rss
+    start = time.perf_counter()
+    with PeakMemorySampler() as sampler:
+        yield row
+    row["seconds"] = time.perf_counter() - start
+    row["peak_rss_mb"] = sampler.peak / 2**20
+    row["peak_delta_mb"] = (sampler.peak - start_rss) / 2**20
+    for unit in ("pages", "sentences", "chunks"):
+        if unit in row:
+            row[f"{unit}_per_second"] = row[unit] / max(row["seconds"], 1e-9)
+    rows.append(row)
+    logging.info(f"[{path} x{scale}] {stage}: {row['seconds']:.2f} s, pico {row['peak_rss_mb']:.0f} MB")
+
+def benchmark_super_path(directory: str, scale: int, config: dict) -> List[Dict]:
+    """
+    Mide cada etapa del pipeline "super" de `initialize_rag` sobre una carpeta de PDFs.
+
+    Args:
+        directory (str): Carpeta con los volúmenes PDF.
+        scale (int): Escala del corpus, solo para identificar las filas.
+        config (dict): Configuración del pipeline.
+
+    Returns:
+        List[Dict]: Una fila por etapa.
+    """
+    rows = list()
+    model_name = config["model_name"]
+    with measure_stage(rows, "super", scale, "load") as row:
+        pdf_texts = load_pdf_all_documents(directory)
+        row["pages"] = len(pdf_texts)
+    with measure_stage(rows, "super", scale, "segment") as row:
+        sentences = combine_sentences(split_sentences(pdf_texts, config), config["buffer_size"])
+        row["pages"], row["sentences"] = len(pdf_texts), len(sentences)
+    with measure_stage(rows, "super", scale, "embed_sentences") as row:
+        distances = calculate_cosine_distances(sentences, model_name, config.get("embedding_backend", "torch"),
+                                               config.get("embedding_workers", 1),
+                                               num_threads=config.get("onnx_num_threads"))
+        row["sentences"] = len(sentences)
+    with measure_stage(rows, "super", scale, "chunk") as row:
+        if config.get("chunk_mode", "semantic") == "bounded":
+            chunks = split_into_chunks_bounded(sentences, distances, config["threshold"], model_name,
+                                               config.get("min_chunk_tokens"), config.get("max_chunk_tokens"))
+        else:
+            chunks = split_into_chunks(sentences, distances, config["threshold"])
+        row["sentences"], row["chunks"] = len(sentences), len(chunks)
+    with measure_stage(rows, "super", scale, "metadata") as row:
+        chunks = assign_metadata_to_chunks_with_context(chunks, config["max_previous_chunks"])
+        row["chunks"] = len(chunks)
+    with measure_stage(rows, "super", scale, "dedup") as row:
+        chunks, _ = remove_duplicate_chunks(chunks, [chunk["chunk_text"] for chunk in chunks], config)
+        row["chunks"] = len(chunks)
+    with measure_stage(rows, "super", scale, "index") as row:
+        create_qdrant_store(model_name, chunks, config.get("embedding_backend", "torch"),
+                            config.get("embedding_workers", 1), config.get("index_batch_size", 256),
+                            collection_name=f"benchmark_x{scale}", num_threads=config.get("onnx_num_threads"))
+        row["chunks"] = len(chunks)
+    return rows
+
+def benchmark_naive_path(directory: str, scale: int, config: dict) -> List[Dict]:
+    """
+    Mide cada etapa del pipeline "naive" de `initialize_rag` sobre todos los PDFs de una carpeta.
+
+    Args:
+        directory (str): Carpeta con los volúmenes PDF.
+        scale (int): Escala del corpus, solo para identificar las filas.
+        config (dict): Configuración del pipeline.
+
+    Returns:
+        List[Dict]: Una fila por etapa.
+    """
+    rows = list()
+    with measure_stage(rows, "naive", scale, "load") as row:
+        docs = [doc for filename in sorted(os.listdir(directory)) if filename.lower().endswith(".pdf")
+                for doc in load_pdf(os.path.join(directory, filename))]
+        row["pages"] = len(docs)
+    with measure_stage(rows, "naive", scale, "split") as row:
+        chunks = split_pdf_documents(docs)
+        row["pages"], row["chunks"] = len(docs), len(chunks)
+    with measure_stage(rows, "naive", scale, "dedup") as row:
+        chunks, _ = remove_duplicate_chunks(chunks, [chunk.page_content for chunk in chunks], config)
+        row["chunks"] = len(chunks)
+    # Colección temporal para no mezclar el benchmark con el índice de la aplicación; la carpeta se borra al
+    # terminar para que las corridas repetidas a gran escala no llenen el disco.
+    with tempfile.TemporaryDirectory(prefix="rag_benchmark_") as storage_path:
+        with measure_stage(rows, "naive", scale, "index") as row:
+            store = create_qdrant_store_naive(config["model_name"], chunks, config.get("embedding_backend", "torch"),
+                                              config.get("embedding_workers", 1), config.get("index_batch_size", 256),
+                                              collection_name=f"benchmark_x{scale}", storage_path=storage_path,
+                                              num_threads=config.get("onnx_num_threads"))
+            row["chunks"] = len(chunks)
+        # El cliente local mantiene abiertos los archivos de la colección; se cierra antes de borrar la carpeta.
+        store.client.close()
+    return rows
+
+def scaling_exponents(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Estima, para cada etapa, el exponente de crecimiento del tiempo entre escalas consecutivas:
+    1 es lineal y valores sobre `SUPERLINEAR_EXPONENT` se marcan como superlineales.
+
+    Args:
+        results (pd.DataFrame): Filas de `run_ingestion_benchmark`.
+
+    Returns:
+        pd.DataFrame: Una fila por etapa y escala con "exponent" y "superlinear".
+    """
+    rows = list()
+    for (path, stage), group in results.groupby(["path", "stage"], sort=False):
+        group = group.sort_values("scale").to_dict("records")
+        for base, row in zip(group, group[1:]):
+            exponent = (math.log(max(row["seconds"], 1e-6) / max(base["seconds"], 1e-6))
+                        / math.log(row["scale"] / base["scale"]))
+            rows.append({"path": path, "stage": stage, "scale": row["scale"], "exponent": exponent,
+                         "superlinear": exponent > SUPERLINEAR_EXPONENT})
+    return pd.DataFrame(rows)
+
+def compare_with_baselines(results: pd.DataFrame, baselines_file: str, tolerance: float = 0.25) -> pd.DataFrame:
+    """
+    Compara los segundos por página de cada etapa contra las líneas base guardadas.
+
+    Args:
+        results (pd.DataFrame): Filas de `run_ingestion_benchmark`.
+        baselines_file (str): Archivo JSON de líneas base.
+        tolerance (float): Empeoramiento relativo permitido antes de marcar una regresión.
+
+    Returns:
+        pd.DataFrame: Resultados con "baseline_seconds" y "regression"; vacío si no hay líneas base.
+    """
+    if not os.path.exists(baselines_file):
+        return pd.DataFrame()
+    with open(baselines_file, "r") as file:
+        baselines = json.load(file)
+
+    rows = list()
+    for _, row in results.iterrows():
+        baseline = baselines.get(f"{row['path']}/{row['stage']}/x{row['scale']}")
+        if baseline is None:
+            continue
+        rows.append({"path": row["path"], "stage": row["stage"], "scale": row["scale"], "seconds": row["seconds"],
+                     "baseline_seconds": baseline["seconds"],
+                     "regression": row["seconds"] > baseline["seconds"] * (1 + tolerance)})
+    return pd.DataFrame(rows)
+
+def save_baselines(results: pd.DataFrame, baselines_file: str) -> None:
+    """
+    Guarda los tiempos y el pico de memoria de cada etapa como líneas base.
+
+    Args:
+        results (pd.DataFrame): Filas de `run_ingestion_benchmark`.
+        baselines_file (str): Archivo JSON de líneas base; se actualizan solo las etapas medidas.
+    """
+    baselines = dict()
+    if os.path.exists(baselines_file):
+        with open(baselines_file, "r") as file:
+            baselines = json.load(file)
+    for _, row in results.iterrows():
+        baselines[f"{row['path']}/{row['stage']}/x{row['scale']}"] = {
+            "seconds": float(row["seconds"]),
+            "peak_rss_mb": float(row["peak_rss_mb"]),
+        }
+    with open(baselines_file, "w") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+
+def run_ingestion_benchmark(config: dict, scales: List[int], paths: List[str], corpus_dir: str) -> pd.DataFrame:
+    """
+    Genera (o reutiliza) los corpus sintéticos y mide cada etapa de ingesta de los pipelines indicados.
+
+    Args:
+        config (dict): Configuración del pipeline.
+        scales (List[int]): Escalas del corpus (1, 10, 100...).
+        paths (List[str]): Pipelines a medir, "super" y/o "naive".
+        corpus_dir (str): Carpeta de los corpus sintéticos.
+
+    Returns:
+        pd.DataFrame: Una fila por pipeline, escala y etapa.
+    """
+    directories = generate_synthetic_corpus(corpus_dir, tuple(scales))
+    runners = {"super": benchmark_super_path, "naive": benchmark_naive_path}
+    rows = list()
+    for scale in scales:
+        for path in paths:
+            rows += runners[path](directories[scale], scale, config)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Benchmark de ingesta sobre corpus sintéticos con estructura de CFR.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--paths", nargs="+", default=["naive", "super"], choices=["naive", "super"])
+    parser.add_argument("--corpus-dir", default="data/synthetic")
+    parser.add_argument("--baselines", default="benchmark_baselines.json")
+    parser.add_argument("--update-baselines", action="store_true")
+    args = parser.parse_args()
+
+    config = load_config("config.yaml")
+    results = run_ingestion_benchmark(config, args.scales, args.paths, args.corpus_dir)
+    pd.set_option("display.width", 200)
+    print(results.to_string(index=False))
+
+    exponents = scaling_exponents(results)
+    if not exponents.empty:
+        print(exponents.to_string(index=False))
+        for _, row in exponents[exponents["superlinear"]].iterrows():
+            logging.warning(f"Etapa superlineal: {row['path']}/{row['stage']} x{row['scale']} (exponente {row['exponent']:.2f})")
+
+    comparison = compare_with_baselines(results, args.baselines)
+    if not comparison.empty:
+        print(comparison.to_string(index=False))
+        for _, row in comparison[comparison["regression"]].iterrows():
+            logging.warning(f"Regresión: {row['path']}/{row['stage']} x{row['scale']} "
+                            f"{row['seconds']:.2f} s contra {row['baseline_seconds']:.2f} s")
+    if args.update_baselines:
+        save_baselines(results, args.baselines)
@@ -0,0 +1,154 @@
+import os
+import random
+import logging
+import argparse
+import textwrap
+from typing import Dict, List, Tuple
+
+
+BASE_PAGES = 55
+LINES_PER_PAGE = 60
+CHARS_PER_LINE = 95
+
+SUBJECTS = [
+    "food additives", "dietary supplements", "infant formula", "color additives", "nutrition labeling",
+    "food packaging materials", "bottled water", "low-acid canned foods", "seafood processing", "dairy products",
+    "medical gases", "food contact substances", "acidified foods", "sanitation controls", "allergen labeling",
+]
+ACTORS = ["The manufacturer", "Each facility", "The owner or operator", "The Commissioner", "A distributor",
+          "The applicant", "Each packer", "The importer", "The responsible person", "A processor"]
+OBLIGATIONS = ["shall maintain written records of", "must establish and implement procedures for",
+               "shall submit to the Food and Drug Administration a report on", "may request an exemption from",
+               "shall ensure adequate controls over", "must verify, at least annually, the effectiveness of",
+               "shall not introduce into interstate commerce any product lacking", "shall document the review of"]
+CONDITIONS = ["unless otherwise provided in this part", "as defined in section 201(s) of the act (21 U.S.C. 321(s))",
+              "e.g., by visual inspection or laboratory analysis", "in accordance with good manufacturing practice",
+              "within 30 calendar days after the date of receipt", "except as provided in paragraph (c) of this section",
+              "i.e., the quantity expressed in metric units", "consistent with Pub. L. 111-353, 124 Stat. 3885",
+              "subject to the requirements of Sec. 10 of this chapter", "and such records shall be retained for 2 years"]
+HEADINGS = ["Definitions", "Scope", "Applicability", "General requirements", "Records and reports",
+            "Labeling requirements", "Exemptions", "Specifications", "Conditions of use", "Petitions",
+            "Recordkeeping", "Inspection", "Sampling and testing", "Corrective actions", "Registration"]
+
+
+def _sentence(rng: random.Random, section: str) -> str:
+    """Genera una oración de estilo regulatorio con citas y abreviaturas."""
+    sentence = f"{rng.choice(ACTORS)} {rng.choice(OBLIGATIONS)} {rng.choice(SUBJECTS)}, {rng.choice(CONDITIONS)}"
+    if rng.random() < 0.3:
+        sentence += f", as required under § {section}({rng.choice('abcde')})"
+    return sentence + "."
+
+def generate_regulation_text(num_pages: int, seed: int = 0, first_part: int = 100) -> List[str]:
+    """
+    Genera páginas de texto con estructura de CFR: encabezados PART, Subpart y § que reconoce `extract_metadata`,
+    párrafos numerados, citas y abreviaturas.
+
+    Args:
+        num_pages (int): Número de páginas a generar.
+        seed (int): Semilla para que el corpus sea reproducible.
+        first_part (int): Número de la primera PART.
+
+    Returns:
+        List[str]: Texto de cada página, con líneas de largo fijo.
+    """
+    rng = random.Random(seed)
+    lines = list()
+    part = first_part
+    target_lines = num_pages * LINES_PER_PAGE
+
+    while len(lines) < target_lines:
+        part += 1
+        lines += ["", f"PART {part}—{rng.choice(SUBJECTS).upper()}", ""]
+        for subpart in "ABCD"[:rng.randint(2, 4)]:
+            lines += [f"Subpart {subpart}—{rng.choice(HEADINGS)}", ""]
+            for number in range(rng.randint(3, 6)):
+                section = f"{part}.{(ord(subpart) - 65) * 20 + number + 1}"
+                lines.append(f"§ {section} {rng.choice(HEADINGS)}.")
+                for label in "abcd"[:rng.randint(2, 4)]:
+                    paragraph = f"({label}) " + " ".join(_sentence(rng, section) for _ in range(rng.randint(2, 5)))
+                    if rng.random() < 0.4:
+                        paragraph += " " + " ".join(f"({item}) {_sentence(rng, section)}" for item in range(1, rng.randint(2, 4)))
+                    lines += textwrap.wrap(paragraph, CHARS_PER_LINE)
+                lines.append("")
+
+    lines = lines[:target_lines]
+    return ["\n".join(lines[start:start + LINES_PER_PAGE]) for start in range(0, target_lines, LINES_PER_PAGE)]
+
+def _pdf_string(line: str) -> bytes:
+    """Codifica una línea como cadena literal de PDF en WinAnsi (incluye § y —)."""
+    encoded = line.encode("cp1252", errors="replace")
+    return b"(" + encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+def write_text_pdf(pages: List[str], file_path: str) -> None:
+    """
+    Escribe un PDF mínimo con una página por texto, usando Helvetica con codificación WinAnsi.
+
+    Args:
+        pages (List[str]): Texto de cada página; cada línea se escribe tal cual.
+        file_path (str): Ruta del PDF a crear.
+    """
+    num_pages = len(pages)
+    page_ids = [4 + 2 * i for i in range(num_pages)]
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids) + b"] /Count %d >>" % num_pages,
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    for page_id, page in zip(page_ids, pages):
+        stream = b"BT /F1 9 Tf 11 TL 50 760 Td\n" + b"".join(
+            _pdf_string(line) + b" Tj T*\n" for line in page.split("\n")) + b"ET"
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (page_id + 1))
+        objects[page_id + 1] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+
+    output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = dict()
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n"
+
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offsets[object_id] for object_id in sorted(objects))
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(file_path, "wb") as file:
+        file.write(output)
+
+def generate_synthetic_corpus(output_dir: str, scales: Tuple[int, ...] = (1, 10, 100), base_pages: int = BASE_PAGES,
+    seed: int = 0) -> Dict[int, str]:
+    """
+    Genera corpus sintéticos de tamaño 1x, 10x, 100x... del volumen base, como volúmenes PDF de `base_pages`
+    páginas cada uno (una escala de 10x son 10 volúmenes).
+
+    Args:
+        output_dir (str): Carpeta donde se crea una subcarpeta por escala.
+        scales (Tuple[int, ...]): Múltiplos del volumen base.
+        base_pages (int): Páginas de un volumen.
+        seed (int): Semilla base; cada volumen usa una semilla distinta.
+
+    Returns:
+        Dict[int, str]: Carpeta de cada escala, lista para usar como "directory_path".
+    """
+    directories = dict()
+    for scale in scales:
+        directory = os.path.join(output_dir, f"x{scale}")
+        os.makedirs(directory, exist_ok=True)
+        for volume in range(scale):
+            file_path = os.path.join(directory, f"synthetic-cfr-vol{volume + 1}.pdf")
+            if not os.path.exists(file_path):
+                pages = generate_regulation_text(base_pages, seed + volume, first_part=100 + 50 * volume)
+                write_text_pdf(pages, file_path)
+        logging.info(f"Corpus sintético x{scale}: {scale} volúmenes, {scale * base_pages} páginas en {directory}")
+        directories[scale] = directory
+    return directories
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Genera corpus sintéticos con estructura de CFR.")
+    parser.add_argument("--output-dir", default="data/synthetic")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--base-pages", type=int, default=BASE_PAGES)
+    args = parser.parse_args()
+    generate_synthetic_corpus(args.output_dir, tuple(args.scales), args.base_pages)
@@ -5,30 +5,42 @@ import logging
 from typing import List, Dict, Tuple, Optional  
 from PyPDF2 import PdfReader  
 
+from src.run_store.run_store import find_chunk_snapshot, save_chunk_snapshot
 
-def load_pdf_all_documents(directory_path: str) -> List[str]:
+
+def load_pdf_volumes(directory_path: str) -> Dict[str, List[str]]:
     """
-    Carga documentos PDF desde una carpeta y devuelve una lista de páginas como texto.
+    Carga los documentos PDF de una carpeta manteniendo separadas las páginas de cada archivo (volumen).
 
     Args:
         directory_path (str): Ruta de la carpeta que contiene los archivos PDF.
 
     Returns:
-        List[str]: Lista de cadenas de texto, donde cada cadena corresponde al texto extraído de una página PDF.
+        Dict[str, List[str]]: Por nombre de archivo, el texto de cada una de sus páginas.
     """
-
-    all_texts = list()
+    volumes = dict()
     for filename in os.listdir(directory_path):
         if filename.lower().endswith('.pdf'):
             file_path = os.path.join(directory_path, filename)
             try:
                 logging.info(f"Cargando archivo: {file_path}")
                 reader = PdfReader(file_path)
-                for page in reader.pages:
-                    all_texts.append(page.extract_text())
+                volumes[filename] = [page.extract_text() for page in reader.pages]
             except Exception as e:
                 logging.error(f"Error leyendo el archivo PDF: {file_path}. Detalle: {e}")
-    return all_texts
+    return volumes
+
+def load_pdf_all_documents(directory_path: str) -> List[str]:
+    """
+    Carga documentos PDF desde una carpeta y devuelve una lista de páginas como texto.
+
+    Args:
+        directory_path (str): Ruta de la carpeta que contiene los archivos PDF.
+
+    Returns:
+        List[str]: Lista de cadenas de texto, donde cada cadena corresponde al texto extraído de una página PDF.
+    """
+    return [page for pages in load_pdf_volumes(directory_path).values() for page in pages]
 
 def clean_text_and_exclude_sections(text: str) -> str:
     """
@@ -117,41 +129,44 @@ def assign_metadata_to_chunks_with_context(chunks: List[str], max_previous_chunk
     Returns:
         List[Dict[str, str]]: Lista de fragmentos con metadata asignada.
     """
+    keys = ("title", "subtitle", "sub_subtitle")
+    extracted = [extract_metadata(chunk) for chunk in chunks]
+    last_seen = [None, None, None]
+
+    # Cada campo toma el último valor encontrado dentro de la ventana de chunks previos,
+    # por lo que basta con recordar el índice más reciente que lo contiene.
     annotated_chunks = list()
     for i in range(len(chunks)):
-        metadata_accumulated = {"title": None, "subtitle": None, "sub_subtitle": None}
-        for j in range(max(0, i - max_previous_chunks), i):
-            metadata_title, metadata_subtitle, metadata_subsubtitle = extract_metadata(chunks[j])
-            if metadata_title:
-                metadata_accumulated["title"] = metadata_title
-            if metadata_subtitle:
-                metadata_accumulated["subtitle"] = metadata_subtitle
-            if metadata_subsubtitle:
-                metadata_accumulated["sub_subtitle"] = metadata_subsubtitle
-        annotated_chunks.append({"chunk_text": chunks[i], "metadata": metadata_accumulated.copy()})
+        window_start = max(0, i - max_previous_chunks)
+        metadata_accumulated = {
+            key: extracted[last][position] if last is not None and last >= window_start else None
+            for position, (key, last) in enumerate(zip(keys, last_seen))
+        }
+        annotated_chunks.append({"chunk_text": chunks[i], "metadata": metadata_accumulated})
+        for position, value in enumerate(extracted[i]):
+            if value:
+                last_seen[position] = i
     return annotated_chunks
 
-def show_chunks_streamlit(chunks, config):
+def show_chunks_streamlit(chunks, config, chunks_hash=None):
     """
     Esta función toma una lista de chunks y un diccionario de configuración.
-    Guarda un número específico de los últimos chunks, nombrado según un parámetro en el config.
+    Guarda todos los chunks como una instantánea en el almacén de corridas; la interfaz muestra los últimos
+    'show_chunks' y permite recorrer el resto (ver `src.run_store.run_store.load_chunks`).
+    Si se indica la huella del contenido y ya existe una instantánea con la misma configuración y contenido,
+    la reutiliza sin leer ni escribir los chunks.
 
     Args:
-    chunks (list): Lista de datos para convertir en DataFrame y guardar.
-    config (dict): Configuración que debe contener las claves 'rag' para nombrar el archivo y 'show_chunks' para determinar el número de chunks a mostrar.
+    chunks (list): Lista de chunks a guardar.
+    config (dict): Configuración que debe contener la clave 'rag' y, opcionalmente, 'run_store_path'.
+    chunks_hash (str, opcional): Huella del texto de los chunks (ver `src.run_store.run_store.content_hash`).
 
     Returns:
-    str: Nombre del archivo creado.
+    int: Id de la instantánea creada o reutilizada.
     """
-
-    show_chunks = config.get('show_chunks', 3) 
-    if len(chunks) < show_chunks:
-        raise ValueError(f"La lista de chunks debe contener al menos {show_chunks} elementos.")
-
-    df_chunks = pd.DataFrame(chunks[-show_chunks:])
-
-    file_name = f"chunks_{config['rag']}.xlsx"
-
-    df_chunks.to_excel(file_name, index=False, engine="openpyxl")
-
-    return 
\ No newline at end of file
+    db_path = config.get("run_store_path", "data/runs.sqlite")
+    if chunks_hash is not None:
+        snapshot_id = find_chunk_snapshot(db_path, config, chunks_hash)
+        if snapshot_id is not None:
+            return snapshot_id
+    return save_chunk_snapshot(db_path, chunks, config, chunks_hash)
@@ -0,0 +1,232 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.chunking.chunking import assign_metadata_to_chunks_with_context
+from src.chunking.segmenter import split_sentences
+from src.embedding.embedding import (get_embedding_model, consecutive_cosine_distances, chunk_boundaries,
+                                     chunks_from_boundaries, split_into_chunks_bounded)
+
+
+def _text_hash(*parts: str) -> str:
+    """Huella SHA-1 de uno o más textos."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+def chunk_id(source: str, chunk_text: str, occurrence: int = 0) -> str:
+    """
+    Id estable de un fragmento: depende solo del documento, del texto y de cuántas veces se repite ese texto
+    antes en el mismo documento, por lo que un fragmento que no cambia conserva su punto en Qdrant.
+
+    Args:
+        source (str): Nombre del documento.
+        chunk_text (str): Texto del fragmento.
+        occurrence (int): Repeticiones previas del mismo texto en el documento.
+
+    Returns:
+        str: UUID (versión 5) válido como id de punto de Qdrant.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, _text_hash(source, chunk_text, str(occurrence))))
+
+# Posiciones reservadas por documento: la posición de un fragmento es rango del documento * POSITION_STRIDE + su
+# índice dentro del documento, así reemplazar un documento no cambia la posición de los fragmentos de los demás.
+POSITION_STRIDE = 1_000_000
+
+
+class IncrementalChunker:
+    """
+    Segmentación semántica del RAG "super" que guarda, por documento, las oraciones, sus embeddings combinados
+    y los fragmentos resultantes, para que agregar o reemplazar un documento solo recalcule ese documento y las
+    ventanas de `buffer_size` oraciones de sus vecinos que lo incluyen como contexto.
+
+    Cada documento se segmenta por separado (ningún fragmento cruza de un documento a otro), pero las oraciones
+    combinadas de los bordes usan las oraciones del documento vecino, como al unir el corpus completo. Los títulos
+    heredados (`assign_metadata_to_chunks_with_context`) se recalculan sobre la secuencia completa, que no requiere
+    embeddings.
+    """
+
+    def __init__(self, config: dict, cache_dir: Optional[str] = None):
+        """
+        Args:
+            config (dict): Configuración con "model_name", "buffer_size", "threshold", "max_previous_chunks" y,
+                opcionalmente, "chunk_mode", "sentence_splitter", "embedding_backend", "onnx_num_threads" y
+                "embedding_workers".
+            cache_dir (Optional[str]): Carpeta donde se guarda el estado de cada documento para reutilizarlo entre
+                procesos; None lo mantiene solo en memoria.
+        """
+        self.config = config
+        self.buffer_size = config["buffer_size"]
+        self.cache_dir = cache_dir
+        self.documents: Dict[str, Dict] = dict()
+        self.chunks: List[Dict] = list()
+        self.next_rank = 0
+        self.lock = threading.Lock()
+        # Los embeddings guardados solo son válidos con el mismo modelo, ventana y segmentador.
+        self.settings_hash = _text_hash(config["model_name"], str(self.buffer_size),
+                                        config.get("sentence_splitter", "regex"))[:12]
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, f"{_text_hash(name)[:16]}-{self.settings_hash}.npz")
+
+    def _load_cached(self, name: str, content_hash: str) -> Optional[Dict]:
+        if not self.cache_dir or not os.path.exists(self._cache_path(name)):
+            return None
+        with np.load(self._cache_path(name)) as cached:
+            state = json.loads(str(cached["state"]))
+            if state["hash"] != content_hash:
+                return None
+            state["embeddings"] = cached["embeddings"]
+        return state
+
+    def _save_cached(self, name: str, state: Dict) -> None:
+        if not self.cache_dir:
+            return
+        # Los cortes no se guardan: dependen de "threshold", "chunk_mode" y los límites de tokens, que pueden cambiar
+        # entre procesos sin invalidar los embeddings; se recalculan con `_split` al restaurar el documento.
+        stored = {key: value for key, value in state.items() if key not in ("embeddings", "chunks", "rank")}
+        np.savez_compressed(self._cache_path(name), state=np.array(json.dumps(stored)), embeddings=state["embeddings"])
+
+    def _neighbor_context(self, order: List[str], position: int) -> tuple:
+        """Oraciones del documento anterior y del siguiente que entran en las ventanas de los bordes."""
+        head = self.documents[order[position - 1]]["sentences"][-self.buffer_size:] if position > 0 else []
+        tail = self.documents[order[position + 1]]["sentences"][:self.buffer_size] if position + 1 < len(order) else []
+        return head, tail
+
+    def _combined(self, sentences: List[str], head: List[str], tail: List[str], positions: Sequence[int]) -> List[str]:
+        """Oraciones combinadas de las posiciones indicadas, como en `combine_sentences`, con los vecinos a los lados."""
+        extended = [*head, *sentences, *tail]
+        offset = len(head)
+        return [
+            " ".join(extended[max(0, offset + i - self.buffer_size):offset + i + self.buffer_size + 1]).strip()
+            for i in positions
+        ]
+
+    def _split(self, state: Dict) -> List[str]:
+        """Recalcula los fragmentos de un documento a partir de sus embeddings."""
+        distances = consecutive_cosine_distances(state["embeddings"])
+        if self.config.get("chunk_mode", "semantic") == "bounded":
+            return split_into_chunks_bounded([{'sentence': sentence} for sentence in state["sentences"]],
+                                             distances.tolist(), self.config["threshold"], self.config["model_name"],
+                                             self.config.get("min_chunk_tokens"), self.config.get("max_chunk_tokens"))
+        return chunks_from_boundaries(state["sentences"], chunk_boundaries(distances, self.config["threshold"]).tolist())
+
+    def update(self, documents: Dict[str, List[str]], removed: Sequence[str] = ()) -> Dict[str, object]:
+        """
+        Agrega, reemplaza o quita documentos y recalcula solo lo afectado.
+
+        Un documento nuevo se agrega al final; uno reemplazado conserva su posición.
+
+        Args:
+            documents (Dict[str, List[str]]): Texto de las páginas de cada documento nuevo o reemplazado.
+            removed (Sequence[str]): Documentos a quitar.
+
+        Returns:
+            Dict[str, object]: "chunks" con todos los fragmentos en orden (con "source", "chunk_id" y "position"),
+            "upserted" con los fragmentos nuevos o cuya metadata o posición cambió, "deleted" con los ids que ya no existen y
+            "sentences_embedded" con el número de oraciones combinadas que se embebieron.
+        """
+        with self.lock:
+            previous = {chunk["chunk_id"]: (chunk["metadata"], chunk["position"]) for chunk in self.chunks}
+            for name in removed:
+                self.documents.pop(name, None)
+
+            dirty = dict()
+            for name, pages in documents.items():
+                pages = [page or "" for page in pages]
+                content_hash = _text_hash(*pages)
+                if name in self.documents and self.documents[name]["hash"] == content_hash:
+                    continue
+                state = self._load_cached(name, content_hash)
+                if state is None:
+                    sentences = [sentence['sentence'] for sentence in split_sentences(pages, self.config)]
+                    embeddings = None if sentences else np.empty((0, 0), dtype=np.float32)
+                    state = {"hash": content_hash, "sentences": sentences, "embeddings": embeddings, "head": [], "tail": []}
+                if name in self.documents:
+                    state["rank"] = self.documents[name]["rank"]
+                else:
+                    state["rank"], self.next_rank = self.next_rank, self.next_rank + 1
+                self.documents[name] = state
+                dirty[name] = state
+
+            # Posiciones a (re)embeber: todo el documento si es nuevo, o las ventanas de los bordes cuyo vecino cambió.
+            order = list(self.documents)
+            pending = list()
+            for position, name in enumerate(order):
+                state = self.documents[name]
+                head, tail = self._neighbor_context(order, position)
+                count = len(state["sentences"])
+                if state["embeddings"] is None:
+                    positions = range(count)
+                else:
+                    positions = sorted(
+                        ({*range(min(self.buffer_size, count))} if state["head"] != head else set())
+                        | ({*range(max(0, count - self.buffer_size), count)} if state["tail"] != tail else set())
+                    )
+                if positions:
+                    pending.append((name, list(positions), self._combined(state["sentences"], head, tail, positions)))
+                state["head"], state["tail"] = head, tail
+
+            combined_texts = [text for _, _, combined in pending for text in combined]
+            if combined_texts:
+                model = get_embedding_model(self.config["model_name"], self.config.get("embedding_backend", "torch"),
+                                            self.config.get("onnx_num_threads"), self.config.get("embedding_workers", 1))
+                vectors = np.asarray(model.embed_documents(combined_texts), dtype=np.float32)
+                start = 0
+                for name, positions, _ in pending:
+                    state = self.documents[name]
+                    if state["embeddings"] is None:
+                        state["embeddings"] = np.empty((len(state["sentences"]), vectors.shape[1]), dtype=np.float32)
+                    state["embeddings"][positions] = vectors[start:start + len(positions)]
+                    start += len(positions)
+
+            for name, _, _ in pending:
+                self._save_cached(name, self.documents[name])
+            # Se re-segmentan los documentos nuevos, restaurados desde la caché o cuyos bordes cambiaron.
+            for name in {**dirty, **{name: None for name, _, _ in pending}}:
+                state = self.documents[name]
+                state["chunks"] = self._split(state)
+
+            sources = [name for name in order for _ in self.documents[name]["chunks"]]
+            positions = [self.documents[name]["rank"] * POSITION_STRIDE + index
+                         for name in order for index in range(len(self.documents[name]["chunks"]))]
+            texts = [text for name in order for text in self.documents[name]["chunks"]]
+            chunks = assign_metadata_to_chunks_with_context(texts, self.config["max_previous_chunks"])
+            seen = dict()
+            for source, position, chunk in zip(sources, positions, chunks):
+                key = (source, chunk["chunk_text"])
+                chunk["source"] = source
+                chunk["position"] = position
+                chunk["chunk_id"] = chunk_id(source, chunk["chunk_text"], seen.get(key, 0))
+                seen[key] = seen.get(key, 0) + 1
+            self.chunks = chunks
+
+            current = {chunk["chunk_id"] for chunk in chunks}
+            upserted = [chunk for chunk in chunks
+                        if previous.get(chunk["chunk_id"]) != (chunk["metadata"], chunk["position"])]
+            deleted = [point_id for point_id in previous if point_id not in current]
+            logging.info(f"Segmentación incremental: {len(combined_texts)} oraciones combinadas embebidas, "
+                         f"{len(upserted)} fragmentos a indexar y {len(deleted)} a eliminar de {len(chunks)}.")
+            return {"chunks": chunks, "upserted": upserted, "deleted": deleted, "sentences_embedded": len(combined_texts)}
+
+    def sync(self, volumes: Dict[str, List[str]]) -> Dict[str, object]:
+        """
+        Sincroniza el estado con el corpus completo: quita los documentos que ya no están y actualiza el resto.
+
+        Args:
+            volumes (Dict[str, List[str]]): Texto de las páginas de cada documento, ver `load_pdf_volumes`.
+
+        Returns:
+            Dict[str, object]: Ver `update`.
+        """
+        return self.update(volumes, removed=[name for name in self.documents if name not in volumes])
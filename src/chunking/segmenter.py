@@ -0,0 +1,195 @@
+import re
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from src.chunking.chunking import clean_text_and_exclude_sections, split_text_into_sentences
+
+
+# Abreviaturas frecuentes en el CFR y en citas legales que pueden ir seguidas de mayúscula sin terminar la oración
+# ("U.S.C. Chapter", "Fed. Reg."); se comparan en minúsculas y sin el punto final.
+REGULATORY_ABBREVIATIONS = frozenset({
+    "u.s", "u.s.c", "c.f.r", "fed", "reg", "stat", "pub", "l", "sec", "secs", "ch", "chs",
+    "subpt", "par", "pars", "para", "art", "vol", "p", "pp", "fig", "figs", "tbl", "app", "ed", "supp",
+    "e.g", "i.e", "etc", "et al", "al", "seq", "et seq", "cf", "viz", "vs", "v", "approx", "ca",
+    "inc", "co", "corp", "ltd", "llc", "dept", "div", "admin", "assn", "gov", "govt", "natl",
+    "dr", "mr", "mrs", "ms", "st", "jr", "sr", "ph.d", "m.d",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+})
+# Unidades y abreviaturas que en el etiquetado nutricional suelen cerrar la oración ("less than 5 g. Declare").
+# Solo se consideran abreviatura si lo siguiente empieza en minúscula o dígito ("5 g. per serving", "No. 5"),
+# caso que ya cubre la regla general, por lo que nunca suprimen un corte antes de mayúscula.
+UNIT_ABBREVIATIONS = frozenset({
+    "oz", "fl", "lb", "lbs", "mg", "mcg", "kg", "ml", "g", "cm", "mm", "in", "ft", "gal", "qt", "pt", "pts",
+    "temp", "wt", "min", "max", "no", "nos",
+})
+
+# Candidato a fin de oración: signo terminal, cierres opcionales y espacio.
+_BOUNDARY = re.compile(r"[.?!][\"'”’)\]]*\s+")
+# Rótulo de párrafo numerado que quedaría como oración aislada: "1.", "(a).", "iv.", "A.".
+_ENUMERATOR = re.compile(r"^\(?(?:\d{1,3}|[a-zA-Z]|[ivxlcdmIVXLCDM]{1,5})\)?\.$")
+# Párrafo numerado que empieza después del punto ("1. Scope"): ahí sí hay fin de oración.
+_NUMBERED_PARAGRAPH = re.compile(r"\d{1,3}\.\s+[A-Z(]")
+# Número con decimales o separadores ("0.5", "2.5", "101.9"): no es una sigla.
+_NUMBER = re.compile(r"[\d.,]+")
+
+
+def segment_regulatory_text(text: str, abbreviations: frozenset = REGULATORY_ABBREVIATIONS) -> List[str]:
+    """
+    Divide texto regulatorio en oraciones en una sola pasada, sin cortar en abreviaturas ("U.S.C.", "e.g."),
+    citas ("§ 101.9(c)", "Sec. 5") ni rótulos de párrafos numerados ("1.", "(a).").
+
+    Args:
+        text (str): Texto limpio.
+        abbreviations (frozenset): Abreviaturas, en minúsculas y sin punto final, tras las que no se corta; las de
+            `UNIT_ABBREVIATIONS` se ignoran porque antes de mayúscula cierran la oración.
+
+    Returns:
+        List[str]: Oraciones en orden.
+    """
+    text = text.strip()
+    sentences = list()
+    start = 0
+    for match in _BOUNDARY.finditer(text):
+        end = match.end()
+        if end >= len(text):
+            break
+        next_char = text[end]
+        # Tras una oración real viene mayúscula, apertura o símbolo de sección; minúscula o dígito indican que
+        # el punto pertenece a una abreviatura o cita ("Sec. 5", "approx. three").
+        if next_char.islower() or (next_char.isdigit() and not _NUMBERED_PARAGRAPH.match(text, end)):
+            continue
+
+        # Último token antes del signo (por ejemplo "U.S.C", "e.g", "(iii)"), buscando hacia atrás solo hasta el
+        # espacio anterior para que cada candidato cueste el largo del token y no el de la oración.
+        token_start = match.start()
+        while token_start > start and not text[token_start - 1].isspace():
+            token_start -= 1
+        last_token = text[token_start:match.start()].lstrip("(\"'“‘[").lower()
+        is_abbreviation = last_token in abbreviations and last_token not in UNIT_ABBREVIATIONS
+        # Un rótulo numerado aislado ("1.", "(a).") es el único token desde el último corte.
+        is_enumerator = token_start == start and _ENUMERATOR.match(text[start:match.start() + 1])
+        if text[match.start()] == "." and (is_abbreviation or is_enumerator):
+            continue
+        if text[match.start()] == "." and len(last_token) <= 4 and "." in last_token and not _NUMBER.fullmatch(last_token):
+            # Iniciales y siglas con puntos internos ("U.S", "N.Y", "D.C").
+            continue
+
+        sentences.append(text[start:end].strip())
+        start = end
+
+    if start < len(text):
+        sentences.append(text[start:].strip())
+    return [sentence for sentence in sentences if sentence]
+
+def _segment_page(page: str) -> List[str]:
+    """Limpia y segmenta una página; se ejecuta en un proceso trabajador."""
+    return segment_regulatory_text(clean_text_and_exclude_sections(page or ""))
+
+def split_pages_into_sentences(pages: List[str], num_workers: int = 1) -> List[Dict[str, str]]:
+    """
+    Segmenta las páginas en paralelo y une la oración que queda abierta al final de una página con el
+    comienzo de la siguiente.
+
+    Args:
+        pages (List[str]): Texto de cada página.
+        num_workers (int): Procesos para segmentar; 1 lo hace en el proceso actual.
+
+    Returns:
+        List[Dict[str, str]]: Lista de diccionarios con 'sentence' e 'index', como `split_text_into_sentences`.
+    """
+    if num_workers > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            page_sentences = list(executor.map(_segment_page, pages, chunksize=max(1, len(pages) // (4 * num_workers))))
+    else:
+        page_sentences = [_segment_page(page) for page in pages]
+
+    sentences = list()
+    for page in page_sentences:
+        if not page:
+            continue
+        if sentences and not re.search(r"[.?!][\"'”’)\]]*$", sentences[-1]):
+            sentences[-1] = f"{sentences[-1]} {page[0]}"
+            page = page[1:]
+        sentences.extend(page)
+    return [{'sentence': sentence, 'index': i} for i, sentence in enumerate(sentences)]
+
+def split_sentences(pdf_texts: List[str], config: dict) -> List[Dict[str, str]]:
+    """
+    Segmenta las páginas en oraciones con el segmentador indicado en la configuración.
+
+    Args:
+        pdf_texts (List[str]): Texto de cada página.
+        config (dict): Configuración con las claves opcionales "sentence_splitter" ("regex" o "regulatory")
+            y "segmenter_workers".
+
+    Returns:
+        List[Dict[str, str]]: Lista de diccionarios con 'sentence' e 'index'.
+
+    Raises:
+        ValueError: Si "sentence_splitter" no es un segmentador conocido.
+    """
+    splitter = config.get("sentence_splitter", "regex")
+    if splitter == "regex":
+        return split_text_into_sentences(clean_text_and_exclude_sections(" ".join(pdf_texts)))
+    if splitter == "regulatory":
+        return split_pages_into_sentences(pdf_texts, config.get("segmenter_workers", 1))
+    raise ValueError(f"El valor de 'sentence_splitter' no es válido: '{splitter}'. Debe ser 'regex' o 'regulatory'.")
+
+def segmentation_report(pdf_texts: List[str], num_workers: int = 1,
+    seconds_per_sentence: Optional[float] = None) -> Dict[str, float]:
+    """
+    Compara el segmentador por expresión regular con el regulatorio: número de oraciones, fragmentos
+    diminutos, tiempo de segmentación y embeddings ahorrados.
+
+    Args:
+        pdf_texts (List[str]): Texto de cada página.
+        num_workers (int): Procesos del segmentador regulatorio.
+        seconds_per_sentence (Optional[float]): Tiempo medido de embedding por oración; si se indica, se
+            estima el tiempo de embedding ahorrado.
+
+    Returns:
+        Dict[str, float]: Métricas de la comparación.
+    """
+    start = time.perf_counter()
+    regex_sentences = split_text_into_sentences(clean_text_and_exclude_sections(" ".join(pdf_texts)))
+    regex_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    regulatory_sentences = split_pages_into_sentences(pdf_texts, num_workers)
+    regulatory_seconds = time.perf_counter() - start
+
+    saved = len(regex_sentences) - len(regulatory_sentences)
+    report = {
+        "regex_sentences": len(regex_sentences),
+        "regulatory_sentences": len(regulatory_sentences),
+        "sentence_reduction": saved / max(len(regex_sentences), 1),
+        "regex_tiny_fragments": sum(len(s['sentence']) < 20 for s in regex_sentences),
+        "regulatory_tiny_fragments": sum(len(s['sentence']) < 20 for s in regulatory_sentences),
+        "regex_seconds": regex_seconds,
+        "regulatory_seconds": regulatory_seconds,
+    }
+    if seconds_per_sentence is not None:
+        report["embedding_seconds_saved"] = saved * seconds_per_sentence
+    return report
+
+
+if __name__ == "__main__":
+    from src.chunking.chunking import load_pdf_all_documents, combine_sentences
+    from src.embedding.embedding import get_embedding_model
+    from src.retrievers.retrievers import load_config
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config("config.yaml")
+    pdf_texts = load_pdf_all_documents(config["directory_path"])
+
+    sample = combine_sentences(split_pages_into_sentences(pdf_texts[:20]), config["buffer_size"])[:256]
+    model = get_embedding_model(config["model_name"], config.get("embedding_backend", "torch"))
+    model.embed_documents([s['combined_sentence'] for s in sample[:8]])
+    start = time.perf_counter()
+    model.embed_documents([s['combined_sentence'] for s in sample])
+    seconds_per_sentence = (time.perf_counter() - start) / max(len(sample), 1)
+
+    for key, value in segmentation_report(pdf_texts, config.get("segmenter_workers", 1), seconds_per_sentence).items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,166 @@
+import re
+import zlib
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+def shingle_hashes(text: str, shingle_size: int = 5) -> np.ndarray:
+    """
+    Calcula los hashes de los shingles de palabras de un texto.
+
+    Args:
+        text (str): Texto del fragmento.
+        shingle_size (int): Número de palabras por shingle.
+
+    Returns:
+        np.ndarray: Hashes únicos de 32 bits de los shingles.
+    """
+    words = TOKEN_PATTERN.findall(text.lower())
+    if len(words) <= shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles)))
+
+def minhash_signatures(texts: Sequence[str], num_perm: int = 128, shingle_size: int = 5, seed: int = 1) -> np.ndarray:
+    """
+    Calcula la firma MinHash de cada texto.
+
+    Args:
+        texts (Sequence[str]): Textos de los fragmentos.
+        num_perm (int): Número de permutaciones (largo de la firma).
+        shingle_size (int): Número de palabras por shingle.
+        seed (int): Semilla de las permutaciones.
+
+    Returns:
+        np.ndarray: Matriz (len(texts), num_perm) de firmas.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        hashes = shingle_hashes(text, shingle_size)[:, None] % MERSENNE_PRIME
+        signatures[i] = ((a * hashes + b) % MERSENNE_PRIME).min(axis=0)
+    return signatures
+
+def optimal_bands(num_perm: int, threshold: float) -> int:
+    """
+    Elige el número de bandas LSH cuyo umbral aproximado (1/b)^(1/r) queda más cerca del umbral pedido.
+
+    Args:
+        num_perm (int): Largo de la firma MinHash.
+        threshold (float): Similitud de Jaccard a partir de la cual dos textos son duplicados.
+
+    Returns:
+        int: Número de bandas (divisor de `num_perm`).
+    """
+    divisors = [bands for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(divisors, key=lambda bands: abs((1 / bands) ** (bands / num_perm) - threshold))
+
+def find_near_duplicates(texts: Sequence[str], threshold: float = 0.9, num_perm: int = 128,
+    bands: Optional[int] = None) -> Dict[int, int]:
+    """
+    Detecta fragmentos casi duplicados con MinHash + LSH.
+
+    Cada fragmento se compara sólo contra los fragmentos canónicos que comparten alguna banda LSH; el primero
+    en aparecer de cada grupo es el canónico.
+
+    Args:
+        texts (Sequence[str]): Textos de los fragmentos, en orden.
+        threshold (float): Similitud de Jaccard estimada mínima para considerar un duplicado.
+        num_perm (int): Largo de la firma MinHash.
+        bands (Optional[int]): Número de bandas LSH; por defecto se deriva del umbral.
+
+    Returns:
+        Dict[int, int]: Mapa índice del fragmento descartado -> índice de su copia canónica.
+    """
+    bands = bands or optimal_bands(num_perm, threshold)
+    rows = num_perm // bands
+    signatures = minhash_signatures(texts, num_perm)
+
+    buckets = [dict() for _ in range(bands)]
+    duplicate_map = dict()
+    for i, signature in enumerate(signatures):
+        keys = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(bands)]
+        candidates = {canonical for band, key in enumerate(keys) for canonical in buckets[band].get(key, ())}
+
+        best = None
+        if candidates:
+            candidates = sorted(candidates)
+            similarity = (signatures[candidates] == signature).mean(axis=1)
+            if similarity.max() >= threshold:
+                best = candidates[int(np.argmax(similarity))]
+
+        if best is not None:
+            duplicate_map[i] = best
+        else:
+            for band, key in enumerate(keys):
+                buckets[band].setdefault(key, list()).append(i)
+    return duplicate_map
+
+def deduplicate_chunks(chunks: List, texts: Sequence[str], threshold: float = 0.9,
+    num_perm: int = 128) -> Tuple[List, Dict[int, int]]:
+    """
+    Elimina los fragmentos casi duplicados antes de indexarlos.
+
+    Args:
+        chunks (List): Fragmentos en cualquier formato (diccionarios "super" o `Document` "naive").
+        texts (Sequence[str]): Texto de cada fragmento.
+        threshold (float): Similitud de Jaccard estimada mínima para considerar un duplicado.
+        num_perm (int): Largo de la firma MinHash.
+
+    Returns:
+        Tuple[List, Dict[int, int]]: Fragmentos conservados y el mapa descartado -> canónico
+        (índices de la lista original).
+    """
+    duplicate_map = find_near_duplicates(texts, threshold, num_perm)
+    kept_chunks = [chunk for i, chunk in enumerate(chunks) if i not in duplicate_map]
+    return kept_chunks, duplicate_map
+
+def dedup_report(texts: Sequence[str], duplicate_map: Dict[int, int], indexing_seconds: Optional[float] = None,
+    embedding_dimension: Optional[int] = None) -> Dict[str, float]:
+    """
+    Resume lo que ahorró la deduplicación en tamaño del índice y tiempo de embedding.
+
+    Args:
+        texts (Sequence[str]): Texto de todos los fragmentos antes de deduplicar.
+        duplicate_map (Dict[int, int]): Mapa descartado -> canónico devuelto por `deduplicate_chunks`.
+        indexing_seconds (Optional[float]): Tiempo que tomó indexar los fragmentos conservados; permite estimar
+            el tiempo ahorrado en proporción a los caracteres descartados.
+        embedding_dimension (Optional[int]): Dimensión de los vectores, para estimar los bytes ahorrados.
+
+    Returns:
+        Dict[str, float]: Fragmentos y caracteres descartados, y ahorros estimados.
+    """
+    total_chars = sum(len(text) for text in texts)
+    removed_chars = sum(len(texts[i]) for i in duplicate_map)
+    kept_chars = total_chars - removed_chars
+
+    report = {
+        "chunks_before": len(texts),
+        "chunks_removed": len(duplicate_map),
+        "chunks_removed_share": len(duplicate_map) / len(texts) if texts else 0.0,
+        "chars_removed": removed_chars,
+        "chars_removed_share": removed_chars / total_chars if total_chars else 0.0,
+    }
+    if embedding_dimension:
+        report["vector_bytes_saved"] = len(duplicate_map) * embedding_dimension * 4
+    if indexing_seconds is not None and kept_chars:
+        report["embedding_seconds_saved"] = indexing_seconds * removed_chars / kept_chars
+    return report
+
+def log_dedup_report(report: Dict[str, float]) -> None:
+    """Registra el reporte de deduplicación en el log."""
+    logging.info(
+        "Deduplicación: %d de %d fragmentos descartados (%.1f%% de los caracteres)%s",
+        report["chunks_removed"], report["chunks_before"], 100 * report["chars_removed_share"],
+        f", ~{report['embedding_seconds_saved']:.1f}s de embedding ahorrados" if "embedding_seconds_saved" in report else "",
+    )
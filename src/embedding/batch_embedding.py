@@ -0,0 +1,224 @@
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+
+
+CHARS_PER_TOKEN = 4
+_WORKER_MODEL = None
+
+
+def estimate_tokens(texts: List[str]) -> np.ndarray:
+    """
+    Estima el número de tokens de cada texto a partir de su largo en caracteres.
+
+    Args:
+        texts (List[str]): Textos a embeber.
+
+    Returns:
+        np.ndarray: Estimación de tokens por texto (al menos 1).
+    """
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    return np.maximum(lengths // CHARS_PER_TOKEN, 1)
+
+def plan_batches(texts: List[str], max_tokens_per_batch: int = 8192, max_batch_size: int = 256) -> List[List[int]]:
+    """
+    Agrupa los textos en lotes de largo similar y elige el tamaño de cada lote automáticamente.
+
+    Los textos se ordenan por largo, de modo que cada lote rellena (padding) hasta un largo parecido, y un lote
+    crece mientras (textos del lote) x (largo del más largo) no supere `max_tokens_per_batch`.
+
+    Args:
+        texts (List[str]): Textos a embeber.
+        max_tokens_per_batch (int): Presupuesto de tokens con padding por lote.
+        max_batch_size (int): Máximo de textos por lote.
+
+    Returns:
+        List[List[int]]: Índices originales de los textos de cada lote.
+    """
+    token_counts = estimate_tokens(texts)
+    batches = list()
+    batch = list()
+    for index in np.argsort(token_counts, kind="stable").tolist():
+        if batch and ((len(batch) + 1) * token_counts[index] > max_tokens_per_batch or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch = list()
+        batch.append(index)
+    if batch:
+        batches.append(batch)
+    return batches
+
+def padding_efficiency(texts: List[str], batches: List[List[int]]) -> float:
+    """
+    Proporción de tokens reales sobre tokens procesados (incluyendo padding) para un plan de lotes.
+
+    Args:
+        texts (List[str]): Textos a embeber.
+        batches (List[List[int]]): Plan de lotes con índices de `texts`.
+
+    Returns:
+        float: Valor entre 0 y 1; 1 significa que no hay padding.
+    """
+    token_counts = estimate_tokens(texts)
+    padded = sum(len(batch) * int(token_counts[batch].max()) for batch in batches)
+    return float(token_counts.sum() / padded) if padded else 1.0
+
+def _init_worker(model_name: str, backend: str, num_threads: int) -> None:
+    """Carga el modelo de embeddings una vez por proceso trabajador."""
+    global _WORKER_MODEL
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(num_threads)
+
+    from src.embedding.embedding import get_embedding_model
+    _WORKER_MODEL = get_embedding_model(model_name, backend, num_threads)
+
+def _embed_batch(indices: List[int], texts: List[str]) -> Tuple[List[int], np.ndarray]:
+    """Calcula los embeddings de un lote dentro de un proceso trabajador."""
+    return indices, np.asarray(_WORKER_MODEL.embed_documents(texts), dtype=np.float32)
+
+@lru_cache(maxsize=None)
+def get_worker_pool(model_name: str, backend: str = "torch", num_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Devuelve un pool de procesos persistente con el modelo ya cargado en cada trabajador.
+
+    Args:
+        model_name (str): Nombre del modelo de embeddings.
+        backend (str): Backend de inferencia, ver `get_embedding_model`.
+        num_workers (Optional[int]): Número de procesos; por defecto todos los núcleos.
+
+    Returns:
+        ProcessPoolExecutor: Pool reutilizable entre llamadas.
+    """
+    num_workers = num_workers or os.cpu_count()
+    threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+    return ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(model_name, backend, threads_per_worker),
+    )
+
+def iter_embed_corpus(texts: List[str], model_name: str, backend: str = "torch", num_workers: Optional[int] = None,
+    max_tokens_per_batch: int = 8192) -> Iterator[np.ndarray]:
+    """
+    Embebe un corpus en paralelo con lotes agrupados por largo y entrega los vectores en el orden de entrada.
+
+    Cada vector se entrega apenas están listos todos los anteriores, sin esperar al corpus completo.
+
+    Args:
+        texts (List[str]): Textos a embeber.
+        model_name (str): Nombre del modelo de embeddings.
+        backend (str): Backend de inferencia, ver `get_embedding_model`.
+        num_workers (Optional[int]): Número de procesos; por defecto todos los núcleos.
+        max_tokens_per_batch (int): Presupuesto de tokens con padding por lote.
+
+    Yields:
+        np.ndarray: Embedding de cada texto, en el mismo orden que `texts`.
+    """
+    pool = get_worker_pool(model_name, backend, num_workers)
+    futures = [
+        pool.submit(_embed_batch, batch, [texts[i] for i in batch])
+        for batch in plan_batches(texts, max_tokens_per_batch)
+    ]
+
+    pending = dict()
+    next_index = 0
+    for future in as_completed(futures):
+        indices, vectors = future.result()
+        pending.update(zip(indices, vectors))
+        while next_index in pending:
+            yield pending.pop(next_index)
+            next_index += 1
+
+
+class CorpusEmbeddings(Embeddings):
+    """
+    Embeddings que reparten `embed_documents` en un pool de procesos y resuelven `embed_query` en el proceso actual.
+    """
+
+    def __init__(self, model_name: str, backend: str = "torch", num_workers: Optional[int] = None,
+                 max_tokens_per_batch: int = 8192):
+        """
+        Args:
+            model_name (str): Nombre del modelo de embeddings.
+            backend (str): Backend de inferencia, ver `get_embedding_model`.
+            num_workers (Optional[int]): Número de procesos; por defecto todos los núcleos.
+            max_tokens_per_batch (int): Presupuesto de tokens con padding por lote.
+        """
+        from src.embedding.embedding import get_embedding_model
+
+        self.model_name = model_name
+        self.backend = backend
+        self.num_workers = num_workers
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.query_model = get_embedding_model(model_name, backend)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return list()
+        vectors = iter_embed_corpus(list(texts), self.model_name, self.backend, self.num_workers,
+                                    self.max_tokens_per_batch)
+        return np.vstack(list(vectors)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.query_model.embed_query(text)
+
+
+def benchmark_corpus_embedding(texts: List[str], model_name: str, backend: str = "torch",
+    num_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Compara las oraciones por segundo del embedding en un proceso contra el motor multiproceso por lotes.
+
+    Args:
+        texts (List[str]): Corpus a embeber.
+        model_name (str): Nombre del modelo de embeddings.
+        backend (str): Backend de inferencia, ver `get_embedding_model`.
+        num_workers (Optional[int]): Número de procesos del motor.
+
+    Returns:
+        pd.DataFrame: Una fila por modo con tiempo, oraciones por segundo y eficiencia de padding.
+    """
+    from src.embedding.embedding import get_embedding_model
+
+    single_process = get_embedding_model(model_name, backend)
+    engine = CorpusEmbeddings(model_name, backend, num_workers)
+    engine.embed_documents(texts[:num_workers or os.cpu_count()])
+
+    rows = list()
+    for name, model, batches in (
+        ("single_process", single_process, [list(range(i, min(i + 32, len(texts)))) for i in range(0, len(texts), 32)]),
+        ("bucketed_multiprocess", engine, plan_batches(texts, engine.max_tokens_per_batch)),
+    ):
+        start = time.perf_counter()
+        model.embed_documents(texts)
+        seconds = time.perf_counter() - start
+        rows.append({
+            "mode": name,
+            "seconds": seconds,
+            "sentences_per_second": len(texts) / seconds,
+            "padding_efficiency": padding_efficiency(texts, batches),
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from src.chunking.chunking import (load_pdf_all_documents, clean_text_and_exclude_sections,
+                                       split_text_into_sentences, combine_sentences)
+    from src.retrievers.retrievers import load_config
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config("config.yaml")
+    pdf_texts = load_pdf_all_documents(config["directory_path"])
+    sentences = combine_sentences(split_text_into_sentences(clean_text_and_exclude_sections(" ".join(pdf_texts))),
+                                  config["buffer_size"])
+    corpus = [sentence["combined_sentence"] for sentence in sentences]
+    print(benchmark_corpus_embedding(corpus, config["model_name"], config.get("embedding_backend", "torch"),
+                                     config.get("embedding_workers")).to_string(index=False))
@@ -1,33 +1,136 @@
+import os
 import re  
-from typing import List, Dict  
-from sklearn.metrics.pairwise import cosine_similarity  
+import json
+import numpy as np
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple  
+from huggingface_hub import hf_hub_download
+from langchain_core.embeddings import Embeddings
 from langchain_huggingface import HuggingFaceEmbeddings 
+from transformers import AutoTokenizer
 
 
-def calculate_cosine_distances(sentences: List[Dict[str, str]], model_name: str) -> List[float]:
+@lru_cache(maxsize=None)
+def get_embedding_model(model_name: str, backend: str = "torch", num_threads: Optional[int] = None,
+    num_workers: int = 1) -> Embeddings:
+    """
+    Devuelve el modelo de embeddings del backend indicado, reutilizando una única instancia por proceso.
+
+    Args:
+        model_name (str): Nombre del modelo de embeddings.
+        backend (str): "torch" para `HuggingFaceEmbeddings` (PyTorch fp32), "onnx" para ONNX Runtime int8 o "server"
+            para usar el servidor local de embeddings compartido (ver `src.embedding.embedding_server`).
+        num_threads (Optional[int]): Hilos de inferencia del backend "onnx".
+        num_workers (int): Si es mayor que 1, `embed_documents` se reparte en ese número de procesos
+            con lotes agrupados por largo (ver `src.embedding.batch_embedding`).
+
+    Returns:
+        Embeddings: Objeto con los métodos `embed_documents` y `embed_query`.
+
+    Raises:
+        ValueError: Si el backend no es "torch", "onnx" ni "server".
+    """
+    if backend == "server":
+        from src.embedding.embedding_server import EmbeddingServiceClient
+        return EmbeddingServiceClient(model_name)
+    if num_workers > 1:
+        from src.embedding.batch_embedding import CorpusEmbeddings
+        return CorpusEmbeddings(model_name, backend, num_workers)
+    if backend == "torch":
+        return HuggingFaceEmbeddings(model_name=model_name)
+    if backend == "onnx":
+        from src.embedding.onnx_embedding import OnnxEmbeddings
+        return OnnxEmbeddings(model_name, num_threads=num_threads)
+    raise ValueError(f"Backend de embeddings no válido: '{backend}'. Debe ser 'torch', 'onnx' o 'server'.")
+
+def calculate_cosine_distances(sentences: List[Dict[str, str]], model_name: str, backend: str = "torch",
+    num_workers: int = 1, keep_embeddings: bool = True, num_threads: Optional[int] = None) -> List[float]:
     """
     Calcula las distancias coseno entre embeddings de oraciones combinadas.
 
     Args:
         sentences (List[Dict[str, Any]]): Lista de oraciones con embeddings combinados.
         model_name (str): Nombre del modelo de embeddings.
+        backend (str): Backend de inferencia, ver `get_embedding_model`.
+        num_workers (int): Procesos para embeber las oraciones, ver `get_embedding_model`.
+        keep_embeddings (bool): Si es False no se guarda el embedding en cada oración; en modo de presupuesto
+            de memoria evita mantener una lista de floats de Python por oración hasta el final de la ingesta.
+        num_threads (Optional[int]): Hilos de inferencia del backend "onnx", ver `get_embedding_model`.
 
     Returns:
         List[float]: Distancias coseno entre embeddings consecutivos.
     """
-    embedding_model = HuggingFaceEmbeddings(model_name=model_name)
+    embedding_model = get_embedding_model(model_name, backend, num_threads, num_workers)
     embeddings = embedding_model.embed_documents([sentence['combined_sentence'] for sentence in sentences])
 
-    for i, sentence in enumerate(sentences):
-        sentence['embedding'] = embeddings[i]
-
-    distances = list()
-    for i in range(len(sentences) - 1):
-        sim = cosine_similarity([sentences[i]['embedding']], [sentences[i + 1]['embedding']])[0][0]
-        distances.append(1 - sim)
+    if keep_embeddings:
+        for i, sentence in enumerate(sentences):
+            sentence['embedding'] = embeddings[i]
 
+    distances = consecutive_cosine_distances(embeddings).tolist()
+    del embeddings
     return distances
 
+def normalize_rows(matrix, dtype=np.float32) -> np.ndarray:
+    """
+    Normaliza cada fila de una matriz (o un vector) a norma unitaria para calcular similitud coseno con un producto punto.
+
+    Args:
+        matrix (array-like): Matriz (n, d) o vector (d,).
+        dtype: Tipo de los valores del resultado (por defecto float32).
+
+    Returns:
+        np.ndarray: Matriz o vector normalizado; las filas nulas quedan en cero.
+    """
+    matrix = np.asarray(matrix, dtype=dtype)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12, None)
+
+def consecutive_cosine_distances(embeddings) -> np.ndarray:
+    """
+    Calcula de forma vectorizada la distancia coseno entre cada embedding y el siguiente.
+
+    Args:
+        embeddings (array-like): Matriz (n, d) de embeddings en el orden de las oraciones.
+
+    Returns:
+        np.ndarray: Vector de largo n - 1 con las distancias 1 - cos(e_i, e_{i+1}).
+    """
+    if len(embeddings) < 2:
+        return np.empty(0, dtype=np.float64)
+
+    normalized = normalize_rows(embeddings, np.float64)
+    return 1.0 - np.einsum("ij,ij->i", normalized[:-1], normalized[1:])
+
+def chunk_boundaries(distances, threshold: float) -> np.ndarray:
+    """
+    Obtiene los puntos de corte entre fragmentos a partir del vector de distancias.
+
+    Args:
+        distances (array-like): Distancias entre oraciones consecutivas.
+        threshold (float): Umbral para decidir la separación de fragmentos.
+
+    Returns:
+        np.ndarray: Índices de la primera oración de cada fragmento nuevo (sin incluir el 0).
+    """
+    return np.flatnonzero(np.asarray(distances) > threshold) + 1
+
+def chunks_from_boundaries(sentence_texts: List[str], boundaries) -> List[str]:
+    """
+    Construye los fragmentos de texto uniendo las oraciones entre puntos de corte consecutivos.
+
+    Args:
+        sentence_texts (List[str]): Texto de cada oración, en orden.
+        boundaries (array-like): Puntos de corte devueltos por `chunk_boundaries`.
+
+    Returns:
+        List[str]: Lista de fragmentos de texto.
+    """
+    if not sentence_texts:
+        return list()
+    starts = [0, *boundaries]
+    ends = [*boundaries, len(sentence_texts)]
+    return [' '.join(sentence_texts[start:end]) for start, end in zip(starts, ends)]
+
 def split_into_chunks(sentences: List[Dict[str, str]], distances: List[float], threshold: float) -> List[str]:
     """
     Divide el texto en fragmentos basado en la distancia coseno entre oraciones.
@@ -40,17 +143,187 @@ def split_into_chunks(sentences: List[Dict[str, str]], distances: List[float], t
     Returns:
         List[str]: Lista de fragmentos de texto.
     """
-    chunks = list()
-    start_index = 0
+    sentence_texts = [sentence['sentence'] for sentence in sentences]
+    return chunks_from_boundaries(sentence_texts, chunk_boundaries(distances, threshold).tolist())
+
+@lru_cache(maxsize=None)
+def get_model_token_limits(model_name: str) -> Tuple[object, int]:
+    """
+    Obtiene el tokenizador del modelo de embeddings y su largo máximo de secuencia, sin cargar los pesos del modelo.
+
+    El largo máximo se lee de `sentence_bert_config.json` (el mismo que usa sentence-transformers); si el modelo no
+    lo trae, se usa el del tokenizador acotado a 512 tokens.
+
+    Args:
+        model_name (str): Nombre o carpeta local del modelo de embeddings.
+
+    Returns:
+        Tuple[object, int]: Tokenizador y número máximo de tokens que el modelo procesa antes de truncar.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    try:
+        if os.path.isdir(model_name):
+            config_path = os.path.join(model_name, "sentence_bert_config.json")
+        else:
+            config_path = hf_hub_download(model_name, "sentence_bert_config.json")
+        with open(config_path, encoding="utf-8") as config_file:
+            return tokenizer, int(json.load(config_file)["max_seq_length"])
+    except (OSError, KeyError, ValueError):
+        return tokenizer, min(tokenizer.model_max_length, 512)
+
+def count_tokens(texts: List[str], tokenizer) -> np.ndarray:
+    """
+    Cuenta los tokens de cada texto sin incluir los tokens especiales.
+
+    Args:
+        texts (List[str]): Textos a tokenizar.
+        tokenizer: Tokenizador de Hugging Face.
+
+    Returns:
+        np.ndarray: Número de tokens por texto.
+    """
+    if not texts:
+        return np.empty(0, dtype=np.int64)
+    encoded = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+    return np.fromiter((len(ids) for ids in encoded), dtype=np.int64, count=len(texts))
+
+def bounded_segments(token_counts: np.ndarray, distances, boundaries, min_tokens: int,
+    max_tokens: int) -> List[Tuple[int, int]]:
+    """
+    Ajusta los fragmentos semánticos para que respeten un mínimo y un máximo de tokens.
+
+    Los fragmentos que superan el máximo se dividen sucesivamente en el mayor pico de distancia interno;
+    luego los fragmentos menores al mínimo se fusionan con el siguiente si la suma no supera el máximo.
+
+    Args:
+        token_counts (np.ndarray): Tokens de cada oración.
+        distances (array-like): Distancias entre oraciones consecutivas.
+        boundaries (array-like): Puntos de corte semánticos devueltos por `chunk_boundaries`.
+        min_tokens (int): Tamaño mínimo deseado de un fragmento.
+        max_tokens (int): Tamaño máximo de un fragmento.
+
+    Returns:
+        List[Tuple[int, int]]: Rangos [inicio, fin) de oraciones de cada fragmento. Un rango de una sola
+        oración puede seguir superando el máximo; `split_into_chunks_bounded` lo corta por palabras.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    prefix = np.concatenate(([0], np.cumsum(token_counts)))
+
+    def tokens(start: int, end: int) -> int:
+        return int(prefix[end] - prefix[start])
+
+    def split(start: int, end: int) -> List[Tuple[int, int]]:
+        # Pila explícita en vez de recursión: un fragmento de miles de oraciones puede cortarse miles de veces.
+        pieces, pending = list(), [(start, end)]
+        while pending:
+            start, end = pending.pop()
+            if end - start <= 1 or tokens(start, end) <= max_tokens:
+                pieces.append((start, end))
+                continue
+            cut = start + 1 + int(np.argmax(distances[start:end - 1]))
+            pending.extend(((cut, end), (start, cut)))
+        return pieces
+
+    starts = [0, *boundaries]
+    ends = [*boundaries, len(token_counts)]
+    segments = [piece for start, end in zip(starts, ends) if end > start for piece in split(start, end)]
 
-    for i, distance in enumerate(distances):
-        if distance > threshold:
-            chunk = ' '.join(sentence['sentence'] for sentence in sentences[start_index:i + 1])
-            chunks.append(chunk)
-            start_index = i + 1
+    merged = list()
+    for start, end in segments:
+        if merged:
+            previous_start, previous_end = merged[-1]
+            too_small = tokens(previous_start, previous_end) < min_tokens or tokens(start, end) < min_tokens
+            if too_small and tokens(previous_start, end) <= max_tokens:
+                merged[-1] = (previous_start, end)
+                continue
+        merged.append((start, end))
+    return merged
 
-    if start_index < len(sentences):
-        chunk = ' '.join(sentence['sentence'] for sentence in sentences[start_index:])
-        chunks.append(chunk)
+def split_text_by_tokens(text: str, num_tokens: int, max_tokens: int) -> List[str]:
+    """
+    Corta una oración demasiado larga en partes de tamaño similar por número de palabras.
+
+    Args:
+        text (str): Oración a dividir.
+        num_tokens (int): Tokens de la oración.
+        max_tokens (int): Máximo de tokens por parte.
 
+    Returns:
+        List[str]: Partes de la oración.
+    """
+    words = text.split()
+    num_pieces = min(-(-num_tokens // max_tokens), max(len(words), 1))
+    return [' '.join(piece) for piece in np.array_split(np.array(words, dtype=object), num_pieces) if len(piece)]
+
+def resolve_token_bounds(model_name: str, min_tokens: Optional[int] = None,
+    max_tokens: Optional[int] = None) -> Tuple[object, int, int]:
+    """
+    Determina los límites de tokens por fragmento a partir del largo máximo del modelo de embeddings.
+
+    Args:
+        model_name (str): Nombre del modelo de embeddings.
+        min_tokens (Optional[int]): Mínimo explícito; por defecto un cuarto del máximo.
+        max_tokens (Optional[int]): Máximo explícito; por defecto el largo del modelo menos los tokens especiales.
+
+    Returns:
+        Tuple[object, int, int]: Tokenizador, mínimo y máximo de tokens.
+    """
+    tokenizer, max_seq_length = get_model_token_limits(model_name)
+    model_limit = max_seq_length - 2
+    max_tokens = min(max_tokens or model_limit, model_limit)
+    min_tokens = min(min_tokens if min_tokens is not None else max_tokens // 4, max_tokens)
+    return tokenizer, min_tokens, max_tokens
+
+def split_into_chunks_bounded(sentences: List[Dict[str, str]], distances: List[float], threshold: float, model_name: str,
+    min_tokens: Optional[int] = None, max_tokens: Optional[int] = None) -> List[str]:
+    """
+    Divide el texto en fragmentos semánticos acotados al largo de secuencia del modelo de embeddings.
+
+    Args:
+        sentences (List[Dict[str, str]]): Lista de oraciones.
+        distances (List[float]): Distancias entre oraciones consecutivas.
+        threshold (float): Umbral para decidir la separación de fragmentos.
+        model_name (str): Nombre del modelo de embeddings, usado para tokenizar y obtener el límite.
+        min_tokens (Optional[int]): Mínimo de tokens por fragmento.
+        max_tokens (Optional[int]): Máximo de tokens por fragmento.
+
+    Returns:
+        List[str]: Lista de fragmentos de texto.
+    """
+    tokenizer, min_tokens, max_tokens = resolve_token_bounds(model_name, min_tokens, max_tokens)
+    sentence_texts = [sentence['sentence'] for sentence in sentences]
+    token_counts = count_tokens(sentence_texts, tokenizer)
+    segments = bounded_segments(token_counts, distances, chunk_boundaries(distances, threshold).tolist(),
+                                min_tokens, max_tokens)
+
+    chunks = list()
+    for start, end in segments:
+        if end - start == 1 and token_counts[start] > max_tokens:
+            chunks.extend(split_text_by_tokens(sentence_texts[start], int(token_counts[start]), max_tokens))
+        else:
+            chunks.append(' '.join(sentence_texts[start:end]))
     return chunks
+
+def chunk_token_report(chunks: List[str], model_name: str) -> Dict[str, float]:
+    """
+    Resume el tamaño en tokens de los fragmentos frente al límite del modelo de embeddings.
+
+    Args:
+        chunks (List[str]): Fragmentos de texto.
+        model_name (str): Nombre del modelo de embeddings.
+
+    Returns:
+        Dict[str, float]: Número de fragmentos, tokens totales, tokens truncados por el modelo y su proporción.
+    """
+    tokenizer, max_seq_length = get_model_token_limits(model_name)
+    token_counts = count_tokens(chunks, tokenizer)
+    truncated = np.clip(token_counts - (max_seq_length - 2), 0, None)
+    total_tokens = int(token_counts.sum())
+    return {
+        "num_chunks": len(chunks),
+        "total_tokens": total_tokens,
+        "max_chunk_tokens": int(token_counts.max()) if len(token_counts) else 0,
+        "truncated_tokens": int(truncated.sum()),
+        "truncated_share": float(truncated.sum() / total_tokens) if total_tokens else 0.0,
+        "stored_chars": int(sum(len(chunk) for chunk in chunks)),
+    }
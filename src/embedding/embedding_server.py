@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import logging
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+DEFAULT_SOCKET_PATH = os.environ.get("RAG_EMBEDDING_SOCKET", "/tmp/rag_embeddings.sock")
+_HEADER = struct.Struct("!I")
+
+
+def _send_message(connection: socket.socket, header: dict, payload: bytes = b"") -> None:
+    """Envía un encabezado JSON con prefijo de largo seguido de un bloque binario opcional."""
+    encoded = json.dumps(header).encode("utf-8")
+    connection.sendall(_HEADER.pack(len(encoded)) + encoded + payload)
+
+def _receive_exact(connection: socket.socket, size: int) -> bytes:
+    """Lee exactamente `size` bytes del socket."""
+    buffer = bytearray()
+    while len(buffer) < size:
+        data = connection.recv(size - len(buffer))
+        if not data:
+            raise ConnectionError("El servidor de embeddings cerró la conexión.")
+        buffer.extend(data)
+    return bytes(buffer)
+
+def _receive_header(connection: socket.socket) -> dict:
+    """Lee un encabezado JSON con prefijo de largo."""
+    (size,) = _HEADER.unpack(_receive_exact(connection, _HEADER.size))
+    return json.loads(_receive_exact(connection, size).decode("utf-8"))
+
+
+class DynamicBatcher:
+    """
+    Agrupa las solicitudes de embedding que llegan de todas las conexiones y las resuelve con una sola llamada
+    al modelo por lote.
+    """
+
+    def __init__(self, model: Embeddings, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        """
+        Args:
+            model (Embeddings): Modelo de embeddings cargado una sola vez.
+            max_batch_size (int): Máximo de textos por lote (una solicitud más grande se procesa sola).
+            max_wait_ms (float): Milisegundos que el primer pedido de un lote espera a que se sumen otros.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests: queue.Queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "batches": 0, "texts": 0}
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """
+        Encola textos para embeber.
+
+        Args:
+            texts (List[str]): Textos de una solicitud.
+
+        Returns:
+            Future: Se resuelve con la matriz (n, d) de embeddings de la solicitud.
+        """
+        future = Future()
+        self.requests.put((texts, future))
+        return future
+
+    def snapshot_stats(self) -> dict:
+        """Devuelve una copia consistente de las solicitudes, lotes y textos procesados."""
+        with self.lock:
+            return dict(self.stats)
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        batch = [self.requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                texts, future = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append((texts, future))
+            size += len(texts)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = np.asarray(self.model.embed_documents(texts), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self.lock:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                self.stats["texts"] += len(texts)
+            start = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[start:start + len(request_texts)])
+                start += len(request_texts)
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """Atiende una conexión persistente: cada mensaje es una solicitud de embedding."""
+
+    def handle(self) -> None:
+        while True:
+            try:
+                request = _receive_header(self.request)
+            except (ConnectionError, struct.error):
+                return
+            except ValueError as e:
+                # El encabezado tenía largo válido pero no era JSON; el flujo sigue alineado para el siguiente mensaje.
+                _send_message(self.request, {"error": f"Solicitud mal formada: {e}"})
+                continue
+
+            if not isinstance(request, dict):
+                _send_message(self.request, {"error": "Solicitud mal formada: se esperaba un objeto JSON."})
+                continue
+            if request.get("model_name") != self.server.model_name:
+                _send_message(self.request, {"error": f"El servidor sirve '{self.server.model_name}', "
+                                                      f"no '{request.get('model_name')}'."})
+                continue
+            if request.get("op") == "stats":
+                _send_message(self.request, {"stats": self.server.batcher.snapshot_stats()})
+                continue
+            texts = request.get("texts")
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                # Validar aquí evita que un pedido inválido haga fallar al lote completo de otras conexiones.
+                _send_message(self.request, {"error": "Solicitud mal formada: 'texts' debe ser una lista de textos."})
+                continue
+
+            try:
+                vectors = self.server.batcher.submit(texts).result()
+            except Exception as e:
+                _send_message(self.request, {"error": str(e)})
+                continue
+            _send_message(self.request, {"shape": list(vectors.shape)}, vectors.tobytes())
+
+
+class EmbeddingServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Servidor local de embeddings sobre un socket Unix que mantiene un único modelo cargado.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, model_name: str, backend: str = "torch", max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0):
+        """
+        Args:
+            socket_path (str): Ruta del socket Unix.
+            model_name (str): Nombre del modelo de embeddings.
+            backend (str): Backend de inferencia del modelo, "torch" u "onnx".
+            max_batch_size (int): Ver `DynamicBatcher`.
+            max_wait_ms (float): Ver `DynamicBatcher`.
+        """
+        from src.embedding.embedding import get_embedding_model
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.model_name = model_name
+        self.batcher = DynamicBatcher(get_embedding_model(model_name, backend), max_batch_size, max_wait_ms)
+        super().__init__(socket_path, _EmbeddingRequestHandler)
+
+
+class EmbeddingServiceClient(Embeddings):
+    """
+    Cliente del servidor de embeddings; reemplaza a `HuggingFaceEmbeddings` sin cargar el modelo en el proceso.
+    """
+
+    def __init__(self, model_name: str, socket_path: str = DEFAULT_SOCKET_PATH, max_texts_per_request: int = 512,
+                 timeout: Optional[float] = 300.0):
+        """
+        Args:
+            model_name (str): Nombre del modelo; debe coincidir con el que sirve el servidor.
+            socket_path (str): Ruta del socket Unix del servidor.
+            max_texts_per_request (int): Textos enviados por mensaje en `embed_documents`.
+            timeout (Optional[float]): Segundos de espera por respuesta.
+        """
+        self.model_name = model_name
+        self.socket_path = socket_path
+        self.max_texts_per_request = max_texts_per_request
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.settimeout(self.timeout)
+            try:
+                connection.connect(self.socket_path)
+            except OSError:
+                connection.close()
+                raise
+            self.local.connection = connection
+        return connection
+
+    def _request(self, header: dict) -> Tuple[dict, bytes]:
+        header = {"model_name": self.model_name, **header}
+        try:
+            connection = self._connection()
+            _send_message(connection, header)
+            response = _receive_header(connection)
+            payload = _receive_exact(connection, 4 * int(np.prod(response["shape"]))) if "shape" in response else b""
+        except (OSError, ConnectionError):
+            # La conexión de este hilo queda inservible (puede tener una respuesta a medio leer); se cierra y se
+            # reabre en la siguiente solicitud.
+            connection = getattr(self.local, "connection", None)
+            self.local.connection = None
+            if connection is not None:
+                connection.close()
+            raise
+        if "error" in response:
+            raise RuntimeError(f"Error del servidor de embeddings: {response['error']}")
+        return response, payload
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        response, payload = self._request({"op": "embed", "texts": texts})
+        return np.frombuffer(payload, dtype=np.float32).reshape(response["shape"])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return list()
+        step = self.max_texts_per_request
+        return np.vstack([self._embed(list(texts[i:i + step])) for i in range(0, len(texts), step)]).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    def server_stats(self) -> dict:
+        """Devuelve las solicitudes, lotes y textos procesados por el servidor desde que arrancó."""
+        return self._request({"op": "stats"})[0]["stats"]
+
+
+if __name__ == "__main__":
+    from src.retrievers.retrievers import load_config
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config("config.yaml")
+    parser = argparse.ArgumentParser(description="Servidor local de embeddings sobre un socket Unix.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH)
+    args = parser.parse_args()
+
+    server = EmbeddingServer(
+        args.socket,
+        config["model_name"],
+        config.get("embedding_server_backend", "torch"),
+        config.get("embedding_server_max_batch", 64),
+        config.get("embedding_server_max_wait_ms", 5.0),
+    )
+    logging.info(f"Servidor de embeddings escuchando en {args.socket}")
+    server.serve_forever()
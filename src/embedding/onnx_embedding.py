@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import psutil
+from langchain_core.embeddings import Embeddings
+
+from src.embedding.embedding import normalize_rows
+
+
+ONNX_CACHE_DIR = "/tmp/onnx_models"
+
+
+def export_onnx_model(model_name: str, cache_dir: str = ONNX_CACHE_DIR, quantize: bool = True) -> str:
+    """
+    Exporta un modelo de sentence-transformers a ONNX y, opcionalmente, lo cuantiza dinámicamente a int8.
+
+    La exportación se hace una sola vez; las llamadas siguientes reutilizan los archivos en `cache_dir`.
+
+    Args:
+        model_name (str): Nombre del modelo de embeddings.
+        cache_dir (str): Carpeta donde se guardan los modelos exportados.
+        quantize (bool): Si es True, genera además la versión int8 del modelo.
+
+    Returns:
+        str: Carpeta con el modelo ONNX, el tokenizador y la configuración de pooling.
+    """
+    target_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(target_dir, "model.onnx")
+    int8_path = os.path.join(target_dir, "model.int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        from sentence_transformers.models import Normalize
+
+        os.makedirs(target_dir, exist_ok=True)
+        st_model = SentenceTransformer(model_name, device="cpu")
+        transformer = st_model[0].auto_model.eval()
+        pooling = st_model[1]
+
+        dummy = st_model.tokenizer(["texto de ejemplo"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+
+        logging.info(f"Exportando {model_name} a ONNX en {fp32_path}")
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(dummy[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+
+        st_model.tokenizer.save_pretrained(target_dir)
+        settings = {
+            "pooling": "cls" if pooling.pooling_mode_cls_token else "mean",
+            "normalize": any(isinstance(module, Normalize) for module in st_model),
+            "max_seq_length": st_model.max_seq_length,
+            "pad_token": st_model.tokenizer.pad_token,
+            "pad_token_id": st_model.tokenizer.pad_token_id,
+        }
+        with open(os.path.join(target_dir, "embedding_config.json"), "w") as file:
+            json.dump(settings, file)
+
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        logging.info(f"Cuantizando {fp32_path} a int8")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    return target_dir
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Embeddings calculados con ONNX Runtime en CPU, con la misma interfaz que `HuggingFaceEmbeddings`.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = True, num_threads: Optional[int] = None,
+                 batch_size: int = 32, cache_dir: str = ONNX_CACHE_DIR):
+        """
+        Args:
+            model_name (str): Nombre del modelo de sentence-transformers a exportar.
+            quantize (bool): Usa el modelo cuantizado a int8 si es True, o el fp32 exportado si es False.
+            num_threads (Optional[int]): Hilos intra-op de ONNX Runtime; por defecto los núcleos físicos.
+            batch_size (int): Número de textos por inferencia.
+            cache_dir (str): Carpeta donde se guardan los modelos exportados.
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = export_onnx_model(model_name, cache_dir, quantize)
+        with open(os.path.join(model_dir, "embedding_config.json")) as file:
+            settings = json.load(file)
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.pooling = settings["pooling"]
+        self.normalize = settings["normalize"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=settings["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=settings["pad_token_id"], pad_token=settings["pad_token"])
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads or psutil.cpu_count(logical=False) or os.cpu_count()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        model_file = "model.int8.onnx" if quantize else "model.onnx"
+        self.session = ort.InferenceSession(os.path.join(model_dir, model_file), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Calcula los embeddings de una lista de textos.
+
+        Args:
+            texts (List[str]): Textos a embeber.
+
+        Returns:
+            np.ndarray: Matriz (len(texts), d) en float32.
+        """
+        batches = list()
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + self.batch_size])
+            attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                "attention_mask": attention_mask,
+                "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+
+            if self.pooling == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = attention_mask[..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+            if self.normalize:
+                pooled = normalize_rows(pooled)
+            batches.append(pooled.astype(np.float32))
+
+        return np.vstack(batches) if batches else np.empty((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+def check_embedding_drift(candidate: Embeddings, reference: Embeddings, texts: List[str],
+    min_cosine: float = 0.99) -> Dict[str, float]:
+    """
+    Compara los vectores de un backend contra los de referencia (fp32) sobre los mismos textos.
+
+    Args:
+        candidate (Embeddings): Modelo a validar, por ejemplo el ONNX int8.
+        reference (Embeddings): Modelo de referencia, por ejemplo `HuggingFaceEmbeddings`.
+        texts (List[str]): Textos de muestra.
+        min_cosine (float): Similitud coseno mínima aceptable por texto.
+
+    Returns:
+        Dict[str, float]: Similitud coseno mínima y media, y si la deriva es aceptable.
+    """
+    candidate_vectors = normalize_rows(candidate.embed_documents(texts), np.float64)
+    reference_vectors = normalize_rows(reference.embed_documents(texts), np.float64)
+    cosines = np.einsum("ij,ij->i", candidate_vectors, reference_vectors)
+
+    report = {
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "acceptable": bool(cosines.min() >= min_cosine),
+    }
+    if not report["acceptable"]:
+        logging.warning(f"Deriva de embeddings por sobre lo tolerado: {report}")
+    return report
+
+def benchmark_embedding_throughput(models: Dict[str, Embeddings], texts: List[str], repeats: int = 3) -> pd.DataFrame:
+    """
+    Mide el rendimiento (oraciones por segundo) de distintos backends de embeddings.
+
+    Args:
+        models (Dict[str, Embeddings]): Backends a comparar, indexados por nombre.
+        texts (List[str]): Textos a embeber en cada repetición.
+        repeats (int): Número de repeticiones; se reporta la mejor.
+
+    Returns:
+        pd.DataFrame: Una fila por backend con el mejor tiempo y las oraciones por segundo.
+    """
+    rows = list()
+    for name, model in models.items():
+        model.embed_documents(texts[:8])
+        timings = list()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.embed_documents(texts)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        rows.append({"backend": name, "seconds": best, "sentences_per_second": len(texts) / best})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from src.chunking.chunking import (load_pdf_all_documents, clean_text_and_exclude_sections,
+                                       split_text_into_sentences, combine_sentences)
+    from src.retrievers.retrievers import load_config
+
+    logging.basicConfig(level=logging.INFO)
+    config = load_config("config.yaml")
+    pdf_texts = load_pdf_all_documents(config["directory_path"])
+    sentences = combine_sentences(split_text_into_sentences(clean_text_and_exclude_sections(" ".join(pdf_texts))),
+                                  config["buffer_size"])
+    sample = [sentence["combined_sentence"] for sentence in sentences[:2000]]
+
+    reference = HuggingFaceEmbeddings(model_name=config["model_name"])
+    onnx_fp32 = OnnxEmbeddings(config["model_name"], quantize=False, num_threads=config.get("onnx_num_threads"))
+    onnx_int8 = OnnxEmbeddings(config["model_name"], quantize=True, num_threads=config.get("onnx_num_threads"))
+
+    print("Deriva ONNX int8 vs PyTorch fp32:", check_embedding_drift(onnx_int8, reference, sample[:500]))
+    print(benchmark_embedding_throughput(
+        {"torch_fp32": reference, "onnx_fp32": onnx_fp32, "onnx_int8": onnx_int8}, sample).to_string(index=False))
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import os
 import logging
@@ -6,14 +7,18 @@ import random
 import streamlit as st
 
 from datasets import Dataset
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Sequence, Tuple, Optional
 
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.document_loaders import PyPDFLoader
 from langchain.prompts import ChatPromptTemplate
 from ragas import evaluate
+from ragas.cost import get_token_usage_for_openai
 from ragas.metrics import ( faithfulness, answer_relevancy,  context_recall, context_precision )
 from src.retrievers.retrievers import ( create_llm )
+from src.loaders.loaders import LazyPdfPages
+from src.telemetry.telemetry import invoke_with_telemetry
+from src.run_store.run_store import (
+    METRICS, import_question_set_from_excel, latest_question_set_id, load_question_set, save_question_set, save_run)
 
 
 def generate_factoid_qa_prompt():
@@ -78,23 +83,26 @@ def question_chain(context: str, prompt: str, config: dict) -> str:
     return parsed_output
 
 
-def process_multiple_docs(docs: List[object], prompt: str, config: Dict[str, str], num_samples: int = 15) -> List[str]:
+def process_multiple_docs(docs: Sequence[object], prompt: str, config: Dict[str, str], num_samples: int = 15) -> List[str]:
     """
     Procesa múltiples documentos seleccionando una muestra aleatoria y generando preguntas basadas en el contexto.
 
+    Solo se accede a los elementos muestreados, por lo que `docs` puede ser una secuencia perezosa
+    (`LazyPdfPages`, `LazyChunkView`).
+
     Args:
-        docs (List[object]): Lista de objetos de documentos, donde cada documento tiene un atributo `page_content`.
+        docs (Sequence[object]): Documentos con atributo `page_content` o fragmentos "super" con clave "chunk_text".
         prompt (str): Plantilla del prompt que será utilizada para generar preguntas.
         config (Dict[str, str]): Configuración para el modelo de lenguaje, incluyendo el nombre del modelo,
                                  la temperatura de generación y la clave de API de OpenAI.
         num_samples (int, opcional): Número de documentos a seleccionar aleatoriamente para procesar. 
-                                     Por defecto es 15.
+                                     Por defecto es 15; si hay menos documentos se usan todos.
 
     Returns:
         List[str]: Lista de preguntas generadas por el modelo de lenguaje para cada documento de la muestra.
     """
-    sampled_docs = random.sample(docs, num_samples)
-    sampled_docs_processed = [doc.page_content for doc in sampled_docs]
+    sampled_docs = random.sample(docs, min(num_samples, len(docs)))
+    sampled_docs_processed = [doc["chunk_text"] if isinstance(doc, dict) else doc.page_content for doc in sampled_docs]
     
     questions = [
         question_chain(sampled_context, prompt, config)
@@ -128,28 +136,46 @@ def extract_questions_and_answers(data: List[object]) -> Tuple[List[str], List[s
     return questions, answers
 
 
-def evaluate_rag_pipeline(rag_chain: object, retriever: object, questions: List[str], ground_truths: List[List[str]]) -> pd.DataFrame:
+def answer_questions(rag_chain: object, retriever: object, questions: List[str], rag: Optional[str] = None,
+    on_record: Optional[Callable[[dict], None]] = None) -> Tuple[List[str], List[List[str]]]:
     """
-    Realiza la inferencia con un pipeline RAG, evalúa los resultados y devuelve un DataFrame con las métricas.
+    Responde las preguntas con la cadena RAG y recupera los contextos de cada una.
 
     Args:
         rag_chain: El modelo RAG para generar respuestas.
         retriever: El componente de recuperación para obtener contextos relevantes.
-        questions (list): Lista de preguntas para realizar la inferencia.
-        ground_truths (list): Lista de respuestas esperadas (ground truths) para evaluación.
+        questions (List[str]): Preguntas a responder.
+        rag (Optional[str]): Pipeline evaluado, se anota en la telemetría de cada consulta.
+        on_record (Optional[Callable[[dict], None]]): Ver `invoke_with_telemetry`.
 
     Returns:
-        pandas.DataFrame: DataFrame con los resultados de la evaluación.
+        Tuple[List[str], List[List[str]]]: Respuestas y textos de los contextos recuperados por pregunta.
     """
     answers = list()
     contexts = list()
 
     for query in questions:
 
-        answers.append(rag_chain.invoke(query))
+        answers.append(invoke_with_telemetry(rag_chain, query, source="evaluation", rag=rag, on_record=on_record))
         relevant_docs = retriever.invoke(query)
         contexts.append([doc.page_content for doc in relevant_docs])
+    return answers, contexts
 
+def score_answers(questions: List[str], answers: List[str], contexts: List[List[str]], ground_truths: List[List[str]],
+    token_usage_parser: Optional[Callable] = None) -> object:
+    """
+    Evalúa con ragas las respuestas ya generadas usando las cuatro métricas juzgadas por LLM.
+
+    Args:
+        questions (List[str]): Preguntas.
+        answers (List[str]): Respuestas de la cadena RAG.
+        contexts (List[List[str]]): Contextos recuperados por pregunta.
+        ground_truths (List[List[str]]): Respuestas esperadas por pregunta.
+        token_usage_parser (Optional[Callable]): Si se indica, ragas contabiliza los tokens del juez.
+
+    Returns:
+        object: Resultado de `ragas.evaluate`.
+    """
     dataset = Dataset.from_dict({
         "question": questions,
         "answer": answers,
@@ -159,7 +185,7 @@ def evaluate_rag_pipeline(rag_chain: object, retriever: object, questions: List[
     })
 
 
-    result = evaluate(
+    return evaluate(
         dataset=dataset, 
         metrics=[
             context_precision,
@@ -167,49 +193,181 @@ def evaluate_rag_pipeline(rag_chain: object, retriever: object, questions: List[
             faithfulness,
             answer_relevancy,
         ],
+        token_usage_parser=token_usage_parser,
     )
 
+def evaluate_rag_pipeline(rag_chain: object, retriever: object, questions: List[str], ground_truths: List[List[str]],
+    rag: Optional[str] = None) -> pd.DataFrame:
+    """
+    Realiza la inferencia con un pipeline RAG, evalúa los resultados y devuelve un DataFrame con las métricas.
+
+    Args:
+        rag_chain: El modelo RAG para generar respuestas.
+        retriever: El componente de recuperación para obtener contextos relevantes.
+        questions (list): Lista de preguntas para realizar la inferencia.
+        ground_truths (list): Lista de respuestas esperadas (ground truths) para evaluación.
+        rag (Optional[str]): Pipeline evaluado, se anota en la telemetría de cada consulta.
+
+    Returns:
+        pandas.DataFrame: DataFrame con los resultados de la evaluación.
+    """
+    answers, contexts = answer_questions(rag_chain, retriever, questions, rag)
+    result = score_answers(questions, answers, contexts, ground_truths)
+
     df = result.to_pandas()
     return df
 
+def bootstrap_confidence_intervals(results: pd.DataFrame, metrics: List[str] = METRICS, confidence: float = 0.95,
+    num_resamples: int = 1000, seed: int = 0) -> Dict[str, Tuple[float, float]]:
+    """
+    Calcula intervalos de confianza bootstrap (percentiles) para el promedio de cada métrica.
+
+    Args:
+        results (pd.DataFrame): Resultados por pregunta con una columna por métrica.
+        metrics (List[str]): Métricas a considerar; se ignoran los valores nulos de cada una.
+        confidence (float): Nivel de confianza del intervalo.
+        num_resamples (int): Remuestreos bootstrap.
+        seed (int): Semilla del remuestreo.
+
+    Returns:
+        Dict[str, Tuple[float, float]]: Límites inferior y superior por métrica; (nan, nan) si no hay valores.
+    """
+    rng = np.random.default_rng(seed)
+    tail = 100 * (1 - confidence) / 2
+    intervals = dict()
+    for metric in metrics:
+        values = results[metric].dropna().to_numpy(dtype=np.float64) if metric in results else np.empty(0)
+        if len(values) == 0:
+            intervals[metric] = (float("nan"), float("nan"))
+            continue
+        means = values[rng.integers(0, len(values), size=(num_resamples, len(values)))].mean(axis=1)
+        low, high = np.percentile(means, [tail, 100 - tail])
+        intervals[metric] = (float(low), float(high))
+    return intervals
+
+def evaluate_rag_pipeline_sequential(rag_chain: object, retriever: object, questions: List[str],
+    ground_truths: List[List[str]], rag: Optional[str] = None, batch_size: int = 5, ci_width: float = 0.1,
+    token_budget: Optional[int] = None, confidence: float = 0.95, min_questions: int = 10, num_resamples: int = 1000,
+    seed: int = 0) -> Tuple[pd.DataFrame, Dict[str, object]]:
+    """
+    Evalúa el pipeline por lotes de preguntas en orden aleatorio y se detiene apenas los intervalos de confianza
+    bootstrap de todas las métricas son más angostos que `ci_width` o se agota el presupuesto de tokens. Las
+    métricas sin ningún valor no cuentan para ese criterio.
+
+    Con la misma semilla, dos pipelines ven las preguntas en el mismo orden, por lo que sus corridas son comparables.
+
+    Args:
+        rag_chain: El modelo RAG para generar respuestas.
+        retriever: El componente de recuperación para obtener contextos relevantes.
+        questions (List[str]): Preguntas disponibles.
+        ground_truths (List[List[str]]): Respuestas esperadas por pregunta.
+        rag (Optional[str]): Pipeline evaluado, se anota en la telemetría de cada consulta.
+        batch_size (int): Preguntas por lote.
+        ci_width (float): Ancho máximo (en escala 0 a 1) de los intervalos para detenerse.
+        token_budget (Optional[int]): Tokens máximos entre la cadena RAG y el juez de ragas; None no limita.
+        confidence (float): Nivel de confianza de los intervalos.
+        min_questions (int): Preguntas mínimas antes de evaluar el criterio de parada por intervalos.
+        num_resamples (int): Remuestreos bootstrap.
+        seed (int): Semilla del orden de las preguntas y del remuestreo.
+
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, object]]: Resultados de las preguntas evaluadas, ordenados por su índice en
+        `questions` (columna "position"), y un resumen con
+        "questions_evaluated", "total_questions", "tokens", "stop_reason" ("ci", "token_budget" o "exhausted")
+        e "intervals".
+    """
+    order = random.Random(seed).sample(range(len(questions)), len(questions))
+    tokens = {"total": 0}
+
+    def count_tokens(record: dict) -> None:
+        # Los modelos que no informan uso dejan None en el registro de telemetría.
+        tokens["total"] += (record.get("prompt_tokens") or 0) + (record.get("completion_tokens") or 0)
+
+    frames = list()
+    intervals = dict()
+    stop_reason = "exhausted"
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        batch_questions = [questions[i] for i in batch]
+        batch_ground_truths = [ground_truths[i] for i in batch]
+
+        answers, contexts = answer_questions(rag_chain, retriever, batch_questions, rag, on_record=count_tokens)
+        result = score_answers(batch_questions, answers, contexts, batch_ground_truths, get_token_usage_for_openai)
+        usage = result.total_tokens()
+        tokens["total"] += usage.input_tokens + usage.output_tokens
+        frame = result.to_pandas()
+        # Posición de cada pregunta en el conjunto original, para guardar los resultados alineados con él.
+        frame.insert(0, "position", batch)
+        frames.append(frame)
+
+        results = pd.concat(frames, ignore_index=True)
+        intervals = bootstrap_confidence_intervals(results, METRICS, confidence, num_resamples, seed)
+        # Una métrica sin valores (por ejemplo, si fallaron todas sus muestras) tiene intervalo (nan, nan) y no
+        # participa del criterio de parada; si ninguna tiene valores, solo se detiene por presupuesto o al agotarse.
+        widths = {metric: high - low for metric, (low, high) in intervals.items() if not np.isnan(high - low)}
+        missing = [metric for metric in intervals if metric not in widths]
+        logging.info(f"Evaluación secuencial: {len(results)}/{len(questions)} preguntas, {tokens['total']} tokens, "
+                     f"ancho máximo de intervalo {max(widths.values(), default=float('nan')):.3f}"
+                     + (f", sin valores: {', '.join(missing)}" if missing else ""))
+
+        if len(results) >= min_questions and widths and all(width <= ci_width for width in widths.values()):
+            stop_reason = "ci"
+            break
+        if token_budget is not None and tokens["total"] >= token_budget:
+            stop_reason = "token_budget"
+            break
+
+    results = pd.concat(frames, ignore_index=True).sort_values("position", ignore_index=True) if frames else pd.DataFrame()
+    return results, {
+        "questions_evaluated": len(results),
+        "total_questions": len(questions),
+        "tokens": tokens["total"],
+        "stop_reason": stop_reason,
+        "intervals": intervals,
+    }
+
 def evaluate_and_save_results(rag_chain: object, retriever: object, config: dict, use_existing_questions: bool = True,
-    questions_file: Optional[str] = "data/evaluation_data.xlsx") -> pd.DataFrame:
+    questions_file: Optional[str] = "data/evaluation_data.xlsx", chunks: Optional[Sequence] = None) -> pd.DataFrame:
     """
-    Evalúa la tubería RAG con opciones para generar preguntas o usar un archivo existente.
+    Evalúa la tubería RAG con opciones para generar preguntas o usar un conjunto existente, y agrega los resultados
+    como una corrida nueva al almacén de corridas.
 
     Args:
         rag_chain (object): Cadena RAG inicializada para generar respuestas.
         retriever (object): Mecanismo de recuperación para buscar información relevante.
-        config (dict): Configuración con claves como "file_path", "num_samples", y "rag".
-        use_existing_questions (bool): Si es True, usa un archivo de preguntas existentes.
-        questions_file (Optional[str]): Ruta al archivo Excel que contiene preguntas y respuestas.
+        config (dict): Configuración con claves como "file_path", "num_samples", "rag" y "run_store_path"; si
+            "evaluation_sequential" es verdadero, evalúa por lotes con parada temprana según "evaluation_batch_size",
+            "evaluation_ci_width", "evaluation_token_budget", "evaluation_confidence", "evaluation_min_questions",
+            "evaluation_bootstrap_resamples" y "evaluation_seed" (ver `evaluate_rag_pipeline_sequential`).
+        use_existing_questions (bool): Si es True, usa el conjunto de preguntas más reciente del almacén.
+        questions_file (Optional[str]): Archivo Excel con preguntas y respuestas que se importa al almacén
+            si este todavía no tiene preguntas.
+        chunks (Optional[Sequence]): Fragmentos que ya tiene el pipeline en ejecución; si se indican, las preguntas
+            se generan a partir de una muestra de ellos. Si no, se extraen solo las páginas muestreadas de
+            "file_path" con `LazyPdfPages`.
 
     Returns:
         pd.DataFrame: DataFrame con resultados de la evaluación.
 
     Raises:
-        ValueError: Si no se puede generar o encontrar el archivo de preguntas cuando es necesario.
+        ValueError: Si no se puede generar o encontrar el conjunto de preguntas cuando es necesario.
     """
+    db_path = config.get("run_store_path", "data/runs.sqlite")
     try:
-        # Crear la carpeta "data" si no existe
-        if not os.path.exists("data"):
-            os.makedirs("data")
-        
         # Cargar o generar preguntas
         if use_existing_questions:
-            if not os.path.exists(questions_file):
-                st.warning(f"Archivo de preguntas '{questions_file}' no encontrado. Generando nuevas preguntas.")
-                use_existing_questions = False
-            else:
-                questions_df = pd.read_excel(questions_file)
-                if questions_df.empty:
-                    raise ValueError(f"El archivo '{questions_file}' está vacío. No se puede continuar.")
-                questions = questions_df["question"].tolist()
-                ground_truths = questions_df["answer"].tolist()
-        else:
-            # Generar preguntas usando el modelo
-            loader = PyPDFLoader(config["file_path"])
-            docs = loader.load()
+            if latest_question_set_id(db_path) is None:
+                if questions_file and os.path.exists(questions_file):
+                    import_question_set_from_excel(db_path, questions_file)
+                else:
+                    st.warning("No hay preguntas guardadas. Generando nuevas preguntas.")
+                    use_existing_questions = False
+            if use_existing_questions:
+                question_set_id, questions, ground_truths = load_question_set(db_path)
+
+        if not use_existing_questions:
+            # Generar preguntas usando el modelo, sin volver a parsear el documento completo
+            docs = chunks if chunks else LazyPdfPages(config["file_path"])
             if not docs:
                 raise ValueError("No se pudieron cargar documentos. Verifica el archivo y la configuración.")
 
@@ -223,24 +381,33 @@ def evaluate_and_save_results(rag_chain: object, retriever: object, config: dict
             if not questions or not ground_truths:
                 raise ValueError("La extracción de preguntas y respuestas falló.")
 
-            # Crear y guardar el archivo de evaluación
-            questions_df = pd.DataFrame({
-                "question": questions,
-                "answer": ground_truths
-            })
-            questions_df.to_excel(questions_file, index=False, engine="openpyxl")
-            st.success(f"Archivo de evaluación creado: '{questions_file}'.")
+            question_set_id = save_question_set(db_path, questions, ground_truths, source="generated")
+            st.success(f"Conjunto de preguntas {question_set_id} guardado en '{db_path}'.")
 
         # Evaluar con las preguntas obtenidas
-        df_raga = evaluate_rag_pipeline(rag_chain, retriever, questions, ground_truths)
+        if config.get("evaluation_sequential", False):
+            df_raga, summary = evaluate_rag_pipeline_sequential(
+                rag_chain, retriever, questions, ground_truths, config.get("rag"),
+                batch_size=config.get("evaluation_batch_size", 5),
+                ci_width=config.get("evaluation_ci_width", 0.1),
+                token_budget=config.get("evaluation_token_budget"),
+                confidence=config.get("evaluation_confidence", 0.95),
+                min_questions=config.get("evaluation_min_questions", 10),
+                num_resamples=config.get("evaluation_bootstrap_resamples", 1000),
+                seed=config.get("evaluation_seed", 0),
+            )
+            st.info(f"Evaluación secuencial detenida por '{summary['stop_reason']}': "
+                    f"{summary['questions_evaluated']} de {summary['total_questions']} preguntas, "
+                    f"{summary['tokens']} tokens.")
+            st.dataframe(pd.DataFrame(summary["intervals"], index=["Límite inferior", "Límite superior"]).T)
+        else:
+            df_raga = evaluate_rag_pipeline(rag_chain, retriever, questions, ground_truths, config.get("rag"))
         if df_raga.empty:
             raise ValueError("El DataFrame de resultados está vacío. Verifica el pipeline de evaluación.")
 
         # Guardar resultados
-        results_file = f"results_{config['rag']}.xlsx"
-        df_raga.to_excel(results_file, index=False, engine="openpyxl")
-        logging.info(f"Resultados guardados en: {results_file}")
-        st.success(f"Resultados de evaluación guardados en: '{results_file}'.")
+        run_id = save_run(db_path, df_raga, config, question_set_id)
+        st.success(f"Resultados de evaluación guardados como corrida {run_id} en '{db_path}'.")
 
         # Mostrar el promedio de las métricas principales
         metric_mapping = {
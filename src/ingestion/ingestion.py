@@ -0,0 +1,214 @@
+import io
+import os
+import time
+import zipfile
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+from xml.etree import ElementTree
+
+from PyPDF2 import PdfReader
+from langchain_core.documents import Document
+
+from src.loaders.loaders import split_pdf_documents
+from src.retrievers.retrievers import (build_super_chunks, remove_duplicate_chunks)
+from src.retrievers.registry import (RAG_TYPES, add_chunks_to_pipeline, get_pipeline, update_pipeline_documents)
+
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".docx")
+
+
+def parse_pdf(data: bytes) -> List[str]:
+    """Extrae el texto de cada página de un PDF."""
+    return [page.extract_text() or "" for page in PdfReader(io.BytesIO(data)).pages]
+
+def parse_txt(data: bytes) -> List[str]:
+    """Decodifica un archivo de texto; los saltos de página (form feed) separan páginas."""
+    return data.decode("utf-8", errors="replace").split("\f")
+
+def parse_docx(data: bytes) -> List[str]:
+    """Extrae los párrafos de un .docx leyendo directamente `word/document.xml`."""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = [
+        "".join(node.text or "" for node in paragraph.iter(f"{WORD_NAMESPACE}t"))
+        for paragraph in root.iter(f"{WORD_NAMESPACE}p")
+    ]
+    return ["\n".join(paragraph for paragraph in paragraphs if paragraph)]
+
+PARSERS = {".pdf": parse_pdf, ".txt": parse_txt, ".docx": parse_docx}
+
+
+def parse_document(filename: str, data: bytes) -> List[str]:
+    """
+    Extrae el texto de un documento subido según su formato.
+
+    Args:
+        filename (str): Nombre del archivo, usado para detectar el formato.
+        data (bytes): Contenido del archivo.
+
+    Returns:
+        List[str]: Texto de cada página (o del documento completo si el formato no tiene páginas).
+
+    Raises:
+        ValueError: Si la extensión no es pdf, txt ni docx.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in PARSERS:
+        raise ValueError(f"Formato no soportado: '{extension}'. Debe ser uno de {SUPPORTED_EXTENSIONS}.")
+    return PARSERS[extension](data)
+
+def chunk_document(filename: str, pages: List[str], rag_type: str, config: dict) -> Tuple[List, Dict[int, int]]:
+    """
+    Segmenta las páginas de un documento con la misma estrategia que usa el pipeline indicado.
+
+    Args:
+        filename (str): Nombre del archivo, guardado como "source" de cada fragmento (en la metadata si es "naive").
+        pages (List[str]): Texto de cada página.
+        rag_type (str): "super" o "naive".
+        config (dict): Configuración del proyecto.
+
+    Returns:
+        Tuple[List, Dict[int, int]]: Fragmentos listos para `add_chunks_to_pipeline`, sin casi duplicados, y el mapa
+        descartado -> canónico (índices de los fragmentos del documento antes de deduplicar).
+    """
+    if rag_type == "super":
+        chunks = build_super_chunks(pages, config)
+        for chunk in chunks:
+            chunk["source"] = filename
+        chunk_texts = [chunk["chunk_text"] for chunk in chunks]
+    else:
+        docs = [Document(page_content=page, metadata={"source": filename, "page": i}) for i, page in enumerate(pages)]
+        chunks = split_pdf_documents(docs)
+        chunk_texts = [chunk.page_content for chunk in chunks]
+    return remove_duplicate_chunks(chunks, chunk_texts, config)
+
+
+class IngestionQueue:
+    """
+    Cola de ingesta de documentos subidos: parsea, segmenta e indexa cada archivo en los pipelines vivos
+    con un pool de trabajadores de tamaño acotado.
+    """
+
+    def __init__(self, config: dict, upload_folder: str, max_workers: int = 2):
+        """
+        Args:
+            config (dict): Configuración del proyecto.
+            upload_folder (str): Carpeta donde se guardan los archivos subidos.
+            max_workers (int): Número máximo de trabajos de ingesta simultáneos.
+        """
+        self.config = config
+        self.upload_folder = upload_folder
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self.jobs: Dict[str, Dict] = dict()
+        self.hashes: Dict[str, str] = dict()
+        self.lock = threading.Lock()
+
+    def submit(self, filename: str, data: bytes) -> str:
+        """
+        Encola un archivo subido; los archivos con contenido ya visto no se vuelven a procesar.
+
+        Args:
+            filename (str): Nombre del archivo.
+            data (bytes): Contenido del archivo.
+
+        Returns:
+            str: Identificador del trabajo (el existente si el contenido ya fue encolado).
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            if content_hash in self.hashes:
+                return self.hashes[content_hash]
+            job_id = uuid4().hex[:8]
+            self.hashes[content_hash] = job_id
+            self.jobs[job_id] = {
+                "filename": filename,
+                "hash": content_hash,
+                "status": "en cola",
+                "chunks": 0,
+                "submitted_at": time.time(),
+            }
+        self.executor.submit(self._process, job_id, filename, data)
+        return job_id
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def _process(self, job_id: str, filename: str, data: bytes) -> None:
+        """Ejecuta un trabajo de ingesta: guarda, parsea, segmenta e indexa en cada pipeline."""
+        try:
+            self._update(job_id, status="parseando")
+            os.makedirs(self.upload_folder, exist_ok=True)
+            with open(os.path.join(self.upload_folder, filename), "wb") as file:
+                file.write(data)
+            pages = parse_document(filename, data)
+
+            indexed = 0
+            for rag_type in RAG_TYPES:
+                if get_pipeline(rag_type)["status"] == "error":
+                    continue
+                if rag_type == "super" and self.config.get("incremental_chunking", False):
+                    # Segmentación incremental: reemplaza el documento si ya existía y solo re-indexa lo que cambió.
+                    self._update(job_id, status=f"actualizando ({rag_type})")
+                    indexed += update_pipeline_documents(rag_type, {filename: pages})
+                    continue
+                self._update(job_id, status=f"segmentando ({rag_type})")
+                chunks, duplicate_map = chunk_document(filename, pages, rag_type, self.config)
+                with self.lock:
+                    self.jobs[job_id].setdefault("duplicate_map", dict())[rag_type] = duplicate_map
+                self._update(job_id, status=f"indexando ({rag_type})")
+                indexed += add_chunks_to_pipeline(rag_type, chunks)
+
+            self._update(job_id, status="listo", chunks=indexed, finished_at=time.time())
+            logging.info(f"Documento '{filename}' indexado: {indexed} fragmentos.")
+        except Exception as e:
+            logging.error(f"Error ingiriendo '{filename}': {e}")
+            with self.lock:
+                self.jobs[job_id].update(status="error", error=str(e), finished_at=time.time())
+                # Permite reintentar el mismo contenido.
+                self.hashes.pop(self.jobs[job_id]["hash"], None)
+
+    def status(self) -> List[Dict]:
+        """
+        Devuelve el estado de todos los trabajos, del más reciente al más antiguo.
+
+        Returns:
+            List[Dict]: Una entrada por trabajo con nombre, estado, fragmentos indexados, duración y "duplicate_map"
+                (mapa descartado -> canónico de cada pipeline, ver `chunk_document`).
+        """
+        with self.lock:
+            jobs = [dict(job, job_id=job_id) for job_id, job in self.jobs.items()]
+        for job in jobs:
+            job["seconds"] = round(job.get("finished_at", time.time()) - job["submitted_at"], 1)
+        return sorted(jobs, key=lambda job: job["submitted_at"], reverse=True)
+
+    def has_pending_jobs(self) -> bool:
+        """Indica si hay trabajos en curso."""
+        return any(job["status"] not in ("listo", "error") for job in self.status())
+
+
+_QUEUE: Optional[IngestionQueue] = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_ingestion_queue(config: dict, upload_folder: str) -> IngestionQueue:
+    """
+    Devuelve la cola de ingesta compartida por todas las sesiones del proceso.
+
+    Args:
+        config (dict): Configuración del proyecto; "ingestion_workers" define los trabajos simultáneos (por defecto 2).
+        upload_folder (str): Carpeta donde se guardan los archivos subidos.
+
+    Returns:
+        IngestionQueue: Cola de ingesta.
+    """
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = IngestionQueue(config, upload_folder, config.get("ingestion_workers", 2))
+        return _QUEUE
@@ -1,5 +1,8 @@
+from collections.abc import Sequence
 from dotenv import load_dotenv  
 
+from pypdf import PdfReader
+from langchain_core.documents import Document
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter  
 
@@ -37,3 +40,29 @@ def split_pdf_documents(docs, chunk_size=1000, chunk_overlap=200):
     splits = text_splitter.split_documents(docs)
 
     return splits  
+
+
+class LazyPdfPages(Sequence):
+    """
+    Páginas de un PDF direccionables por índice que se extraen solo al accederlas, con el mismo formato de
+    documento que `PyPDFLoader`; `random.sample` sobre ellas parsea únicamente las páginas muestreadas.
+    """
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path (str): Ruta al archivo PDF.
+        """
+        self.file_path = file_path
+        self.reader = PdfReader(file_path)
+
+    def __len__(self):
+        return len(self.reader.pages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        page = self.reader.pages[index]
+        return Document(page_content=page.extract_text() or "", metadata={"source": self.file_path, "page": index})
@@ -0,0 +1,172 @@
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pydantic import ConfigDict
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_qdrant import QdrantVectorStore
+
+from src.embedding.embedding import normalize_rows
+from src.vector_store_client.vector_store_client import fetch_store_points
+
+
+def section_key(metadata: Dict) -> Tuple:
+    """
+    Clave de sección de un fragmento según la jerarquía CFR (PART, Subpart, §).
+
+    Los fragmentos sin jerarquía (por ejemplo los "naive") se agrupan por página.
+
+    Args:
+        metadata (Dict): Metadata del fragmento.
+
+    Returns:
+        Tuple: Clave que identifica la sección.
+    """
+    hierarchy = tuple(metadata.get(key) or None for key in ("title", "subtitle", "sub_subtitle"))
+    if any(hierarchy):
+        return hierarchy
+    return ("page", metadata.get("source"), metadata.get("page"))
+
+
+class HierarchicalRetriever(BaseRetriever):
+    """
+    Recuperación en dos etapas: primero los centroides de sección más cercanos y luego los fragmentos
+    dentro de esas secciones.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    embeddings: Embeddings
+    documents: List[Document]
+    chunk_vectors: np.ndarray
+    section_vectors: np.ndarray
+    section_offsets: np.ndarray
+    k: int = 4
+    sections_probe: int = 8
+
+    @classmethod
+    def from_vectors(cls, embeddings: Embeddings, documents: List[Document], vectors: np.ndarray,
+                     k: int = 4, sections_probe: int = 8) -> "HierarchicalRetriever":
+        """
+        Construye el índice sección -> fragmento a partir de los documentos y sus vectores.
+
+        Args:
+            embeddings (Embeddings): Modelo para embeber las consultas.
+            documents (List[Document]): Fragmentos indexados.
+            vectors (np.ndarray): Vectores densos de los fragmentos.
+            k (int): Fragmentos a devolver.
+            sections_probe (int): Secciones a explorar en la segunda etapa.
+
+        Returns:
+            HierarchicalRetriever: Retriever listo para usar; sin documentos (almacén vacío) no devuelve resultados.
+        """
+        if not documents:
+            return cls(embeddings=embeddings, documents=[], chunk_vectors=np.empty((0, 0), dtype=np.float32),
+                       section_vectors=np.empty((0, 0), dtype=np.float32), section_offsets=np.zeros(1, dtype=np.int64),
+                       k=k, sections_probe=sections_probe)
+
+        keys = [section_key(document.metadata) for document in documents]
+        section_ids = {key: i for i, key in enumerate(dict.fromkeys(keys))}
+        labels = np.fromiter((section_ids[key] for key in keys), dtype=np.int64, count=len(keys))
+
+        # Se reordenan los fragmentos para que cada sección ocupe un rango contiguo.
+        order = np.argsort(labels, kind="stable")
+        chunk_vectors = normalize_rows(vectors)[order]
+        counts = np.bincount(labels, minlength=len(section_ids))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        section_vectors = normalize_rows(np.add.reduceat(chunk_vectors, offsets[:-1], axis=0))
+
+        return cls(
+            embeddings=embeddings,
+            documents=[documents[i] for i in order],
+            chunk_vectors=chunk_vectors,
+            section_vectors=section_vectors,
+            section_offsets=offsets,
+            k=k,
+            sections_probe=sections_probe,
+        )
+
+    def search(self, query_vector: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca los k fragmentos más similares explorando sólo las secciones más cercanas.
+
+        Args:
+            query_vector (np.ndarray): Vector normalizado de la consulta.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Índices de los fragmentos y sus similitudes, de mayor a menor.
+        """
+        if not len(self.section_vectors):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        section_scores = self.section_vectors @ query_vector
+        probe = max(1, min(self.sections_probe, len(section_scores)))
+        sections = np.argpartition(-section_scores, probe - 1)[:probe]
+
+        candidates = np.concatenate([
+            np.arange(self.section_offsets[section], self.section_offsets[section + 1]) for section in sections
+        ])
+        scores = self.chunk_vectors[candidates] @ query_vector
+        top = np.argsort(-scores)[:self.k]
+        return candidates[top], scores[top]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        if not self.documents:
+            return []
+        query_vector = normalize_rows(self.embeddings.embed_query(query))
+        indices, _ = self.search(query_vector)
+        return [self.documents[i] for i in indices]
+
+
+def build_hierarchical_retriever(qdrant: QdrantVectorStore, k: int = 4, sections_probe: int = 8) -> HierarchicalRetriever:
+    """
+    Crea un retriever jerárquico a partir de los vectores ya almacenados en un QdrantVectorStore.
+
+    Sólo usa los vectores densos; la parte dispersa (BM25) del modo híbrido no participa.
+
+    Args:
+        qdrant (QdrantVectorStore): Almacén de vectores con los fragmentos indexados.
+        k (int): Fragmentos a devolver.
+        sections_probe (int): Secciones a explorar en la segunda etapa.
+
+    Returns:
+        HierarchicalRetriever: Retriever jerárquico.
+    """
+    _, documents, vectors = fetch_store_points(qdrant)
+    return HierarchicalRetriever.from_vectors(qdrant.embeddings, documents, vectors, k, sections_probe)
+
+def compare_with_flat(retriever: HierarchicalRetriever, queries: List[str],
+    probes: Tuple[int, ...] = (1, 2, 4, 8, 16, 32)) -> pd.DataFrame:
+    """
+    Compara recall@k y latencia de la búsqueda jerárquica contra la búsqueda plana exacta sobre los mismos vectores.
+
+    Args:
+        retriever (HierarchicalRetriever): Retriever jerárquico construido.
+        queries (List[str]): Consultas de prueba.
+        probes (Tuple[int, ...]): Valores de `sections_probe` a evaluar.
+
+    Returns:
+        pd.DataFrame: Una fila por búsqueda plana y por cada número de secciones exploradas.
+    """
+    query_vectors = normalize_rows(retriever.embeddings.embed_documents(queries))
+    k = retriever.k
+
+    start = time.perf_counter()
+    flat_results = [set(np.argsort(-(retriever.chunk_vectors @ vector))[:k].tolist()) for vector in query_vectors]
+    flat_ms = 1000 * (time.perf_counter() - start) / len(queries)
+
+    rows = [{"mode": "flat", "sections_probe": len(retriever.section_vectors), "recall_at_k": 1.0, "ms_per_query": flat_ms}]
+    original_probe = retriever.sections_probe
+    for probe in probes:
+        retriever.sections_probe = probe
+        start = time.perf_counter()
+        results = [set(retriever.search(vector)[0].tolist()) for vector in query_vectors]
+        elapsed_ms = 1000 * (time.perf_counter() - start) / len(queries)
+        recall = np.mean([len(found & expected) / k for found, expected in zip(results, flat_results)])
+        rows.append({"mode": "hierarchical", "sections_probe": probe, "recall_at_k": float(recall), "ms_per_query": elapsed_ms})
+    retriever.sections_probe = original_probe
+
+    return pd.DataFrame(rows).assign(num_chunks=len(retriever.documents), num_sections=len(retriever.section_vectors))
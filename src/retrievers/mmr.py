@@ -0,0 +1,180 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pydantic import ConfigDict
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_qdrant import QdrantVectorStore
+
+from src.embedding.embedding import normalize_rows
+
+
+def mmr_select(query_vector: np.ndarray, candidate_vectors: np.ndarray, k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Selecciona k candidatos con Maximal Marginal Relevance usando operaciones vectorizadas.
+
+    La matriz de similitud entre candidatos se calcula una vez; cada paso actualiza con un máximo elemento a
+    elemento la similitud de cada candidato con el conjunto ya seleccionado.
+
+    Args:
+        query_vector (np.ndarray): Vector de la consulta.
+        candidate_vectors (np.ndarray): Matriz (n, d) de vectores candidatos.
+        k (int): Número de candidatos a seleccionar.
+        lambda_mult (float): Peso de la relevancia (1) frente a la diversidad (0).
+
+    Returns:
+        List[int]: Índices de los candidatos seleccionados, en orden de selección.
+    """
+    if len(candidate_vectors) == 0:
+        return list()
+    candidates = normalize_rows(candidate_vectors)
+    query = normalize_rows(query_vector)
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    for _ in range(min(k, len(candidates)) - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        np.maximum(max_similarity, similarity[chosen], out=max_similarity)
+    return selected
+
+def adaptive_cutoff(scores: np.ndarray, min_k: int = 1, score_floor: Optional[float] = None,
+    score_gap: Optional[float] = None) -> int:
+    """
+    Determina cuántos candidatos (ordenados por puntaje descendente) conservar.
+
+    Se corta en el primer salto entre puntajes consecutivos mayor que `score_gap` o en el primer puntaje
+    bajo `score_floor`, conservando siempre al menos `min_k`.
+
+    Args:
+        scores (np.ndarray): Puntajes de similitud ordenados de mayor a menor.
+        min_k (int): Mínimo de candidatos a conservar.
+        score_floor (Optional[float]): Puntaje mínimo aceptado.
+        score_gap (Optional[float]): Caída máxima aceptada entre puntajes consecutivos.
+
+    Returns:
+        int: Número de candidatos a conservar.
+    """
+    keep = len(scores)
+    if score_floor is not None:
+        keep = min(keep, int(np.count_nonzero(scores >= score_floor)))
+    if score_gap is not None and len(scores) > 1:
+        gaps = np.flatnonzero(-np.diff(scores) > score_gap)
+        if len(gaps):
+            keep = min(keep, int(gaps[0]) + 1)
+    return max(keep, min(min_k, len(scores)))
+
+
+class MMRAdaptiveRetriever(BaseRetriever):
+    """
+    Recupera un conjunto amplio de candidatos con sus vectores, recorta k adaptativamente según los puntajes
+    y diversifica el resultado con MMR.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: QdrantVectorStore
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    min_k: int = 1
+    score_floor: Optional[float] = None
+    score_gap: Optional[float] = None
+
+    def fetch_candidates(self, query_vector: List[float]) -> Tuple[List[Document], np.ndarray, np.ndarray]:
+        """
+        Obtiene los `fetch_k` candidatos más similares junto con sus vectores densos y puntajes.
+
+        Args:
+            query_vector (List[float]): Vector de la consulta.
+
+        Returns:
+            Tuple[List[Document], np.ndarray, np.ndarray]: Documentos, vectores (n, d) y puntajes, de mayor a menor.
+        """
+        store = self.vector_store
+        response = store.client.query_points(
+            collection_name=store.collection_name,
+            query=query_vector,
+            using=store.vector_name or None,
+            limit=self.fetch_k,
+            with_payload=True,
+            with_vectors=True,
+        )
+        points = response.points
+        documents = [
+            Document(
+                page_content=point.payload.get(store.content_payload_key, ""),
+                metadata={**(point.payload.get(store.metadata_payload_key) or {}), "relevance_score": point.score},
+            )
+            for point in points
+        ]
+        vectors = np.asarray(
+            [point.vector[store.vector_name] if isinstance(point.vector, dict) else point.vector for point in points],
+            dtype=np.float32,
+        )
+        scores = np.fromiter((point.score for point in points), dtype=np.float32, count=len(points))
+        return documents, vectors, scores
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        query_vector = self.vector_store.embeddings.embed_query(query)
+        documents, vectors, scores = self.fetch_candidates(query_vector)
+        if not documents:
+            return list()
+
+        keep = adaptive_cutoff(scores, self.min_k, self.score_floor, self.score_gap)
+        selected = mmr_select(np.asarray(query_vector, dtype=np.float32), vectors[:keep], self.k, self.lambda_mult)
+        return [documents[i] for i in selected]
+
+
+def benchmark_retrieval_latency(retrievers: Dict[str, BaseRetriever], queries: List[str], repeats: int = 3) -> pd.DataFrame:
+    """
+    Mide la latencia de distintos retrievers y el tamaño del contexto que entregan al LLM.
+
+    Args:
+        retrievers (Dict[str, BaseRetriever]): Retrievers a comparar, indexados por nombre.
+        queries (List[str]): Consultas de prueba.
+        repeats (int): Repeticiones por consulta; se reporta la mediana.
+
+    Returns:
+        pd.DataFrame: Una fila por retriever con latencia mediana, fragmentos y caracteres de contexto promedio.
+    """
+    rows = list()
+    for name, retriever in retrievers.items():
+        timings = list()
+        documents_per_query = list()
+        context_chars = list()
+        for query in queries:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                documents = retriever.invoke(query)
+                timings.append(time.perf_counter() - start)
+            documents_per_query.append(len(documents))
+            context_chars.append(sum(len(document.page_content) for document in documents))
+        rows.append({
+            "retriever": name,
+            "median_ms": 1000 * float(np.median(timings)),
+            "p95_ms": 1000 * float(np.percentile(timings, 95)),
+            "mean_documents": float(np.mean(documents_per_query)),
+            "mean_context_chars": float(np.mean(context_chars)),
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from src.retrievers.retrievers import (load_config, build_rag_pipeline, build_retriever)
+    from src.sweep.sweep import load_benchmark_questions
+
+    config = load_config("config.yaml")
+    vector_store = build_rag_pipeline(config)["vector_store"]
+    questions, _ = load_benchmark_questions()
+    print(benchmark_retrieval_latency({
+        "similarity": build_retriever(vector_store, {**config, "retrieval_mode": "similarity"}),
+        "mmr": build_retriever(vector_store, {**config, "retrieval_mode": "mmr"}),
+    }, questions).to_string(index=False))
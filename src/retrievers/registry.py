@@ -0,0 +1,264 @@
+import copy
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from src.chunking.chunking import show_chunks_streamlit
+from src.retrievers.retrievers import (build_rag_pipeline, build_retriever, create_rag_chain, release_memory)
+from src.telemetry.memory import PeakMemorySampler, current_rss
+from src.vector_store_client.vector_store_client import (assign_positions, chunks_to_documents, add_documents_in_batches,
+                                                          LazyChunkView, store_lock)
+from src.vector_store_client.sharded_store import ShardedVectorStore, chunk_source, plan_shards, shard_name
+
+
+RAG_TYPES = ("super", "naive")
+
+_PIPELINES: Dict[str, Dict] = dict()
+_AVAILABLE: Dict[str, threading.Event] = {rag_type: threading.Event() for rag_type in RAG_TYPES}
+_READY: Dict[str, threading.Event] = {rag_type: threading.Event() for rag_type in RAG_TYPES}
+_WRITE_LOCKS: Dict[str, threading.Lock] = {rag_type: threading.Lock() for rag_type in RAG_TYPES}
+_CONFIG: Dict = dict()
+_LOCK = threading.Lock()
+_BUILD_THREAD: Optional[threading.Thread] = None
+
+
+def chunk_text_bytes(chunks) -> int:
+    """Calcula el tamaño en bytes del texto de los fragmentos ("super" o "naive")."""
+    return sum(
+        len((chunk["chunk_text"] if isinstance(chunk, dict) else chunk.page_content).encode("utf-8"))
+        for chunk in chunks
+    )
+
+def _update_pipeline(rag_type: str, **fields) -> None:
+    """Actualiza el estado de un pipeline en el registro."""
+    with _LOCK:
+        _PIPELINES[rag_type].update(fields)
+
+def _publish_pipeline(rag_type: str, status: str, **components) -> None:
+    """Publica una versión consultable del pipeline; las sesiones la adoptan al detectar el cambio de versión."""
+    with _LOCK:
+        pipeline = _PIPELINES[rag_type]
+        pipeline.update(components)
+        pipeline.update({
+            "status": status,
+            "num_chunks": len(pipeline["chunks"]),
+            "version": pipeline.get("version", 0) + 1,
+        })
+    _AVAILABLE[rag_type].set()
+    if status == "ready":
+        _READY[rag_type].set()
+
+def _save_snapshot(rag_type: str, chunks: Sequence, config: dict, chunks_hash: Optional[str] = None) -> None:
+    """
+    Guarda los fragmentos del pipeline recién construido como instantánea en el almacén de corridas, salvo que
+    ya exista una con la misma configuración y contenido (por ejemplo, al reiniciar el proceso).
+    """
+    try:
+        snapshot_id = show_chunks_streamlit(chunks, {**config, "rag": rag_type}, chunks_hash)
+        _update_pipeline(rag_type, snapshot_id=snapshot_id)
+    except Exception as e:
+        logging.error(f"No se pudo guardar la instantánea de fragmentos de '{rag_type}': {e}")
+
+def _build_pipelines(config: dict, rag_types: Sequence[str]) -> None:
+    """
+    Construye secuencialmente cada pipeline, publicando su avance por etapa y una versión parcial consultable
+    apenas se indexa el primer lote.
+    """
+    for rag_type in rag_types:
+        _update_pipeline(rag_type, status="building", stage="En cola", progress=0.0)
+
+        def on_progress(stage: str, fraction: float, rag_type: str = rag_type) -> None:
+            _update_pipeline(rag_type, stage=stage, progress=fraction)
+
+        def on_partial_ready(rag_chain, retriever, chunks, rag_type: str = rag_type) -> None:
+            _publish_pipeline(rag_type, "partial", rag_chain=rag_chain, retriever=retriever, chunks=chunks)
+
+        rss_before = current_rss()
+        try:
+            with PeakMemorySampler() as sampler:
+                components = build_rag_pipeline({**copy.deepcopy(config), "rag": rag_type}, on_progress, on_partial_ready)
+            release_memory()
+            steady_rss = current_rss()
+            memory = {"rss_delta_bytes": steady_rss - rss_before, "peak_rss_bytes": sampler.peak,
+                      "steady_rss_bytes": steady_rss}
+            if not isinstance(components["chunks"], LazyChunkView):
+                memory["text_bytes"] = chunk_text_bytes(components["chunks"])
+            _update_pipeline(rag_type, **memory)
+            _publish_pipeline(rag_type, "ready", **components)
+            _save_snapshot(rag_type, components["chunks"], config, components.get("content_hash"))
+            logging.info(f"Pipeline '{rag_type}' listo: {len(components['chunks'])} fragmentos, "
+                         f"{(steady_rss - rss_before) / 2**20:.1f} MiB de RSS adicional, "
+                         f"pico de {sampler.peak / 2**20:.0f} MiB.")
+        except Exception as e:
+            logging.error(f"Error construyendo el pipeline '{rag_type}': {e}")
+            _update_pipeline(rag_type, status="error", error=str(e))
+            _AVAILABLE[rag_type].set()
+            _READY[rag_type].set()
+
+def start_pipeline_builds(config: dict, first: Optional[str] = None) -> None:
+    """
+    Inicia, una sola vez por proceso, la construcción en segundo plano de los pipelines "super" y "naive".
+
+    Args:
+        config (dict): Configuración del proyecto; la clave "rag" se sobreescribe para cada pipeline.
+        first (Optional[str]): Pipeline a construir primero (por ejemplo, el seleccionado en la sesión).
+    """
+    global _BUILD_THREAD
+    with _LOCK:
+        if _BUILD_THREAD is not None:
+            return
+        _CONFIG.update(config)
+        rag_types = sorted(RAG_TYPES, key=lambda rag_type: rag_type != first)
+        for rag_type in rag_types:
+            _PIPELINES[rag_type] = {"status": "pending"}
+        _BUILD_THREAD = threading.Thread(target=_build_pipelines, args=(config, rag_types), daemon=True,
+                                         name="rag-pipeline-builder")
+        _BUILD_THREAD.start()
+
+def get_pipeline(rag_type: str, timeout: Optional[float] = 0) -> Dict:
+    """
+    Devuelve el pipeline residente del tipo indicado, opcionalmente esperando a que sea consultable.
+
+    Args:
+        rag_type (str): "super" o "naive".
+        timeout (Optional[float]): Segundos máximos de espera; 0 (por defecto) no espera y None espera indefinidamente.
+
+    Returns:
+        Dict: Estado del pipeline ("pending", "building", "partial", "ready" o "error") con su etapa y avance;
+        si es "partial" o "ready" incluye "rag_chain", "retriever", "chunks" y "version".
+
+    Raises:
+        ValueError: Si el tipo de RAG no es "super" ni "naive".
+    """
+    if rag_type not in RAG_TYPES:
+        raise ValueError("El valor de 'rag' en la configuración no es válido. Debe ser 'super' o 'naive'.")
+    if timeout != 0:
+        _AVAILABLE[rag_type].wait(timeout)
+    with _LOCK:
+        return dict(_PIPELINES.get(rag_type, {"status": "pending"}))
+
+def add_chunks_to_pipeline(rag_type: str, chunks: List, timeout: Optional[float] = None) -> int:
+    """
+    Indexa fragmentos nuevos en el almacén vivo de un pipeline y publica una nueva versión del mismo.
+
+    Espera a que el pipeline termine de construirse; las escrituras sobre un mismo pipeline se serializan. Con
+    "shard_index", los fragmentos de cada volumen se indexan en sus propios shards y un volumen que ya existía
+    reemplaza a su versión anterior (ver `ShardedVectorStore.replace_volumes`).
+
+    Args:
+        rag_type (str): "super" o "naive".
+        chunks (List): Fragmentos en el formato del pipeline (diccionarios "super" o `Document` "naive").
+        timeout (Optional[float]): Segundos máximos de espera a que el pipeline esté listo.
+
+    Returns:
+        int: Número de fragmentos indexados.
+
+    Raises:
+        RuntimeError: Si el pipeline no está disponible.
+    """
+    if not _READY[rag_type].wait(timeout):
+        raise RuntimeError(f"El pipeline '{rag_type}' todavía se está construyendo.")
+
+    with _WRITE_LOCKS[rag_type]:
+        pipeline = get_pipeline(rag_type)
+        if pipeline["status"] != "ready":
+            raise RuntimeError(f"El pipeline '{rag_type}' no está disponible: {pipeline.get('error')}")
+
+        vector_store = pipeline["vector_store"]
+        current = pipeline["chunks"]
+        assign_positions(chunks, len(current))
+        if isinstance(vector_store, ShardedVectorStore):
+            # Cada volumen subido tiene sus propios shards: se crean o, si el volumen ya existía, se reconstruyen.
+            vector_store.replace_volumes(plan_shards(chunks, chunk_source, _CONFIG.get("shard_max_chunks")))
+            replaced = {shard_name(chunk_source(chunk), 0) for chunk in chunks}
+            if not isinstance(current, LazyChunkView):
+                current = [chunk for chunk in current if shard_name(chunk_source(chunk), 0) not in replaced]
+        else:
+            documents = chunks_to_documents(chunks) if rag_type == "super" else chunks
+            add_documents_in_batches(vector_store, documents, _CONFIG.get("index_batch_size", 256))
+        _publish_updated_store(rag_type, pipeline, current if isinstance(current, LazyChunkView) else current + list(chunks))
+    return len(chunks)
+
+def update_pipeline_documents(rag_type: str, documents: Dict[str, List[str]], removed: Sequence[str] = (),
+    timeout: Optional[float] = None) -> int:
+    """
+    Agrega, reemplaza o quita documentos de un pipeline con segmentación incremental, re-embebiendo e indexando
+    solo los fragmentos que cambiaron y eliminando del almacén los que ya no existen.
+
+    Args:
+        rag_type (str): Pipeline a actualizar (solo "super" admite segmentación incremental).
+        documents (Dict[str, List[str]]): Texto de las páginas de cada documento nuevo o reemplazado.
+        removed (Sequence[str]): Documentos a quitar.
+        timeout (Optional[float]): Segundos máximos de espera a que el pipeline esté listo.
+
+    Returns:
+        int: Número de fragmentos indexados (nuevos o con metadata actualizada).
+
+    Raises:
+        RuntimeError: Si el pipeline no está disponible o no se construyó con "incremental_chunking".
+    """
+    if not _READY[rag_type].wait(timeout):
+        raise RuntimeError(f"El pipeline '{rag_type}' todavía se está construyendo.")
+
+    with _WRITE_LOCKS[rag_type]:
+        pipeline = get_pipeline(rag_type)
+        if pipeline["status"] != "ready":
+            raise RuntimeError(f"El pipeline '{rag_type}' no está disponible: {pipeline.get('error')}")
+        if pipeline.get("chunker") is None:
+            raise RuntimeError(f"El pipeline '{rag_type}' no usa segmentación incremental.")
+
+        vector_store = pipeline["vector_store"]
+        changes = pipeline["chunker"].update(documents, removed)
+        if changes["deleted"]:
+            with store_lock(vector_store).write():
+                vector_store.delete(ids=changes["deleted"])
+        add_documents_in_batches(vector_store, chunks_to_documents(changes["upserted"]),
+                                 _CONFIG.get("index_batch_size", 256))
+        _publish_updated_store(rag_type, pipeline, changes["chunks"])
+    return len(changes["upserted"])
+
+def _publish_updated_store(rag_type: str, pipeline: Dict, chunks: List) -> None:
+    """Publica una nueva versión del pipeline tras modificar su almacén, reconstruyendo el retriever si hace falta."""
+    vector_store = pipeline["vector_store"]
+    rag_chain, retriever = pipeline["rag_chain"], pipeline["retriever"]
+    if _CONFIG.get("retrieval_mode", "similarity") != "similarity":
+        # Los retrievers que mantienen su propio índice en memoria se reconstruyen sobre el almacén actualizado.
+        rag_chain, retriever = create_rag_chain(vector_store, pipeline["llm"], build_retriever(vector_store, _CONFIG),
+                                                _CONFIG.get("coalesce_timeout", 120.0))
+    if isinstance(pipeline["chunks"], LazyChunkView):
+        # La vista lee los fragmentos desde el almacén; basta con olvidar los ids en caché.
+        pipeline["chunks"].refresh()
+        chunks = pipeline["chunks"]
+    _publish_pipeline(rag_type, "ready", rag_chain=rag_chain, retriever=retriever, chunks=chunks)
+
+def pipeline_build_status() -> Dict[str, Dict]:
+    """
+    Devuelve el estado, la etapa y el avance de la construcción de cada pipeline.
+
+    Returns:
+        Dict[str, Dict]: Por cada pipeline, las claves "status", "stage", "progress" y "num_chunks" disponibles.
+    """
+    keys = ("status", "stage", "progress", "num_chunks", "error")
+    with _LOCK:
+        return {
+            rag_type: {key: pipeline[key] for key in keys if key in pipeline}
+            for rag_type, pipeline in _PIPELINES.items()
+        }
+
+def pipeline_memory_report() -> Dict[str, Dict]:
+    """
+    Resume la memoria usada por los pipelines residentes.
+
+    Returns:
+        Dict[str, Dict]: Por cada pipeline, su estado, número de fragmentos, bytes de texto en memoria (no está si los
+        fragmentos se leen desde el almacén), RSS agregado al construirlo, pico de RSS durante la construcción y RSS
+        estable al terminar; además la clave "process" con el RSS actual del proceso.
+    """
+    keys = ("status", "num_chunks", "text_bytes", "rss_delta_bytes", "peak_rss_bytes", "steady_rss_bytes")
+    with _LOCK:
+        report = {
+            rag_type: {key: pipeline[key] for key in keys if key in pipeline}
+            for rag_type, pipeline in _PIPELINES.items()
+        }
+    report["process"] = {"rss_bytes": current_rss()}
+    return report
@@ -1,9 +1,14 @@
+import gc
 import os  
+import time
+import ctypes
+import logging
 from dotenv import load_dotenv  
-from typing import List, Dict  
+from typing import Callable, List, Dict, Optional, Tuple  
 
 from langchain_core.runnables import RunnablePassthrough  
 from langchain_core.output_parsers import StrOutputParser  
+from langchain_core.retrievers import BaseRetriever
 from langchain import hub  
 
 from langchain_community.document_loaders import PyPDFLoader
@@ -14,22 +19,35 @@ import yaml
 from src.loaders.loaders import (load_pdf, split_pdf_documents)
 from src.chunking.chunking import (
     load_pdf_all_documents,
-    clean_text_and_exclude_sections,
-    split_text_into_sentences,
+    load_pdf_volumes,
     combine_sentences,
     extract_metadata,
     assign_metadata_to_chunks_with_context
 )
-from src.embedding.embedding import (calculate_cosine_distances, split_into_chunks)
-from src.vector_store_client.vector_store_client import (create_qdrant_store, create_qdrant_store_naive)
+from src.chunking.segmenter import split_sentences
+from src.chunking.incremental import IncrementalChunker
+from src.embedding.embedding import (calculate_cosine_distances, split_into_chunks, split_into_chunks_bounded)
+from src.vector_store_client.vector_store_client import (assign_positions, create_qdrant_store, create_qdrant_store_naive,
+                                                          LazyChunkView, LockedRetriever, store_lock)
+from src.vector_store_client.sharded_store import (ShardedVectorStore, chunk_source, create_sharded_store, plan_shards)
+from src.deduplication.deduplication import (deduplicate_chunks, dedup_report, log_dedup_report)
+from src.retrievers.hierarchical import build_hierarchical_retriever
+from src.retrievers.mmr import MMRAdaptiveRetriever
+from src.retrievers.single_flight import SingleFlightChain
+from src.run_store.run_store import content_hash
 
-def create_rag_chain(qdrant: QdrantVectorStore, llm: ChatOpenAI) -> QdrantVectorStore:
+def create_rag_chain(qdrant: QdrantVectorStore, llm: ChatOpenAI, retriever: Optional[BaseRetriever] = None,
+    coalesce_timeout: Optional[float] = 120.0) -> QdrantVectorStore:
     """
     Crea y devuelve una cadena RAG (Retrieval-Augmented Generation) utilizando LangChain.
 
     Args:
         qdrant (QdrantVectorStore): Almacén de vectores configurado para recuperar documentos relevantes.
         llm (ChatOpenAI): Modelo de lenguaje configurado para generar texto.
+        retriever (Optional[BaseRetriever]): Retriever a usar; por defecto `qdrant.as_retriever()`. Se envuelve en
+            `LockedRetriever` para que las búsquedas no se crucen con escrituras sobre el almacén.
+        coalesce_timeout (Optional[float]): Segundos que una consulta idéntica a otra en curso espera su resultado
+            compartido (ver `SingleFlightChain`).
 
     Returns:
         rag_chain, retriever: La cadena RAG configurada para generación y recuperación y el retriever asociado.
@@ -40,7 +58,7 @@ def create_rag_chain(qdrant: QdrantVectorStore, llm: ChatOpenAI) -> QdrantVector
     def format_docs(docs):
         return "\n\n".join(doc.page_content for doc in docs)
 
-    retriever = qdrant.as_retriever()
+    retriever = LockedRetriever(retriever=retriever or qdrant.as_retriever(), lock=store_lock(qdrant))
 
     rag_chain = (
         {"context": retriever | format_docs, "question": RunnablePassthrough()}
@@ -49,7 +67,43 @@ def create_rag_chain(qdrant: QdrantVectorStore, llm: ChatOpenAI) -> QdrantVector
         | StrOutputParser()
     )
 
-    return rag_chain, retriever
+    return SingleFlightChain(rag_chain, coalesce_timeout), retriever
+
+
+def build_retriever(qdrant: QdrantVectorStore, config: dict) -> BaseRetriever:
+    """
+    Crea el retriever indicado en la configuración sobre un almacén de vectores.
+
+    Args:
+        qdrant (QdrantVectorStore): Almacén de vectores con los fragmentos indexados.
+        config (dict): Configuración con las claves opcionales "retrieval_mode" ("similarity", "hierarchical" o "mmr"),
+            "retriever_k", "sections_probe", "mmr_fetch_k", "mmr_lambda", "mmr_score_floor" y "mmr_score_gap".
+
+    Returns:
+        BaseRetriever: Retriever configurado.
+
+    Raises:
+        ValueError: Si "retrieval_mode" no es un modo conocido, o no es "similarity" sobre un índice con shards.
+    """
+    mode = config.get("retrieval_mode", "similarity")
+    k = config.get("retriever_k", 4)
+    if isinstance(qdrant, ShardedVectorStore) and mode != "similarity":
+        raise ValueError(f"El índice con shards solo admite retrieval_mode 'similarity', no '{mode}'.")
+    if mode == "similarity":
+        return qdrant.as_retriever(search_kwargs={"k": k})
+    if mode == "hierarchical":
+        with store_lock(qdrant).read():
+            return build_hierarchical_retriever(qdrant, k, config.get("sections_probe", 8))
+    if mode == "mmr":
+        return MMRAdaptiveRetriever(
+            vector_store=qdrant,
+            k=k,
+            fetch_k=config.get("mmr_fetch_k", 20),
+            lambda_mult=config.get("mmr_lambda", 0.5),
+            score_floor=config.get("mmr_score_floor"),
+            score_gap=config.get("mmr_score_gap"),
+        )
+    raise ValueError(f"El valor de 'retrieval_mode' no es válido: '{mode}'.")
 
 
 def create_llm(model_name: str, temperature: float, openai_api_key: str) -> ChatOpenAI:
@@ -71,9 +125,108 @@ def create_llm(model_name: str, temperature: float, openai_api_key: str) -> Chat
     )
     return llm
 
-def initialize_rag(config: dict) -> object:
+def remove_duplicate_chunks(chunks: List, chunk_texts: List[str], config: dict) -> Tuple[List, Dict[int, int]]:
     """
-    Inicializa los componentes de RAG (Retrieval-Augmented Generation) según el tipo especificado en la configuración.
+    Descarta los fragmentos casi duplicados si la deduplicación está activada en la configuración.
+
+    Args:
+        chunks (List): Fragmentos a indexar.
+        chunk_texts (List[str]): Texto de cada fragmento.
+        config (dict): Configuración con las claves "dedup", "dedup_threshold" y "dedup_num_perm".
+
+    Returns:
+        Tuple[List, Dict[int, int]]: Fragmentos conservados y el mapa descartado -> canónico.
+    """
+    if not config.get("dedup", False):
+        return chunks, dict()
+    return deduplicate_chunks(chunks, chunk_texts, config.get("dedup_threshold", 0.9), config.get("dedup_num_perm", 128))
+
+def report_duplicate_savings(chunk_texts: List[str], duplicate_map: Dict[int, int], indexing_seconds: float,
+    config: dict) -> None:
+    """
+    Registra cuánto tamaño de índice y tiempo de embedding ahorró la deduplicación.
+
+    Args:
+        chunk_texts (List[str]): Texto de todos los fragmentos antes de deduplicar.
+        duplicate_map (Dict[int, int]): Mapa descartado -> canónico.
+        indexing_seconds (float): Tiempo que tomó indexar los fragmentos conservados.
+        config (dict): Configuración con la clave "dedup".
+    """
+    if config.get("dedup", False):
+        log_dedup_report(dedup_report(chunk_texts, duplicate_map, indexing_seconds))
+
+def release_memory() -> None:
+    """
+    Libera los objetos intermedios ya sin referencias y, en Linux con glibc, devuelve al sistema operativo la
+    memoria libre del heap para que el RSS baje de verdad entre etapas.
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        logging.debug("malloc_trim no está disponible en esta plataforma.")
+
+def build_super_chunks(pdf_texts: List[str], config: dict,
+    progress_callback: Callable[[str, float], None] = lambda stage, fraction: None) -> List[Dict[str, str]]:
+    """
+    Ejecuta la segmentación semántica del RAG "super" sobre el texto de las páginas.
+
+    Args:
+        pdf_texts (List[str]): Texto de cada página.
+        config (dict): Configuración con "model_name", "buffer_size", "threshold", "max_previous_chunks" y,
+            opcionalmente, "sentence_splitter" (ver `split_sentences`) y "memory_budget" (ver `build_rag_pipeline`).
+        progress_callback (Callable[[str, float], None]): Ver `build_rag_pipeline`.
+
+    Returns:
+        List[Dict[str, str]]: Fragmentos con metadata asignada.
+    """
+    model_name = config["model_name"]
+    memory_budget = config.get("memory_budget", False)
+    sentences = split_sentences(pdf_texts, config)
+    combined_sentences = combine_sentences(sentences, config["buffer_size"])
+    progress_callback("Calculando embeddings de oraciones", 0.15)
+    distances = calculate_cosine_distances(combined_sentences, model_name, config.get("embedding_backend", "torch"),
+                                           config.get("embedding_workers", 1), keep_embeddings=not memory_budget,
+                                           num_threads=config.get("onnx_num_threads"))
+    if memory_budget:
+        # La segmentación solo usa el texto de cada oración; las oraciones combinadas ya no hacen falta.
+        for sentence in combined_sentences:
+            sentence.pop('combined_sentence', None)
+        release_memory()
+    progress_callback("Segmentando en fragmentos", 0.45)
+    if config.get("chunk_mode", "semantic") == "bounded":
+        chunks = split_into_chunks_bounded(combined_sentences, distances, config["threshold"], model_name,
+                                           config.get("min_chunk_tokens"), config.get("max_chunk_tokens"))
+    else:
+        chunks = split_into_chunks(combined_sentences, distances, config["threshold"])
+    return assign_metadata_to_chunks_with_context(chunks, config["max_previous_chunks"])
+
+def build_super_chunks_by_volume(volumes: Dict[str, List[str]], config: dict,
+    progress_callback: Callable[[str, float], None] = lambda stage, fraction: None) -> List[Dict[str, str]]:
+    """
+    Ejecuta la segmentación semántica del RAG "super" por separado en cada volumen, anotando su origen
+    en la clave "source" de cada fragmento.
+
+    Args:
+        volumes (Dict[str, List[str]]): Texto de las páginas de cada volumen, ver `load_pdf_volumes`.
+        config (dict): Ver `build_super_chunks`.
+        progress_callback (Callable[[str, float], None]): Ver `build_rag_pipeline`.
+
+    Returns:
+        List[Dict[str, str]]: Fragmentos de todos los volúmenes con metadata asignada.
+    """
+    chunks = list()
+    for position, (volume, pages) in enumerate(volumes.items()):
+        progress_callback(f"Segmentando {volume}", 0.45 * position / max(len(volumes), 1))
+        for chunk in build_super_chunks(pages, config):
+            chunk["source"] = volume
+            chunks.append(chunk)
+    return chunks
+
+def build_rag_pipeline(config: dict, progress_callback: Optional[Callable[[str, float], None]] = None,
+    on_partial_ready: Optional[Callable[[object, object, List], None]] = None) -> Dict[str, object]:
+    """
+    Construye todos los componentes de RAG (Retrieval-Augmented Generation) según el tipo especificado en la configuración.
 
     Args:
         config (dict): Diccionario de configuración que contiene las siguientes claves:
@@ -86,10 +239,39 @@ def initialize_rag(config: dict) -> object:
             - "buffer_size" (int, opcional): Número de oraciones a combinar en un segmento (requerido para RAG "super").
             - "threshold" (float, opcional): Umbral para dividir en segmentos basado en distancia coseno (requerido para RAG "super").
             - "max_previous_chunks" (int, opcional): Número de segmentos previos a incluir como contexto (requerido para RAG "super").
+            - "chunk_mode" (str, opcional): "semantic" (por defecto) o "bounded" para acotar los fragmentos "super"
+              entre "min_chunk_tokens" y "max_chunk_tokens" según el largo máximo del modelo de embeddings.
+            - "embedding_backend" (str, opcional): "torch" (por defecto) u "onnx" para inferencia cuantizada en CPU,
+              con "onnx_num_threads" hilos (por defecto los núcleos físicos).
+            - "embedding_workers" (int, opcional): Procesos para embeber el corpus; 1 (por defecto) lo hace en el proceso actual.
+            - "retrieval_mode" (str, opcional): "similarity" (por defecto), "hierarchical" para buscar primero
+              secciones (PART/Subpart/§) y luego fragmentos dentro de las "sections_probe" más cercanas, o "mmr"
+              para diversificar con MMR y recortar k según "mmr_score_floor" y "mmr_score_gap".
+            - "sentence_splitter" (str, opcional): "regex" (por defecto) o "regulatory" para el segmentador que no corta
+              en abreviaturas, citas ni párrafos numerados; "segmenter_workers" lo paraleliza por página.
+            - "shard_index" (bool, opcional): Si es verdadero, indexa un shard por volumen (partido en trozos de hasta
+              "shard_max_chunks" fragmentos), construye "shard_workers" shards en paralelo y consulta todos en abanico.
+            - "incremental_chunking" (bool, opcional): Si es verdadero (solo RAG "super" sin "shard_index"), segmenta con
+              `IncrementalChunker`, que guarda por documento los embeddings de oraciones y los cortes en "chunk_cache_dir"
+              e indexa con ids estables; el pipeline incluye el componente "chunker" para actualizar documentos sin
+              recalcular el corpus. La deduplicación no se aplica en este modo.
+            - "dedup" (bool, opcional): Si es True, descarta fragmentos casi duplicados antes de indexar, según
+              "dedup_threshold" (similitud de Jaccard, por defecto 0.9) y "dedup_num_perm" (por defecto 128).
+            - "memory_budget" (bool, opcional): Si es verdadero, libera los intermedios (páginas, oraciones, embeddings
+              por oración y textos de los fragmentos) apenas termina cada etapa y devuelve "chunks" como una
+              `LazyChunkView` que lee los fragmentos desde el almacén en vez de mantener una copia en memoria.
             - "file_path" (str, opcional): Ruta a un archivo PDF único (requerido para RAG "naive").
+            - "index_batch_size" (int, opcional): Fragmentos por lote de indexación (por defecto 256).
+        progress_callback (Optional[Callable[[str, float], None]]): Se llama con el nombre de cada etapa y el avance
+            total estimado (0 a 1).
+        on_partial_ready (Optional[Callable[[object, object, List], None]]): Se llama una vez, tras indexar el primer
+            lote, con una cadena RAG que ya busca sobre la parte indexada del corpus (que sigue creciendo).
 
     Returns:
-        object: Objeto de cadena RAG inicializado según la configuración especificada.
+        Dict[str, object]: Componentes "rag_chain", "retriever", "chunks", "vector_store", "llm", "chunker" (None
+        salvo con "incremental_chunking") y "duplicate_map", el mapa descartado -> canónico de la deduplicación
+        (índices de los fragmentos antes de deduplicar; vacío si "dedup" está desactivado), y "content_hash", la
+        huella del texto de los fragmentos antes de deduplicar.
 
     Raises:
         ValueError: Si la clave "rag" en la configuración no es "super" o "naive".
@@ -99,30 +281,119 @@ def initialize_rag(config: dict) -> object:
     model = config["model"]
     temperature = config["temperature"]
     openai_api_key = config["openai_api_key"]
+    backend = config.get("embedding_backend", "torch")
+    num_workers = config.get("embedding_workers", 1)
+    num_threads = config.get("onnx_num_threads")
+    batch_size = config.get("index_batch_size", 256)
+    sharded = config.get("shard_index", False)
+    memory_budget = config.get("memory_budget", False)
+    incremental = rag_type == "super" and config.get("incremental_chunking", False)
+    chunker = None
+    progress_callback = progress_callback or (lambda stage, fraction: None)
 
     if rag_type == "super":
-        pdf_texts = load_pdf_all_documents(config["directory_path"])
-        cleaned_text = clean_text_and_exclude_sections(" ".join(pdf_texts))
-        sentences = split_text_into_sentences(cleaned_text)
-        combined_sentences = combine_sentences(sentences, config["buffer_size"])
-        distances = calculate_cosine_distances(combined_sentences, model_name)
-        chunks = split_into_chunks(combined_sentences, distances, config["threshold"])
-        annotated_chunks = assign_metadata_to_chunks_with_context(chunks, config["max_previous_chunks"])
-        qdrant_store = create_qdrant_store(model_name, annotated_chunks)
-        llm = create_llm(model, temperature, openai_api_key)
-        rag_chain, retriever  = create_rag_chain(qdrant_store, llm)
-        return rag_chain, retriever, annotated_chunks
-
+        progress_callback("Cargando documentos", 0.0)
+        if incremental:
+            if sharded:
+                raise ValueError("'incremental_chunking' no es compatible con 'shard_index'.")
+            chunker = IncrementalChunker(config, config.get("chunk_cache_dir"))
+            progress_callback("Segmentando por documento", 0.15)
+            chunks = chunker.sync(load_pdf_volumes(config["directory_path"]))["chunks"]
+        elif sharded:
+            chunks = build_super_chunks_by_volume(load_pdf_volumes(config["directory_path"]), config, progress_callback)
+        else:
+            pdf_texts = load_pdf_all_documents(config["directory_path"])
+            chunks = build_super_chunks(pdf_texts, config, progress_callback)
+            del pdf_texts
+        chunk_texts = [chunk["chunk_text"] for chunk in chunks]
+        create_store = create_qdrant_store
     elif rag_type == "naive":
+        progress_callback("Cargando documentos", 0.0)
         docs = load_pdf(config["file_path"])
-        naive_chunks = split_pdf_documents(docs)
-        naive_qdrant = create_qdrant_store_naive(model_name, naive_chunks)
-        llm = create_llm(model, temperature, openai_api_key)
-        rag_chain, retriever  = create_rag_chain(naive_qdrant, llm)
-        return rag_chain, retriever,naive_chunks
+        progress_callback("Segmentando en fragmentos", 0.3)
+        chunks = split_pdf_documents(docs)
+        del docs
+        chunk_texts = [chunk.page_content for chunk in chunks]
+        create_store = create_qdrant_store_naive
     else:
         raise ValueError("El valor de 'rag' en la configuración no es válido. Debe ser 'super' o 'naive'.")
 
+    # Huella del contenido antes de liberar los textos, para no repetir la instantánea de fragmentos si no cambió.
+    chunks_hash = content_hash(chunk_texts)
+    progress_callback("Eliminando duplicados", 0.5)
+    if incremental:
+        # Con ids estables por documento, descartar duplicados entre documentos desordenaría las actualizaciones.
+        duplicate_map = dict()
+    else:
+        chunks, duplicate_map = remove_duplicate_chunks(chunks, chunk_texts, config)
+    if memory_budget:
+        release_memory()
+    llm = create_llm(model, temperature, openai_api_key)
+
+    def on_batch(qdrant: QdrantVectorStore, indexed: int) -> None:
+        progress_callback(f"Indexando ({indexed}/{len(chunks)} fragmentos)", 0.5 + 0.5 * indexed / max(len(chunks), 1))
+        if on_partial_ready and indexed == min(batch_size, len(chunks)) and indexed < len(chunks):
+            partial_chain, partial_retriever = create_rag_chain(qdrant, llm, build_retriever(qdrant, config),
+                                                                config.get("coalesce_timeout", 120.0))
+            partial_chunks = LazyChunkView(qdrant, rag_type) if memory_budget else chunks[:indexed]
+            on_partial_ready(partial_chain, partial_retriever, partial_chunks)
+
+    def on_shard_ready(store: ShardedVectorStore, name: str, indexed: int) -> None:
+        progress_callback(f"Indexando shards ({indexed}/{len(chunks)} fragmentos)", 0.5 + 0.5 * indexed / max(len(chunks), 1))
+        if on_partial_ready and len(store.shards) == 1 and indexed < len(chunks):
+            partial_chain, partial_retriever = create_rag_chain(store, llm, build_retriever(store, config),
+                                                                config.get("coalesce_timeout", 120.0))
+            partial_chunks = LazyChunkView(store, rag_type) if memory_budget else shards[name]
+            on_partial_ready(partial_chain, partial_retriever, partial_chunks)
+
+    start = time.perf_counter()
+    if sharded:
+        # Posiciones globales antes de repartir, para que `LazyChunkView` intercale los shards en el orden del corpus.
+        assign_positions(chunks)
+        shards = plan_shards(chunks, chunk_source, config.get("shard_max_chunks"))
+        qdrant_store = create_sharded_store(rag_type, model_name, shards, backend, num_workers, batch_size,
+                                            config.get("shard_workers", 2), on_shard_ready, num_threads)
+    else:
+        qdrant_store = create_store(model_name, chunks, backend, num_workers, batch_size, on_batch,
+                                    num_threads=num_threads)
+    report_duplicate_savings(chunk_texts, duplicate_map, time.perf_counter() - start, config)
+    if memory_budget:
+        # El almacén ya guarda el texto y la metadata de cada fragmento; no se mantiene una segunda copia.
+        # El mapa de duplicados solo guarda índices y se conserva.
+        del chunk_texts
+        shards = None
+        chunks = LazyChunkView(qdrant_store, rag_type)
+        release_memory()
+    rag_chain, retriever = create_rag_chain(qdrant_store, llm, build_retriever(qdrant_store, config),
+                                           config.get("coalesce_timeout", 120.0))
+    progress_callback("Listo", 1.0)
+    return {
+        "rag_chain": rag_chain,
+        "retriever": retriever,
+        "chunks": chunks,
+        "vector_store": qdrant_store,
+        "llm": llm,
+        "chunker": chunker,
+        "duplicate_map": duplicate_map,
+        "content_hash": chunks_hash,
+    }
+
+def initialize_rag(config: dict) -> object:
+    """
+    Inicializa los componentes de RAG (Retrieval-Augmented Generation) según el tipo especificado en la configuración.
+
+    Args:
+        config (dict): Diccionario de configuración, ver `build_rag_pipeline`.
+
+    Returns:
+        object: Tupla (rag_chain, retriever, chunks) inicializada según la configuración especificada.
+
+    Raises:
+        ValueError: Si la clave "rag" en la configuración no es "super" o "naive".
+    """
+    pipeline = build_rag_pipeline(config)
+    return pipeline["rag_chain"], pipeline["retriever"], pipeline["chunks"]
+
 def load_config(file_path):
     """
     Carga un archivo de configuración en formato YAML y reemplaza las variables de entorno en los valores correspondientes.
@@ -0,0 +1,95 @@
+import re
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional
+
+from src.telemetry.telemetry import mark_cache_status
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normaliza una consulta para detectar preguntas idénticas: minúsculas, espacios colapsados y sin
+    signos de puntuación en los extremos.
+
+    Args:
+        query (str): Consulta del usuario.
+
+    Returns:
+        str: Clave normalizada de la consulta.
+    """
+    query = re.sub(r"\s+", " ", query.casefold()).strip()
+    return query.strip("¿?¡!.,;: ")
+
+
+class SingleFlightChain:
+    """
+    Envoltorio de una cadena RAG que agrupa las consultas idénticas en curso: la primera ejecuta la cadena
+    y las que llegan mientras tanto esperan y comparten su resultado (o su excepción).
+    """
+
+    def __init__(self, chain: object, timeout: Optional[float] = 120.0):
+        """
+        Args:
+            chain (object): Cadena RAG con el método `invoke`.
+            timeout (Optional[float]): Segundos que una consulta agrupada espera el resultado compartido;
+                `None` espera indefinidamente.
+        """
+        self.chain = chain
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.in_flight: Dict[str, Future] = dict()
+        self.stats = {"executed": 0, "coalesced": 0}
+
+    def invoke(self, query: Any, config: Optional[dict] = None, **kwargs: Any) -> Any:
+        """
+        Ejecuta la cadena o espera la ejecución en curso de la misma consulta normalizada.
+
+        Args:
+            query (Any): Consulta del usuario. Las entradas que no son texto se ejecutan sin agrupar.
+            config (Optional[dict]): Configuración de ejecución de LangChain (callbacks, etc.).
+
+        Returns:
+            Any: Respuesta de la cadena.
+
+        Raises:
+            TimeoutError: Si la ejecución compartida no termina dentro de `timeout`.
+        """
+        if not isinstance(query, str):
+            return self.chain.invoke(query, config=config, **kwargs)
+
+        key = normalize_query(query)
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.in_flight[key] = future
+                self.stats["executed"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            mark_cache_status("coalesced")
+            logging.info(f"Consulta agrupada con una ejecución en curso: '{key}'")
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                raise TimeoutError(f"La consulta agrupada no obtuvo respuesta en {self.timeout} segundos.")
+
+        try:
+            result = self.chain.invoke(query, config=config, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "chain":
+            raise AttributeError(name)
+        return getattr(self.chain, name)
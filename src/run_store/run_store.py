@@ -0,0 +1,414 @@
+import io
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+
+METRICS = ["context_precision", "context_recall", "faithfulness", "answer_relevancy"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS question_sets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    name TEXT,
+    source TEXT,
+    num_questions INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS questions (
+    set_id INTEGER NOT NULL REFERENCES question_sets(id),
+    position INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT,
+    PRIMARY KEY (set_id, position)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    rag TEXT,
+    question_set_id INTEGER REFERENCES question_sets(id),
+    config_hash TEXT,
+    config_json TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_rag ON runs(rag, created_at);
+CREATE TABLE IF NOT EXISTS run_results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    position INTEGER NOT NULL,
+    question TEXT,
+    response TEXT,
+    reference TEXT,
+    context_precision REAL,
+    context_recall REAL,
+    faithfulness REAL,
+    answer_relevancy REAL,
+    PRIMARY KEY (run_id, position)
+);
+CREATE TABLE IF NOT EXISTS chunk_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    rag TEXT,
+    config_hash TEXT,
+    content_hash TEXT,
+    num_chunks INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    snapshot_id INTEGER NOT NULL REFERENCES chunk_snapshots(id),
+    position INTEGER NOT NULL,
+    chunk_text TEXT NOT NULL,
+    title TEXT,
+    subtitle TEXT,
+    sub_subtitle TEXT,
+    PRIMARY KEY (snapshot_id, position)
+);
+"""
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    Abre el almacén de corridas (SQLite en modo WAL) y crea las tablas si no existen.
+
+    Args:
+        db_path (str): Ruta del archivo SQLite.
+
+    Returns:
+        sqlite3.Connection: Conexión abierta; quien llama debe cerrarla.
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    # Almacenes creados antes de que las instantáneas guardaran la huella de su contenido.
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(chunk_snapshots)")}
+    if "content_hash" not in columns:
+        connection.execute("ALTER TABLE chunk_snapshots ADD COLUMN content_hash TEXT")
+    return connection
+
+def public_config(config: dict) -> Dict:
+    """
+    Devuelve la configuración sin credenciales, lista para guardarse con una corrida.
+
+    Args:
+        config (dict): Configuración completa.
+
+    Returns:
+        Dict: Configuración sin las claves que contienen "key", "token" o "secret".
+    """
+    return {
+        key: value for key, value in sorted(config.items())
+        if not any(word in key.lower() for word in ("key", "token", "secret"))
+    }
+
+def config_hash(config: dict) -> str:
+    """Huella corta de la configuración pública, para agrupar corridas con los mismos parámetros."""
+    return hashlib.sha1(json.dumps(public_config(config), sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+def content_hash(texts: Iterable[str]) -> str:
+    """Huella corta del texto de los fragmentos, para detectar si un pipeline reconstruido cambió su contenido."""
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:12]
+
+def save_question_set(db_path: str, questions: List[str], answers: List[str], name: Optional[str] = None,
+    source: Optional[str] = None) -> int:
+    """
+    Agrega un conjunto de preguntas y respuestas de referencia.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        questions (List[str]): Preguntas.
+        answers (List[str]): Respuestas de referencia, alineadas con `questions`.
+        name (Optional[str]): Nombre descriptivo del conjunto.
+        source (Optional[str]): Origen, por ejemplo "generated" o el archivo importado.
+
+    Returns:
+        int: Id del conjunto.
+    """
+    with closing(connect(db_path)) as connection, connection:
+        cursor = connection.execute(
+            "INSERT INTO question_sets (created_at, name, source, num_questions) VALUES (?, ?, ?, ?)",
+            (time.time(), name, source, len(questions)),
+        )
+        set_id = cursor.lastrowid
+        connection.executemany(
+            "INSERT INTO questions (set_id, position, question, answer) VALUES (?, ?, ?, ?)",
+            [(set_id, i, question, str(answer)) for i, (question, answer) in enumerate(zip(questions, answers))],
+        )
+    return set_id
+
+def import_question_set_from_excel(db_path: str, questions_file: str) -> int:
+    """
+    Importa un archivo Excel con columnas 'question' y 'answer' como un nuevo conjunto de preguntas.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        questions_file (str): Archivo Excel.
+
+    Returns:
+        int: Id del conjunto importado.
+
+    Raises:
+        ValueError: Si el archivo está vacío.
+    """
+    questions_df = pd.read_excel(questions_file)
+    if questions_df.empty:
+        raise ValueError(f"El archivo '{questions_file}' está vacío. No se puede continuar.")
+    logging.info(f"Importando preguntas de '{questions_file}' al almacén de corridas.")
+    return save_question_set(db_path, questions_df["question"].tolist(), questions_df["answer"].astype(str).tolist(),
+                             os.path.basename(questions_file), questions_file)
+
+def latest_question_set_id(db_path: str) -> Optional[int]:
+    """Devuelve el id del conjunto de preguntas más reciente, o None si no hay ninguno."""
+    with closing(connect(db_path)) as connection:
+        row = connection.execute("SELECT MAX(id) FROM question_sets").fetchone()
+    return row[0]
+
+def load_question_set(db_path: str, set_id: Optional[int] = None) -> Tuple[int, List[str], List[str]]:
+    """
+    Carga un conjunto de preguntas; por defecto el más reciente.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        set_id (Optional[int]): Id del conjunto.
+
+    Returns:
+        Tuple[int, List[str], List[str]]: Id del conjunto, preguntas y respuestas de referencia.
+
+    Raises:
+        ValueError: Si no existe el conjunto pedido o el almacén no tiene preguntas.
+    """
+    set_id = set_id if set_id is not None else latest_question_set_id(db_path)
+    with closing(connect(db_path)) as connection:
+        rows = connection.execute(
+            "SELECT question, answer FROM questions WHERE set_id = ? ORDER BY position", (set_id,)
+        ).fetchall()
+    if not rows:
+        raise ValueError(f"No hay preguntas guardadas para el conjunto {set_id}.")
+    return set_id, [row[0] for row in rows], [row[1] for row in rows]
+
+def save_run(db_path: str, results: pd.DataFrame, config: dict, question_set_id: Optional[int] = None) -> int:
+    """
+    Agrega los resultados por pregunta de una evaluación como una corrida nueva.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        results (pd.DataFrame): Resultados de `evaluate_rag_pipeline`, con las columnas de `METRICS` y, según la
+            versión de ragas, "user_input"/"question", "response"/"answer" y "reference". Si tiene la columna
+            "position" (evaluación secuencial, que responde un subconjunto desordenado), cada resultado se guarda en
+            la posición de su pregunta dentro del conjunto; si no, en el orden de las filas.
+        config (dict): Configuración usada en la corrida (se guarda sin credenciales).
+        question_set_id (Optional[int]): Conjunto de preguntas evaluado.
+
+    Returns:
+        int: Id de la corrida.
+    """
+    def column(*names: str) -> List:
+        for name in names:
+            if name in results:
+                return results[name].astype(str).tolist()
+        return [None] * len(results)
+
+    metrics = {metric: results[metric].tolist() if metric in results else [None] * len(results) for metric in METRICS}
+    rows = zip(column("user_input", "question"), column("response", "answer"), column("reference"),
+               *[metrics[metric] for metric in METRICS])
+    positions = results["position"].tolist() if "position" in results else range(len(results))
+
+    with closing(connect(db_path)) as connection, connection:
+        cursor = connection.execute(
+            "INSERT INTO runs (created_at, rag, question_set_id, config_hash, config_json) VALUES (?, ?, ?, ?, ?)",
+            (time.time(), config.get("rag"), question_set_id, config_hash(config),
+             json.dumps(public_config(config), default=str)),
+        )
+        run_id = cursor.lastrowid
+        connection.executemany(
+            f"INSERT INTO run_results (run_id, position, question, response, reference, {', '.join(METRICS)}) "
+            f"VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(METRICS))})",
+            [(run_id, int(position), *row) for position, row in zip(positions, rows)],
+        )
+    logging.info(f"Corrida de evaluación {run_id} guardada en '{db_path}'.")
+    return run_id
+
+def list_runs(db_path: str, rag: Optional[str] = None, limit: int = 50) -> pd.DataFrame:
+    """
+    Lista las corridas más recientes con el promedio de cada métrica.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        rag (Optional[str]): Si se indica, solo las corridas de ese pipeline.
+        limit (int): Máximo de corridas.
+
+    Returns:
+        pd.DataFrame: Una fila por corrida, de la más reciente a la más antigua.
+    """
+    query = (
+        "SELECT runs.id AS run_id, datetime(runs.created_at, 'unixepoch', 'localtime') AS created_at, runs.rag, "
+        "runs.question_set_id, runs.config_hash, COUNT(run_results.position) AS num_questions, "
+        + ", ".join(f"AVG(run_results.{metric}) AS {metric}" for metric in METRICS)
+        + " FROM runs LEFT JOIN run_results ON run_results.run_id = runs.id"
+        + (" WHERE runs.rag = ?" if rag else "")
+        + " GROUP BY runs.id ORDER BY runs.id DESC LIMIT ?"
+    )
+    with closing(connect(db_path)) as connection:
+        return pd.read_sql_query(query, connection, params=([rag] if rag else []) + [limit])
+
+def load_run_results(db_path: str, run_ids: List[int]) -> pd.DataFrame:
+    """
+    Carga los resultados por pregunta de las corridas indicadas.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        run_ids (List[int]): Ids de las corridas.
+
+    Returns:
+        pd.DataFrame: Resultados por pregunta con la columna "run_id".
+    """
+    placeholders = ", ".join("?" * len(run_ids))
+    with closing(connect(db_path)) as connection:
+        return pd.read_sql_query(
+            f"SELECT * FROM run_results WHERE run_id IN ({placeholders}) ORDER BY run_id, position",
+            connection, params=list(run_ids),
+        )
+
+def compare_runs(db_path: str, run_ids: List[int]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compara corridas: promedio de cada métrica y parámetros de configuración que difieren entre ellas.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        run_ids (List[int]): Ids de las corridas.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: Métricas (una columna por corrida) y parámetros distintos
+            (una columna por corrida).
+    """
+    results = load_run_results(db_path, run_ids)
+    metrics = results.groupby("run_id")[METRICS].mean().T
+
+    placeholders = ", ".join("?" * len(run_ids))
+    with closing(connect(db_path)) as connection:
+        rows = connection.execute(f"SELECT id, config_json FROM runs WHERE id IN ({placeholders})", list(run_ids)).fetchall()
+    configs = pd.DataFrame({run_id: json.loads(config_json) for run_id, config_json in rows}).astype(str)
+    differing = configs[configs.nunique(axis=1) > 1] if len(configs.columns) > 1 else configs
+    return metrics, differing
+
+def find_chunk_snapshot(db_path: str, config: dict, chunks_hash: str) -> Optional[int]:
+    """
+    Busca la instantánea más reciente de un pipeline con la misma configuración y el mismo contenido.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        config (dict): Configuración con la clave "rag".
+        chunks_hash (str): Huella del texto de los fragmentos (ver `content_hash`).
+
+    Returns:
+        Optional[int]: Id de la instantánea, o None si no hay ninguna equivalente.
+    """
+    with closing(connect(db_path)) as connection:
+        row = connection.execute(
+            "SELECT id FROM chunk_snapshots WHERE rag IS ? AND config_hash = ? AND content_hash = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (config.get("rag"), config_hash(config), chunks_hash),
+        ).fetchone()
+    return row[0] if row else None
+
+def save_chunk_snapshot(db_path: str, chunks: List, config: dict, chunks_hash: Optional[str] = None) -> int:
+    """
+    Agrega una instantánea de los fragmentos de un pipeline.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        chunks (List): Fragmentos "super" (diccionarios con "chunk_text" y "metadata") o documentos "naive".
+        config (dict): Configuración con la clave "rag".
+        chunks_hash (Optional[str]): Huella del contenido (ver `content_hash`), para no repetir la instantánea
+            mientras no cambie.
+
+    Returns:
+        int: Id de la instantánea.
+    """
+    def row(position: int, chunk) -> Tuple:
+        if isinstance(chunk, dict):
+            metadata = chunk.get("metadata", {})
+            return (position, chunk["chunk_text"], metadata.get("title"), metadata.get("subtitle"),
+                    metadata.get("sub_subtitle"))
+        return (position, chunk.page_content, chunk.metadata.get("title"), chunk.metadata.get("subtitle"),
+                chunk.metadata.get("sub_subtitle"))
+
+    with closing(connect(db_path)) as connection, connection:
+        cursor = connection.execute(
+            "INSERT INTO chunk_snapshots (created_at, rag, config_hash, content_hash, num_chunks) VALUES (?, ?, ?, ?, ?)",
+            (time.time(), config.get("rag"), config_hash(config), chunks_hash, len(chunks)),
+        )
+        snapshot_id = cursor.lastrowid
+        connection.executemany(
+            "INSERT INTO chunks (snapshot_id, position, chunk_text, title, subtitle, sub_subtitle) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(snapshot_id, *row(position, chunk)) for position, chunk in enumerate(chunks)],
+        )
+    return snapshot_id
+
+def list_chunk_snapshots(db_path: str, rag: Optional[str] = None, limit: int = 50) -> pd.DataFrame:
+    """
+    Lista las instantáneas de fragmentos más recientes.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        rag (Optional[str]): Si se indica, solo las instantáneas de ese pipeline.
+        limit (int): Máximo de instantáneas.
+
+    Returns:
+        pd.DataFrame: Una fila por instantánea, de la más reciente a la más antigua.
+    """
+    query = (
+        "SELECT id AS snapshot_id, datetime(created_at, 'unixepoch', 'localtime') AS created_at, rag, config_hash, "
+        "num_chunks FROM chunk_snapshots" + (" WHERE rag = ?" if rag else "") + " ORDER BY id DESC LIMIT ?"
+    )
+    with closing(connect(db_path)) as connection:
+        return pd.read_sql_query(query, connection, params=([rag] if rag else []) + [limit])
+
+def load_chunks(db_path: str, snapshot_id: int, offset: int = 0, limit: Optional[int] = None,
+    title: Optional[str] = None) -> pd.DataFrame:
+    """
+    Lee una ventana de los fragmentos de una instantánea, opcionalmente filtrada por título.
+
+    Args:
+        db_path (str): Ruta del almacén.
+        snapshot_id (int): Id de la instantánea.
+        offset (int): Posición del primer fragmento.
+        limit (Optional[int]): Máximo de fragmentos; None lee todos.
+        title (Optional[str]): Si se indica, solo fragmentos cuyo título contiene este texto.
+
+    Returns:
+        pd.DataFrame: Fragmentos con su posición y metadata.
+    """
+    query = "SELECT position, chunk_text, title, subtitle, sub_subtitle FROM chunks WHERE snapshot_id = ? AND position >= ?"
+    params: List = [snapshot_id, offset]
+    if title:
+        query += " AND title LIKE ?"
+        params.append(f"%{title}%")
+    query += " ORDER BY position LIMIT ?"
+    params.append(limit if limit is not None else -1)
+    with closing(connect(db_path)) as connection:
+        return pd.read_sql_query(query, connection, params=params)
+
+def export_to_excel(frames: Dict[str, pd.DataFrame]) -> bytes:
+    """
+    Exporta tablas del almacén a un libro Excel en memoria, para descargarlo explícitamente.
+
+    Args:
+        frames (Dict[str, pd.DataFrame]): Hojas del libro, por nombre.
+
+    Returns:
+        bytes: Contenido del archivo .xlsx.
+    """
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for sheet_name, frame in frames.items():
+            frame.to_excel(writer, sheet_name=sheet_name[:31], index=True)
+    return buffer.getvalue()
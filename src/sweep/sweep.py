@@ -0,0 +1,350 @@
+import copy
+import itertools
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.chunking.chunking import (
+    load_pdf_all_documents,
+    combine_sentences,
+    assign_metadata_to_chunks_with_context
+)
+from src.chunking.segmenter import split_sentences
+from src.embedding.embedding import (
+    consecutive_cosine_distances,
+    chunk_boundaries,
+    chunks_from_boundaries,
+    split_into_chunks_bounded,
+    get_embedding_model,
+    chunk_token_report,
+    normalize_rows
+)
+from src.loaders.loaders import (load_pdf, split_pdf_documents)
+from src.run_store.run_store import (latest_question_set_id, load_question_set)
+from src.retrievers.retrievers import load_config
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def load_benchmark_questions(questions_file: str = "data/evaluation_data.xlsx",
+    db_path: str = "data/runs.sqlite") -> Tuple[List[str], List[str]]:
+    """
+    Carga las preguntas y respuestas de referencia usadas como benchmark de recuperación: el conjunto más reciente
+    del almacén de corridas o, si no hay ninguno, el archivo Excel.
+
+    Args:
+        questions_file (str): Ruta al archivo Excel con las columnas 'question' y 'answer'.
+        db_path (str): Ruta del almacén de corridas.
+
+    Returns:
+        Tuple[List[str], List[str]]: Preguntas y respuestas de referencia.
+    """
+    if os.path.exists(db_path) and latest_question_set_id(db_path) is not None:
+        _, questions, answers = load_question_set(db_path)
+        return questions, answers
+
+    questions_df = pd.read_excel(questions_file)
+    if questions_df.empty:
+        raise ValueError(f"El archivo '{questions_file}' está vacío. No se puede continuar.")
+    return questions_df["question"].tolist(), questions_df["answer"].astype(str).tolist()
+
+def embed_texts_cached(texts: List[str], embedding_model, cache: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Calcula embeddings normalizados reutilizando los textos ya vistos en configuraciones anteriores.
+
+    Muchos fragmentos se repiten entre umbrales cercanos, por lo que sólo se embeben los textos nuevos.
+
+    Args:
+        texts (List[str]): Textos a embeber.
+        embedding_model: Modelo con método `embed_documents`.
+        cache (Dict[str, np.ndarray]): Caché texto -> embedding normalizado, se actualiza en el lugar.
+
+    Returns:
+        np.ndarray: Matriz (len(texts), d) de embeddings normalizados.
+    """
+    missing = list(dict.fromkeys(text for text in texts if text not in cache))
+    if missing:
+        vectors = normalize_rows(embedding_model.embed_documents(missing))
+        cache.update(zip(missing, vectors))
+    return np.stack([cache[text] for text in texts]) if texts else np.empty((0, 0), dtype=np.float32)
+
+def answer_token_recall(answer: str, context: str) -> float:
+    """
+    Proporción de tokens de la respuesta de referencia presentes en el contexto recuperado.
+
+    Args:
+        answer (str): Respuesta de referencia.
+        context (str): Texto recuperado.
+
+    Returns:
+        float: Valor entre 0 y 1.
+    """
+    answer_tokens = set(TOKEN_PATTERN.findall(answer.lower()))
+    if not answer_tokens:
+        return 0.0
+    context_tokens = set(TOKEN_PATTERN.findall(context.lower()))
+    return len(answer_tokens & context_tokens) / len(answer_tokens)
+
+def evaluate_retrieval(chunk_texts: List[str], chunk_vectors: np.ndarray, question_vectors: np.ndarray,
+    ground_truths: List[str], k: int = 4) -> Dict[str, float]:
+    """
+    Benchmark de recuperación sin LLM: búsqueda densa top-k y cobertura léxica de la respuesta de referencia.
+
+    Args:
+        chunk_texts (List[str]): Textos de los fragmentos indexados.
+        chunk_vectors (np.ndarray): Embeddings normalizados de los fragmentos.
+        question_vectors (np.ndarray): Embeddings normalizados de las preguntas.
+        ground_truths (List[str]): Respuestas de referencia, una por pregunta.
+        k (int): Número de fragmentos recuperados por pregunta.
+
+    Returns:
+        Dict[str, float]: Métricas de recuperación y costo de contexto.
+    """
+    k = min(k, len(chunk_texts))
+    start = time.perf_counter()
+    scores = question_vectors @ chunk_vectors.T
+    top_k = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    search_seconds = time.perf_counter() - start
+
+    recalls = list()
+    context_words = list()
+    for answer, indices in zip(ground_truths, top_k):
+        context = " ".join(chunk_texts[i] for i in indices)
+        recalls.append(answer_token_recall(answer, context))
+        context_words.append(len(context.split()))
+
+    recalls = np.asarray(recalls)
+    return {
+        "num_chunks": len(chunk_texts),
+        "mean_chunk_words": float(np.mean([len(text.split()) for text in chunk_texts])),
+        "context_recall": float(recalls.mean()),
+        "hit_rate": float((recalls >= 0.5).mean()),
+        "mean_context_words": float(np.mean(context_words)),
+        "search_ms_per_query": 1000 * search_seconds / max(len(ground_truths), 1),
+    }
+
+def split_chunks_for_thresholds(sentence_texts: List[str], distances: np.ndarray,
+    thresholds: Iterable[float]) -> Dict[float, List[str]]:
+    """
+    Deriva la segmentación semántica de varios umbrales a partir de un único vector de distancias.
+
+    Args:
+        sentence_texts (List[str]): Texto de cada oración.
+        distances (np.ndarray): Distancias coseno entre oraciones combinadas consecutivas.
+        thresholds (Iterable[float]): Umbrales a evaluar.
+
+    Returns:
+        Dict[float, List[str]]: Fragmentos resultantes para cada umbral.
+    """
+    return {
+        threshold: chunks_from_boundaries(sentence_texts, chunk_boundaries(distances, threshold).tolist())
+        for threshold in thresholds
+    }
+
+def embed_sentences_for_buffer(sentences: List[Dict[str, str]], buffer_size: int, embedding_model) -> np.ndarray:
+    """
+    Combina las oraciones con el tamaño de buffer indicado y calcula el vector de distancias una sola vez.
+
+    Args:
+        sentences (List[Dict[str, str]]): Oraciones base devueltas por `split_sentences`.
+        buffer_size (int): Número de oraciones antes y después a combinar.
+        embedding_model: Modelo con método `embed_documents`.
+
+    Returns:
+        np.ndarray: Distancias coseno entre oraciones combinadas consecutivas.
+    """
+    combined_sentences = combine_sentences(copy.deepcopy(sentences), buffer_size)
+    embeddings = embedding_model.embed_documents([sentence['combined_sentence'] for sentence in combined_sentences])
+    return consecutive_cosine_distances(embeddings)
+
+def run_super_sweep(config: dict, thresholds: List[float], buffer_sizes: List[int], max_previous_chunks_values: List[int],
+    questions: List[str], ground_truths: List[str], embedding_model=None, k: int = 4,
+    benchmark: Callable[..., Dict[str, float]] = evaluate_retrieval) -> pd.DataFrame:
+    """
+    Evalúa la grilla threshold x buffer_size x max_previous_chunks del RAG "super" en una sola pasada.
+
+    Las oraciones se embeben una vez por buffer_size; cada umbral reutiliza el vector de distancias en caché.
+
+    Args:
+        config (dict): Configuración con "directory_path" y "model_name".
+        thresholds (List[float]): Umbrales de distancia a evaluar.
+        buffer_sizes (List[int]): Tamaños de buffer a evaluar.
+        max_previous_chunks_values (List[int]): Ventanas de contexto de metadata a evaluar.
+        questions (List[str]): Preguntas del benchmark.
+        ground_truths (List[str]): Respuestas de referencia.
+        embedding_model (opcional): Modelo de embeddings; por defecto se crea a partir de "model_name".
+        k (int): Número de fragmentos recuperados por pregunta.
+        benchmark (Callable): Función de evaluación de recuperación.
+
+    Returns:
+        pd.DataFrame: Una fila por combinación de parámetros con sus métricas.
+    """
+    embedding_model = embedding_model or get_embedding_model(config["model_name"], config.get("embedding_backend", "torch"))
+    pdf_texts = load_pdf_all_documents(config["directory_path"])
+    sentences = split_sentences(pdf_texts, config)
+    sentence_texts = [sentence['sentence'] for sentence in sentences]
+
+    question_vectors = normalize_rows(embedding_model.embed_documents(questions))
+    chunk_cache = dict()
+    rows = list()
+
+    for buffer_size in buffer_sizes:
+        start = time.perf_counter()
+        distances = embed_sentences_for_buffer(sentences, buffer_size, embedding_model)
+        logging.info(f"Distancias para buffer_size={buffer_size} calculadas en {time.perf_counter() - start:.1f}s")
+
+        for threshold, chunks in split_chunks_for_thresholds(sentence_texts, distances, thresholds).items():
+            chunk_vectors = embed_texts_cached(chunks, embedding_model, chunk_cache)
+            metrics = benchmark(chunks, chunk_vectors, question_vectors, ground_truths, k)
+
+            for max_previous_chunks in max_previous_chunks_values:
+                annotated_chunks = assign_metadata_to_chunks_with_context(chunks, max_previous_chunks)
+                coverage = np.mean([chunk["metadata"]["sub_subtitle"] is not None for chunk in annotated_chunks])
+                rows.append({
+                    "rag": "super",
+                    "buffer_size": buffer_size,
+                    "threshold": threshold,
+                    "max_previous_chunks": max_previous_chunks,
+                    "metadata_coverage": float(coverage),
+                    **metrics,
+                })
+
+    return pd.DataFrame(rows)
+
+def run_naive_sweep(config: dict, chunk_sizes: List[int], chunk_overlaps: List[int], questions: List[str],
+    ground_truths: List[str], embedding_model=None, k: int = 4,
+    benchmark: Callable[..., Dict[str, float]] = evaluate_retrieval) -> pd.DataFrame:
+    """
+    Evalúa la grilla chunk_size x chunk_overlap del RAG "naive" cargando el PDF una sola vez.
+
+    Args:
+        config (dict): Configuración con "file_path" y "model_name".
+        chunk_sizes (List[int]): Tamaños de fragmento en caracteres.
+        chunk_overlaps (List[int]): Solapamientos en caracteres; se omiten los que no sean menores al tamaño.
+        questions (List[str]): Preguntas del benchmark.
+        ground_truths (List[str]): Respuestas de referencia.
+        embedding_model (opcional): Modelo de embeddings; por defecto se crea a partir de "model_name".
+        k (int): Número de fragmentos recuperados por pregunta.
+        benchmark (Callable): Función de evaluación de recuperación.
+
+    Returns:
+        pd.DataFrame: Una fila por combinación de parámetros con sus métricas.
+    """
+    embedding_model = embedding_model or get_embedding_model(config["model_name"], config.get("embedding_backend", "torch"))
+    docs = load_pdf(config["file_path"])
+    question_vectors = normalize_rows(embedding_model.embed_documents(questions))
+    chunk_cache = dict()
+    rows = list()
+
+    for chunk_size, chunk_overlap in itertools.product(chunk_sizes, chunk_overlaps):
+        if chunk_overlap >= chunk_size:
+            continue
+        chunks = [split.page_content for split in split_pdf_documents(docs, chunk_size, chunk_overlap)]
+        chunk_vectors = embed_texts_cached(chunks, embedding_model, chunk_cache)
+        metrics = benchmark(chunks, chunk_vectors, question_vectors, ground_truths, k)
+        rows.append({"rag": "naive", "chunk_size": chunk_size, "chunk_overlap": chunk_overlap, **metrics})
+
+    return pd.DataFrame(rows)
+
+def run_parameter_sweep(config: dict, questions_file: Optional[str] = "data/evaluation_data.xlsx",
+    results_file: Optional[str] = "sweep_results.xlsx") -> pd.DataFrame:
+    """
+    Ejecuta la grilla completa (super y naive) definida en las claves `sweep_*` de la configuración.
+
+    Args:
+        config (dict): Configuración del proyecto. Claves opcionales: "sweep_thresholds", "sweep_buffer_sizes",
+            "sweep_max_previous_chunks", "sweep_chunk_sizes", "sweep_chunk_overlaps" y "sweep_k".
+        questions_file (Optional[str]): Archivo Excel con las preguntas del benchmark.
+        results_file (Optional[str]): Archivo Excel donde guardar los resultados; None para no guardar.
+
+    Returns:
+        pd.DataFrame: Resultados de todas las combinaciones evaluadas.
+    """
+    questions, ground_truths = load_benchmark_questions(questions_file, config.get("run_store_path", "data/runs.sqlite"))
+    embedding_model = get_embedding_model(config["model_name"], config.get("embedding_backend", "torch"))
+    k = config.get("sweep_k", 4)
+
+    super_results = run_super_sweep(
+        config,
+        config.get("sweep_thresholds", [config["threshold"]]),
+        config.get("sweep_buffer_sizes", [config["buffer_size"]]),
+        config.get("sweep_max_previous_chunks", [config["max_previous_chunks"]]),
+        questions, ground_truths, embedding_model, k,
+    )
+    naive_results = run_naive_sweep(
+        config,
+        config.get("sweep_chunk_sizes", [1000]),
+        config.get("sweep_chunk_overlaps", [200]),
+        questions, ground_truths, embedding_model, k,
+    )
+
+    results = pd.concat([super_results, naive_results], ignore_index=True)
+    if results_file:
+        results.to_excel(results_file, index=False, engine="openpyxl")
+        logging.info(f"Resultados del barrido guardados en: {results_file}")
+    return results
+
+def compare_chunking_modes(config: dict, questions_file: Optional[str] = "data/evaluation_data.xlsx",
+    embedding_model=None) -> pd.DataFrame:
+    """
+    Compara la segmentación semántica libre con la acotada por tokens sobre el mismo vector de distancias.
+
+    Reporta el tamaño del índice (fragmentos, bytes de vectores, caracteres almacenados, tokens truncados por
+    el modelo) y la latencia de consulta (embedding de la pregunta + búsqueda) junto al contexto enviado al LLM.
+
+    Args:
+        config (dict): Configuración con "directory_path", "model_name", "buffer_size" y "threshold"; usa
+            "min_chunk_tokens" y "max_chunk_tokens" si están definidos.
+        questions_file (Optional[str]): Archivo Excel con las preguntas del benchmark.
+        embedding_model (opcional): Modelo de embeddings; por defecto se crea a partir de "model_name".
+
+    Returns:
+        pd.DataFrame: Una fila por modo de segmentación.
+    """
+    embedding_model = embedding_model or get_embedding_model(config["model_name"], config.get("embedding_backend", "torch"))
+    questions, ground_truths = load_benchmark_questions(questions_file, config.get("run_store_path", "data/runs.sqlite"))
+    pdf_texts = load_pdf_all_documents(config["directory_path"])
+    sentences = split_sentences(pdf_texts, config)
+    distances = embed_sentences_for_buffer(sentences, config["buffer_size"], embedding_model)
+
+    chunkings = {
+        "semantic": chunks_from_boundaries([sentence['sentence'] for sentence in sentences],
+                                           chunk_boundaries(distances, config["threshold"]).tolist()),
+        "bounded": split_into_chunks_bounded(sentences, distances, config["threshold"], config["model_name"],
+                                             config.get("min_chunk_tokens"), config.get("max_chunk_tokens")),
+    }
+
+    rows = list()
+    for mode, chunks in chunkings.items():
+        start = time.perf_counter()
+        chunk_vectors = normalize_rows(embedding_model.embed_documents(chunks))
+        indexing_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        question_vectors = normalize_rows([embedding_model.embed_query(question) for question in questions])
+        query_embedding_ms = 1000 * (time.perf_counter() - start) / len(questions)
+
+        metrics = evaluate_retrieval(chunks, chunk_vectors, question_vectors, ground_truths, config.get("sweep_k", 4))
+        rows.append({
+            "chunk_mode": mode,
+            **chunk_token_report(chunks, config["model_name"]),
+            "vector_bytes": int(chunk_vectors.nbytes),
+            "indexing_seconds": indexing_seconds,
+            "query_ms": query_embedding_ms + metrics["search_ms_per_query"],
+            **{key: value for key, value in metrics.items() if key != "num_chunks"},
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    config = load_config("config.yaml")
+    results = run_parameter_sweep(config)
+    print(results.sort_values("context_recall", ascending=False).to_string(index=False))
+    print(compare_chunking_modes(config).to_string(index=False))
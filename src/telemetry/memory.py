@@ -0,0 +1,41 @@
+import time
+import threading
+
+import psutil
+
+
+def current_rss() -> int:
+    """Devuelve la memoria residente (RSS) del proceso en bytes."""
+    return psutil.Process().memory_info().rss
+
+
+class PeakMemorySampler:
+    """
+    Muestrea el RSS del proceso en un hilo para obtener el pico de memoria de una etapa.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        """
+        Args:
+            interval (float): Segundos entre muestras.
+        """
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = self.process.memory_info().rss
+        self.running = threading.Event()
+
+    def _sample(self) -> None:
+        while self.running.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def __enter__(self) -> "PeakMemorySampler":
+        self.running.set()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.running.clear()
+        self.thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.outputs import LLMResult
+
+
+TELEMETRY_LOGGER_NAME = "rag.telemetry"
+AGGREGATED_FIELDS = ("total_ms", "embedding_ms", "search_ms", "llm_ms", "prompt_tokens", "completion_tokens",
+                     "retrieved_chunks", "retrieved_chars")
+
+_CURRENT_RECORD: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("telemetry_record", default=None)
+
+
+class TimedEmbeddings(Embeddings):
+    """
+    Envoltorio de un modelo de embeddings que suma el tiempo de `embed_query` al registro de telemetría activo.
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        """
+        Args:
+            embeddings (Embeddings): Modelo de embeddings a envolver.
+        """
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        vector = self.embeddings.embed_query(text)
+        record = _CURRENT_RECORD.get()
+        if record is not None:
+            record["embedding_ms"] = record.get("embedding_ms", 0.0) + 1000 * (time.perf_counter() - start)
+        return vector
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """
+    Callback de LangChain que registra los tiempos de recuperación y del LLM, los fragmentos recuperados y los tokens.
+    """
+
+    def __init__(self, record: Dict[str, Any]):
+        """
+        Args:
+            record (Dict[str, Any]): Registro de telemetría de la consulta en curso, se completa en el lugar.
+        """
+        self.record = record
+        self.starts: Dict[UUID, float] = dict()
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self.starts[run_id] = time.perf_counter()
+
+    def on_retriever_end(self, documents: List[Document], *, run_id: UUID, **kwargs: Any) -> None:
+        self.record["retrieval_ms"] = 1000 * (time.perf_counter() - self.starts.pop(run_id, time.perf_counter()))
+        self.record["retrieved_chunks"] = len(documents)
+        self.record["retrieved_chars"] = sum(len(document.page_content) for document in documents)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List, *, run_id: UUID, **kwargs: Any) -> None:
+        self.starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self.starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self.record["llm_ms"] = 1000 * (time.perf_counter() - self.starts.pop(run_id, time.perf_counter()))
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.record["prompt_tokens"] = usage.get("prompt_tokens")
+        self.record["completion_tokens"] = usage.get("completion_tokens")
+        self.record["llm_model"] = (response.llm_output or {}).get("model_name")
+
+
+class TelemetryAggregate:
+    """
+    Ventana móvil en memoria de los últimos registros de telemetría con percentiles p50/p95.
+    """
+
+    def __init__(self, window: int = 500):
+        """
+        Args:
+            window (int): Número de consultas recientes consideradas.
+        """
+        self.records = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]) -> None:
+        with self.lock:
+            self.records.append(record)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Calcula p50 y p95 de cada métrica sobre la ventana.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Por métrica, sus percentiles y el número de consultas con dato.
+        """
+        with self.lock:
+            records = list(self.records)
+        summary = dict()
+        for field in AGGREGATED_FIELDS:
+            values = np.array([record[field] for record in records if record.get(field) is not None], dtype=np.float64)
+            if len(values):
+                summary[field] = {
+                    "p50": float(np.percentile(values, 50)),
+                    "p95": float(np.percentile(values, 95)),
+                    "count": len(values),
+                }
+        return summary
+
+
+_AGGREGATE = TelemetryAggregate()
+_CONFIGURE_LOCK = threading.Lock()
+
+
+def configure_telemetry(config: dict) -> logging.Logger:
+    """
+    Configura, una sola vez por proceso, el destino JSONL rotativo y la ventana del agregado en memoria.
+
+    Args:
+        config (dict): Configuración con las claves opcionales "telemetry_path", "telemetry_max_bytes",
+            "telemetry_backup_count" y "telemetry_window".
+
+    Returns:
+        logging.Logger: Logger de telemetría.
+    """
+    global _AGGREGATE
+    logger = logging.getLogger(TELEMETRY_LOGGER_NAME)
+    with _CONFIGURE_LOCK:
+        if logger.handlers:
+            return logger
+
+        path = config.get("telemetry_path", "logs/telemetry.jsonl")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=config.get("telemetry_max_bytes", 10 * 2**20),
+                                      backupCount=config.get("telemetry_backup_count", 5), encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        _AGGREGATE = TelemetryAggregate(config.get("telemetry_window", 500))
+    return logger
+
+def emit_record(record: Dict[str, Any]) -> None:
+    """
+    Escribe un registro en el destino JSONL y lo agrega a la ventana en memoria.
+
+    Args:
+        record (Dict[str, Any]): Registro de telemetría.
+    """
+    logger = logging.getLogger(TELEMETRY_LOGGER_NAME)
+    if not logger.handlers:
+        logger = configure_telemetry(dict())
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+    _AGGREGATE.add(record)
+
+def invoke_with_telemetry(rag_chain: object, query: str, source: str, rag: Optional[str] = None,
+    on_record: Optional[Callable[[dict], None]] = None) -> str:
+    """
+    Ejecuta la cadena RAG sobre una consulta y emite un registro estructurado con sus tiempos y tokens.
+
+    Args:
+        rag_chain (object): Cadena RAG a invocar.
+        query (str): Consulta del usuario.
+        source (str): Origen de la consulta, por ejemplo "chat" o "evaluation".
+        rag (Optional[str]): Pipeline usado ("super" o "naive").
+        on_record (Optional[Callable[[dict], None]]): Se llama con el registro completo de la consulta, por ejemplo
+            para acumular los tokens consumidos.
+
+    Returns:
+        str: Respuesta de la cadena. Las excepciones se registran y se vuelven a lanzar.
+    """
+    record = {
+        "timestamp": time.time(),
+        "source": source,
+        "rag": rag,
+        "query_chars": len(query),
+        "cache": "miss",
+    }
+    token = _CURRENT_RECORD.set(record)
+    start = time.perf_counter()
+    try:
+        return rag_chain.invoke(query, config={"callbacks": [TelemetryCallbackHandler(record)]})
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        _CURRENT_RECORD.reset(token)
+        record["total_ms"] = 1000 * (time.perf_counter() - start)
+        if "retrieval_ms" in record:
+            record["search_ms"] = record["retrieval_ms"] - record.get("embedding_ms", 0.0)
+        emit_record(record)
+        if on_record is not None:
+            on_record(record)
+
+def mark_cache_status(status: str) -> None:
+    """
+    Anota el estado de caché de la consulta en curso, por ejemplo "coalesced" si comparte una ejecución ajena.
+
+    Args:
+        status (str): Estado de caché.
+    """
+    record = _CURRENT_RECORD.get()
+    if record is not None:
+        record["cache"] = status
+
+def telemetry_summary() -> Dict[str, Dict[str, float]]:
+    """Devuelve los percentiles p50/p95 de la ventana de telemetría en memoria."""
+    return _AGGREGATE.summary()
@@ -0,0 +1,378 @@
+import os
+import re
+import heapq
+import shutil
+import itertools
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_qdrant import QdrantVectorStore
+
+from src.embedding.embedding import get_embedding_model, normalize_rows
+from src.telemetry.telemetry import TimedEmbeddings
+from src.vector_store_client.vector_store_client import create_qdrant_store, create_qdrant_store_naive, store_lock
+
+
+class SharedQueryEmbeddings(Embeddings):
+    """
+    Envoltorio de embeddings compartido por todos los shards: la consulta se embebe una sola vez aunque
+    todos los shards la busquen en paralelo.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_cached: int = 128):
+        """
+        Args:
+            embeddings (Embeddings): Modelo de embeddings a envolver.
+            max_cached (int): Número de consultas recientes cuyo vector se conserva.
+        """
+        self.embeddings = embeddings
+        self.max_cached = max_cached
+        self.cache: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.lock:
+            if text in self.cache:
+                self.cache.move_to_end(text)
+                return self.cache[text]
+        # El modelo se llama fuera del cerrojo para no serializar consultas distintas.
+        vector = self.embeddings.embed_query(text)
+        with self.lock:
+            self.cache[text] = vector
+            self.cache.move_to_end(text)
+            if len(self.cache) > self.max_cached:
+                self.cache.popitem(last=False)
+        return vector
+
+
+def shard_name(key: str, part: int) -> str:
+    """
+    Construye un nombre de shard válido como nombre de colección a partir del volumen de origen.
+
+    Args:
+        key (str): Volumen de origen (por ejemplo, el nombre del PDF).
+        part (int): Número de parte dentro del volumen.
+
+    Returns:
+        str: Nombre del shard.
+    """
+    stem = re.sub(r"[^0-9A-Za-z_-]+", "_", os.path.splitext(os.path.basename(key))[0]) or "corpus"
+    return f"{stem}-{part}"
+
+def chunk_source(chunk: Any) -> str:
+    """Devuelve el volumen de origen de un fragmento "super" (diccionario) o "naive" (`Document`)."""
+    return chunk.get("source", "") if isinstance(chunk, dict) else chunk.metadata.get("source", "")
+
+def plan_shards(items: List, key: Callable[[Any], str], max_items: Optional[int] = None) -> Dict[str, List]:
+    """
+    Agrupa los fragmentos en shards: uno por volumen y, si un volumen supera `max_items`, varias partes
+    de tamaño parejo.
+
+    Args:
+        items (List): Fragmentos a indexar, en orden.
+        key (Callable[[Any], str]): Devuelve el volumen de origen de un fragmento.
+        max_items (Optional[int]): Máximo de fragmentos por shard; `None` o 0 no limita.
+
+    Returns:
+        Dict[str, List]: Fragmentos de cada shard, en el orden original.
+    """
+    volumes: Dict[str, List] = dict()
+    for item in items:
+        volumes.setdefault(key(item) or "corpus", []).append(item)
+
+    shards = dict()
+    for volume, volume_items in volumes.items():
+        parts = -(-len(volume_items) // max_items) if max_items else 1
+        size, remainder = divmod(len(volume_items), parts)
+        start = 0
+        for part in range(parts):
+            end = start + size + (part < remainder)
+            shards[shard_name(volume, part)] = volume_items[start:end]
+            start = end
+    return shards
+
+
+class ShardedVectorStore:
+    """
+    Conjunto de colecciones Qdrant independientes (shards) que se construyen en paralelo y se consultan
+    en abanico, mezclando el top-k global por puntaje.
+    """
+
+    def __init__(self, build_shard: Callable[[str, List], QdrantVectorStore], max_workers: int = 2,
+        release_shard: Optional[Callable[[QdrantVectorStore], None]] = None):
+        """
+        Args:
+            build_shard (Callable[[str, List], QdrantVectorStore]): Crea la colección de un shard a partir de
+                su nombre y sus fragmentos.
+            max_workers (int): Hilos para construir y consultar los shards.
+            release_shard (Optional[Callable[[QdrantVectorStore], None]]): Se llama con la colección de un shard
+                reemplazado o quitado, ya cerrada, para liberar su almacenamiento (por ejemplo, su carpeta).
+        """
+        self.build_shard = build_shard
+        self.release_shard = release_shard
+        self.max_workers = max_workers
+        self.shards: Dict[str, QdrantVectorStore] = dict()
+        self.sizes: Dict[str, int] = dict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard")
+
+    def build(self, shards: Dict[str, List],
+        on_shard_ready: Optional[Callable[["ShardedVectorStore", str, int], None]] = None) -> "ShardedVectorStore":
+        """
+        Construye los shards en paralelo; cada uno queda consultable apenas termina.
+
+        Args:
+            shards (Dict[str, List]): Fragmentos de cada shard, ver `plan_shards`.
+            on_shard_ready (Optional[Callable[[ShardedVectorStore, str, int], None]]): Se llama con el almacén,
+                el shard terminado y el total de fragmentos ya indexados.
+
+        Returns:
+            ShardedVectorStore: El mismo almacén.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="shard-build") as executor:
+            futures = {executor.submit(self.build_shard, name, items): name for name, items in shards.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                self._register(name, future.result(), len(shards[name]))
+                logging.info(f"Shard '{name}' indexado con {len(shards[name])} fragmentos.")
+                if on_shard_ready:
+                    on_shard_ready(self, name, sum(self.sizes.values()))
+        return self
+
+    def rebuild_shard(self, name: str, items: List) -> QdrantVectorStore:
+        """
+        Reconstruye un único shard sin tocar los demás; las consultas siguen usando la versión anterior
+        hasta que la nueva está lista.
+
+        Args:
+            name (str): Nombre del shard.
+            items (List): Fragmentos del shard.
+
+        Returns:
+            QdrantVectorStore: Colección reconstruida.
+        """
+        store = self.build_shard(name, items)
+        # Las búsquedas en curso terminan sobre la versión anterior antes de borrarla.
+        with store_lock(self).write():
+            with self.lock:
+                previous = self.shards.get(name)
+                self.shards[name] = store
+                self.sizes[name] = len(items)
+            if previous is not None:
+                self._close(previous)
+        logging.info(f"Shard '{name}' reconstruido con {len(items)} fragmentos.")
+        return store
+
+    def remove_shard(self, name: str) -> None:
+        """
+        Quita un shard y borra su colección.
+
+        Args:
+            name (str): Nombre del shard.
+        """
+        with store_lock(self).write():
+            with self.lock:
+                previous = self.shards.pop(name, None)
+                self.sizes.pop(name, None)
+            if previous is not None:
+                self._close(previous)
+        logging.info(f"Shard '{name}' eliminado.")
+
+    def replace_volumes(self, shards: Dict[str, List]) -> None:
+        """
+        Indexa volúmenes nuevos o reemplazados: reconstruye el shard de cada parte y quita las partes que el
+        volumen ya no tiene.
+
+        Args:
+            shards (Dict[str, List]): Fragmentos de cada shard de los volúmenes, ver `plan_shards`.
+        """
+        volumes = {name.rsplit("-", 1)[0] for name in shards}
+        with self.lock:
+            stale = [name for name in self.shards if name.rsplit("-", 1)[0] in volumes and name not in shards]
+        for name in stale:
+            self.remove_shard(name)
+        for name, items in shards.items():
+            self.rebuild_shard(name, items)
+
+    def _close(self, store: QdrantVectorStore) -> None:
+        store.client.delete_collection(store.collection_name)
+        store.client.close()
+        if self.release_shard:
+            self.release_shard(store)
+
+    def _register(self, name: str, store: QdrantVectorStore, size: int) -> None:
+        with self.lock:
+            self.shards[name] = store
+            self.sizes[name] = size
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """
+        Agrega documentos nuevos al shard de su volumen ("source" de la metadata), así `replace_volumes` puede
+        reconstruir el volumen completo; si el volumen no tiene shards se crea uno.
+
+        Args:
+            documents (List[Document]): Documentos a agregar.
+            ids (Optional[List[str]]): Ids de los puntos.
+
+        Returns:
+            List[str]: Ids agregados.
+        """
+        ids = ids or [None] * len(documents)
+        volumes: Dict[str, List[Tuple[Document, Any]]] = dict()
+        for document, point_id in zip(documents, ids):
+            volumes.setdefault(shard_name(chunk_source(document) or "corpus", 0), []).append((document, point_id))
+
+        added = list()
+        for first_part, items in volumes.items():
+            volume = first_part.rsplit("-", 1)[0]
+            volume_documents = [document for document, _ in items]
+            with self.lock:
+                parts = [name for name in self.shards if name.rsplit("-", 1)[0] == volume]
+                name = min(parts, key=self.sizes.get) if parts else None
+                if name is not None:
+                    self.sizes[name] += len(items)
+                    store = self.shards[name]
+            if name is None:
+                # Llamado con el cerrojo de escritura del almacén tomado: se registra sin `rebuild_shard`.
+                self._register(first_part, self.build_shard(first_part, volume_documents), len(items))
+                added.extend(point_id for _, point_id in items)
+                continue
+            point_ids = [point_id for _, point_id in items]
+            added.extend(store.add_documents(documents=volume_documents,
+                                             ids=point_ids if all(point_ids) else None, **kwargs))
+        return added
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Busca la consulta en todos los shards en paralelo y devuelve el top-k global.
+
+        Args:
+            query (str): Consulta.
+            k (int): Número de documentos a devolver.
+
+        Los puntajes propios de cada shard no son comparables entre shards (las colecciones híbridas devuelven
+        puntajes de fusión RRF por rango), por lo que los candidatos de cada shard se vuelven a puntuar con la
+        similitud coseno entre su vector denso y el de la consulta antes de mezclarlos.
+
+        Args:
+            query (str): Consulta.
+            k (int): Número de documentos a devolver.
+
+        Returns:
+            List[Tuple[Document, float]]: Documentos y similitud coseno densa, de mayor a menor; cada documento
+                lleva su shard en `metadata["shard"]`.
+        """
+        with self.lock:
+            shards = list(self.shards.items())
+
+        def search(item: Tuple[str, QdrantVectorStore]) -> List[Tuple[Document, float]]:
+            name, store = item
+            documents = [document for document, _ in store.similarity_search_with_score(query, k=k)]
+            if not documents:
+                return []
+            records = store.client.retrieve(collection_name=store.collection_name, with_vectors=True,
+                                            ids=[document.metadata["_id"] for document in documents])
+            vectors = {
+                str(record.id): record.vector[store.vector_name] if isinstance(record.vector, dict) else record.vector
+                for record in records
+            }
+            query_vector = normalize_rows(store.embeddings.embed_query(query))
+            scores = normalize_rows([vectors[str(document.metadata["_id"])] for document in documents]) @ query_vector
+            for document in documents:
+                document.metadata["shard"] = name
+            return [(document, float(score)) for document, score in zip(documents, scores)]
+
+        # Cada búsqueda corre con una copia del contexto para que la telemetría de la consulta siga activa.
+        futures = [self.executor.submit(contextvars.copy_context().run, search, item) for item in shards]
+        results = [result for future in futures for result in future.result()]
+        return heapq.nlargest(k, results, key=lambda result: result[1])
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    def as_retriever(self, search_kwargs: Optional[dict] = None) -> "ShardedRetriever":
+        return ShardedRetriever(store=self, k=(search_kwargs or {}).get("k", 4))
+
+    def shard_report(self) -> Dict[str, int]:
+        """Devuelve el número de fragmentos indexados en cada shard."""
+        with self.lock:
+            return dict(self.sizes)
+
+
+class ShardedRetriever(BaseRetriever):
+    """
+    Retriever que consulta un `ShardedVectorStore` en abanico.
+    """
+
+    store: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.store.similarity_search(query, self.k)
+
+
+def create_sharded_store(rag_type: str, model_name: str, shards: Dict[str, List], backend: str = "torch",
+    num_workers: int = 1, batch_size: Optional[int] = None, max_workers: int = 2,
+    on_shard_ready: Optional[Callable[[ShardedVectorStore, str, int], None]] = None,
+    num_threads: Optional[int] = None) -> ShardedVectorStore:
+    """
+    Crea un almacén con una colección Qdrant por shard, usando el mismo tipo de colección que el pipeline.
+
+    Args:
+        rag_type (str): "super" (colecciones híbridas en memoria) o "naive" (colecciones densas en disco,
+            una carpeta por shard).
+        model_name (str): Nombre del modelo de embeddings.
+        shards (Dict[str, List]): Fragmentos de cada shard, ver `plan_shards`.
+        backend (str): Backend de inferencia de embeddings, ver `get_embedding_model`.
+        num_workers (int): Procesos para embeber los chunks, ver `get_embedding_model`.
+        batch_size (Optional[int]): Fragmentos por lote de indexación dentro de cada shard.
+        max_workers (int): Shards que se construyen y consultan en paralelo.
+        on_shard_ready (Optional[Callable[[ShardedVectorStore, str, int], None]]): Ver `ShardedVectorStore.build`.
+        num_threads (Optional[int]): Hilos de inferencia del backend "onnx", ver `get_embedding_model`.
+
+    Returns:
+        ShardedVectorStore: Almacén con todos los shards construidos.
+
+    Raises:
+        ValueError: Si `rag_type` no es "super" o "naive".
+    """
+    generations = itertools.count()
+    storage_paths: Dict[int, str] = dict()
+    embeddings = SharedQueryEmbeddings(TimedEmbeddings(get_embedding_model(model_name, backend, num_threads, num_workers)))
+
+    if rag_type == "super":
+        def build_shard(name: str, items: List) -> QdrantVectorStore:
+            return create_qdrant_store(model_name, items, backend, num_workers, batch_size,
+                                       collection_name=f"my_documents_{name}", embeddings=embeddings)
+    elif rag_type == "naive":
+        def build_shard(name: str, items: List) -> QdrantVectorStore:
+            # Cada construcción usa su propia carpeta: el almacenamiento local de Qdrant admite un solo cliente.
+            # La carpeta se vacía antes: al reiniciar el proceso el contador vuelve a 0 y reabriría la anterior.
+            storage_path = f"/tmp/langchain_qdrant10_shards/{name}-{next(generations)}"
+            shutil.rmtree(storage_path, ignore_errors=True)
+            store = create_qdrant_store_naive(model_name, items, backend, num_workers, batch_size,
+                                              collection_name=f"naive_documents10_{name}", embeddings=embeddings,
+                                              storage_path=storage_path)
+            storage_paths[id(store)] = storage_path
+            return store
+    else:
+        raise ValueError("El valor de 'rag' en la configuración no es válido. Debe ser 'super' o 'naive'.")
+
+    def release_shard(store: QdrantVectorStore) -> None:
+        # Borra la carpeta de un shard "naive" reemplazado; los shards "super" viven en memoria.
+        storage_path = storage_paths.pop(id(store), None)
+        if storage_path:
+            shutil.rmtree(storage_path, ignore_errors=True)
+
+    return ShardedVectorStore(build_shard, max_workers, release_shard).build(shards, on_shard_ready)
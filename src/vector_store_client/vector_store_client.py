@@ -1,76 +1,265 @@
-from typing import List, Dict  
+import threading
+import weakref
+from collections.abc import Sequence
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple  
 from uuid import uuid4 
+import numpy as np
+from pydantic import ConfigDict
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document 
-from langchain_huggingface import HuggingFaceEmbeddings  
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
 from langchain_qdrant import FastEmbedSparse, RetrievalMode, QdrantVectorStore  
 from qdrant_client.http.models import Distance, VectorParams 
 from qdrant_client import QdrantClient 
-from sentence_transformers import SentenceTransformer
+from src.embedding.embedding import get_embedding_model
+from src.telemetry.telemetry import TimedEmbeddings
 
 
-def create_qdrant_store(model_name: str, chunks: List[Dict[str, str]]) -> QdrantVectorStore:
+class ReadWriteLock:
     """
-    Crea y devuelve un QdrantVectorStore a partir de un modelo de embeddings y una lista de chunks de texto.
+    Cerrojo de lectores/escritor con preferencia de escritura: muchas búsquedas simultáneas o una sola escritura.
+
+    El modo local de Qdrant (":memory:" o carpeta) no garantiza lecturas consistentes mientras otro hilo escribe,
+    por lo que las búsquedas de las sesiones y las escrituras (indexación por lotes, ingesta, borrados) sobre un
+    mismo almacén se coordinan con este cerrojo.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Sección de lectura; espera mientras haya un escritor activo o en espera."""
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Sección de escritura exclusiva."""
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+_STORE_LOCKS: "weakref.WeakKeyDictionary[Any, ReadWriteLock]" = weakref.WeakKeyDictionary()
+_STORE_LOCKS_GUARD = threading.Lock()
+
+
+def store_lock(vector_store: Any) -> ReadWriteLock:
+    """
+    Devuelve el cerrojo de lectores/escritor asociado a un almacén de vectores, creándolo la primera vez.
 
     Args:
-        model_name (str): Nombre del modelo de embeddings.
-        chunks (List[Dict[str, str]]): Lista de fragmentos de texto con metadatos.
+        vector_store (Any): `QdrantVectorStore` o `ShardedVectorStore`.
 
     Returns:
-        QdrantVectorStore: Objeto de almacenamiento Qdrant.
+        ReadWriteLock: Cerrojo compartido por todos los lectores y escritores de ese almacén.
     """
-    open_source_embeddings = HuggingFaceEmbeddings(model_name=model_name)
-    sparse_embeddings = FastEmbedSparse(model_name="Qdrant/bm25")
+    with _STORE_LOCKS_GUARD:
+        if vector_store not in _STORE_LOCKS:
+            _STORE_LOCKS[vector_store] = ReadWriteLock()
+        return _STORE_LOCKS[vector_store]
+
+
+class LockedRetriever(BaseRetriever):
+    """
+    Envuelve un retriever para que cada búsqueda tome el cerrojo de lectura de su almacén (ver `store_lock`).
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    retriever: BaseRetriever
+    lock: ReadWriteLock
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with self.lock.read():
+            return self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+
+
+def assign_positions(chunks: List, start: int = 0) -> List:
+    """
+    Numera los fragmentos en el orden del corpus; la posición se guarda en la metadata de cada punto y es la que
+    usa `LazyChunkView` para devolver los fragmentos en orden. Los fragmentos que ya tienen posición la conservan.
 
-    documents_for_qdrant = [
+    Args:
+        chunks (List): Fragmentos "super" (diccionarios) o "naive" (`Document`).
+        start (int): Posición del primer fragmento.
+
+    Returns:
+        List: Los mismos fragmentos.
+    """
+    for position, chunk in enumerate(chunks, start):
+        (chunk if isinstance(chunk, dict) else chunk.metadata).setdefault("position", position)
+    return chunks
+
+def chunks_to_documents(chunks: List[Dict[str, str]]) -> List[Document]:
+    """
+    Convierte los chunks con metadatos del RAG "super" en documentos de LangChain; los `Document` ya convertidos
+    (por ejemplo, los que un `ShardedVectorStore` usa para crear el shard de un volumen nuevo) se devuelven tal cual.
+
+    Args:
+        chunks (List[Dict[str, str]]): Lista de fragmentos de texto con metadatos.
+
+    Returns:
+        List[Document]: Documentos con el texto y los títulos como metadata; si el chunk trae "position" (ver
+        `assign_positions`), "chunk_id" y "source" (segmentación incremental) también se guardan en la metadata.
+    """
+    return [
         Document(
             page_content=chunk["chunk_text"],
             metadata={
                 "title": chunk["metadata"].get("title", ""),
                 "subtitle": chunk["metadata"].get("subtitle", ""),
-                "sub_subtitle": chunk["metadata"].get("sub_subtitle", "")
+                "sub_subtitle": chunk["metadata"].get("sub_subtitle", ""),
+                **{key: chunk[key] for key in ("position", "chunk_id", "source") if key in chunk},
             }
-        )
+        ) if isinstance(chunk, dict) else chunk
         for chunk in chunks
     ]
 
+def document_ids(documents: List[Document]) -> List[str]:
+    """
+    Ids de punto para indexar documentos: el "chunk_id" estable de la metadata si existe o uno aleatorio.
+
+    Args:
+        documents (List[Document]): Documentos a indexar.
+
+    Returns:
+        List[str]: Un id por documento.
+    """
+    return [doc.metadata.get("chunk_id") or str(uuid4()) for doc in documents]
+
+def add_documents_in_batches(qdrant: QdrantVectorStore, documents: List[Document], batch_size: int,
+    on_batch: Optional[Callable[[QdrantVectorStore, int], None]] = None, indexed: int = 0) -> QdrantVectorStore:
+    """
+    Agrega documentos a un QdrantVectorStore por lotes, avisando después de cada lote.
+
+    Cada lote se escribe con el cerrojo de escritura del almacén, por lo que las búsquedas en curso (versiones
+    parciales o pipelines ya publicados) solo ven lotes completos.
+
+    Los documentos con "chunk_id" en la metadata usan ese id estable, por lo que volver a agregarlos reemplaza el
+    punto existente; el resto recibe un id aleatorio.
+
+    Args:
+        qdrant (QdrantVectorStore): Almacén de vectores.
+        documents (List[Document]): Documentos a agregar.
+        batch_size (int): Documentos por lote.
+        on_batch (Optional[Callable[[QdrantVectorStore, int], None]]): Se llama con el almacén y el total de
+            documentos indexados al terminar cada lote; la búsqueda ya ve esos documentos.
+        indexed (int): Documentos ya indexados antes de esta llamada.
+
+    Returns:
+        QdrantVectorStore: El mismo almacén de vectores.
+    """
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        with store_lock(qdrant).write():
+            qdrant.add_documents(documents=batch, ids=document_ids(batch))
+        indexed += len(batch)
+        if on_batch:
+            on_batch(qdrant, indexed)
+    return qdrant
+
+def create_qdrant_store(model_name: str, chunks: List[Dict[str, str]], backend: str = "torch",
+    num_workers: int = 1, batch_size: Optional[int] = None,
+    on_batch: Optional[Callable[[QdrantVectorStore, int], None]] = None, collection_name: str = "my_documents",
+    embeddings: Optional[Embeddings] = None, num_threads: Optional[int] = None) -> QdrantVectorStore:
+    """
+    Crea y devuelve un QdrantVectorStore a partir de un modelo de embeddings y una lista de chunks de texto.
+
+    Args:
+        model_name (str): Nombre del modelo de embeddings.
+        chunks (List[Dict[str, str]]): Lista de fragmentos de texto con metadatos.
+        backend (str): Backend de inferencia de embeddings, ver `get_embedding_model`.
+        num_workers (int): Procesos para embeber los chunks, ver `get_embedding_model`.
+        batch_size (Optional[int]): Si se indica, los chunks se indexan por lotes de este tamaño.
+        on_batch (Optional[Callable[[QdrantVectorStore, int], None]]): Ver `add_documents_in_batches`.
+        collection_name (str): Nombre de la colección.
+        embeddings (Optional[Embeddings]): Modelo de embeddings ya creado; por defecto se obtiene de `model_name`.
+        num_threads (Optional[int]): Hilos de inferencia del backend "onnx", ver `get_embedding_model`.
+
+    Returns:
+        QdrantVectorStore: Objeto de almacenamiento Qdrant.
+    """
+    open_source_embeddings = embeddings or TimedEmbeddings(get_embedding_model(model_name, backend, num_threads, num_workers))
+    sparse_embeddings = FastEmbedSparse(model_name="Qdrant/bm25")
+
+    documents_for_qdrant = chunks_to_documents(assign_positions(chunks))
+    batch_size = batch_size or len(documents_for_qdrant)
+
     qdrant = QdrantVectorStore.from_documents(
-        documents_for_qdrant,
+        documents_for_qdrant[:batch_size],
+        ids=document_ids(documents_for_qdrant[:batch_size]),
         embedding=open_source_embeddings,
         sparse_embedding=sparse_embeddings,
         location=":memory:",  
-        collection_name="my_documents",
+        collection_name=collection_name,
         retrieval_mode=RetrievalMode.HYBRID,
     )
+    if on_batch:
+        on_batch(qdrant, min(batch_size, len(documents_for_qdrant)))
 
-    return qdrant
+    return add_documents_in_batches(qdrant, documents_for_qdrant[batch_size:], batch_size, on_batch, batch_size)
 
-def create_qdrant_store_naive(model_name: str, chunks: List[str]) -> QdrantVectorStore:
+def create_qdrant_store_naive(model_name: str, chunks: List[str], backend: str = "torch",
+    num_workers: int = 1, batch_size: Optional[int] = None,
+    on_batch: Optional[Callable[[QdrantVectorStore, int], None]] = None, collection_name: str = "naive_documents10",
+    embeddings: Optional[Embeddings] = None, storage_path: str = "/tmp/langchain_qdrant10",
+    num_threads: Optional[int] = None) -> QdrantVectorStore:
     """
     Crea y devuelve un QdrantVectorStore a partir de un modelo de embeddings y una lista de chunks de texto de manera sencilla.
 
     Args:
         model_name (str): Nombre del modelo de embeddings.
         chunks (List[str]): Lista de fragmentos de texto.
+        backend (str): Backend de inferencia de embeddings, ver `get_embedding_model`.
+        num_workers (int): Procesos para embeber los chunks, ver `get_embedding_model`.
+        batch_size (Optional[int]): Si se indica, los chunks se indexan por lotes de este tamaño.
+        on_batch (Optional[Callable[[QdrantVectorStore, int], None]]): Ver `add_documents_in_batches`.
+        collection_name (str): Nombre de la colección.
+        embeddings (Optional[Embeddings]): Modelo de embeddings ya creado; por defecto se obtiene de `model_name`.
+        storage_path (str): Carpeta del almacenamiento local de Qdrant; la colección se recrea vacía.
+        num_threads (Optional[int]): Hilos de inferencia del backend "onnx", ver `get_embedding_model`.
 
     Returns:
         QdrantVectorStore: Objeto de almacenamiento Qdrant.
     """
-    open_source_embeddings = HuggingFaceEmbeddings(model_name=model_name)
-    model = SentenceTransformer(model_name)
-    embedding_dimension = model.get_sentence_embedding_dimension()
-    storage_path =  f"/tmp/langchain_qdrant10"
-    name = "naive_documents10"
+    open_source_embeddings = embeddings or TimedEmbeddings(get_embedding_model(model_name, backend, num_threads, num_workers))
+    embedding_dimension = len(open_source_embeddings.embed_query("dimension"))
+    name = collection_name
     client = QdrantClient(path=storage_path)
 
-    try:
-        client.get_collection(name)
-    except ValueError:
-        client.create_collection(
-            collection_name=name,
-            vectors_config=VectorParams(size=embedding_dimension, 
-                                        distance=Distance.COSINE),
-        )
+    # La colección se recrea en cada construcción: los puntos de ejecuciones anteriores quedarían duplicados.
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=embedding_dimension, 
+                                    distance=Distance.COSINE),
+    )
 
     qdrant = QdrantVectorStore(
         client=client,
@@ -78,7 +267,129 @@ def create_qdrant_store_naive(model_name: str, chunks: List[str]) -> QdrantVecto
         embedding=open_source_embeddings,
     )
 
-    uuids = [str(uuid4()) for _ in range(len(chunks))]
-    qdrant.add_documents(documents=chunks, ids=uuids)
+    return add_documents_in_batches(qdrant, assign_positions(chunks), batch_size or max(len(chunks), 1), on_batch)
+
+def fetch_store_points(qdrant: QdrantVectorStore, batch_size: int = 1024) -> Tuple[List[str], List[Document], np.ndarray]:
+    """
+    Recorre la colección de un QdrantVectorStore y devuelve sus documentos junto con los vectores densos.
+
+    Args:
+        qdrant (QdrantVectorStore): Almacén de vectores a recorrer.
+        batch_size (int): Número de puntos por página de `scroll`.
+
+    Returns:
+        Tuple[List[str], List[Document], np.ndarray]: Ids de los puntos, documentos y matriz (n, d) de vectores densos.
+    """
+    records = list()
+    offset = None
+    while True:
+        page, offset = qdrant.client.scroll(
+            collection_name=qdrant.collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        records.extend(page)
+        if offset is None:
+            break
+
+    ids = [str(record.id) for record in records]
+    documents = [
+        Document(
+            page_content=record.payload.get(qdrant.content_payload_key, ""),
+            metadata=record.payload.get(qdrant.metadata_payload_key) or {},
+        )
+        for record in records
+    ]
+    vectors = np.asarray(
+        [record.vector[qdrant.vector_name] if isinstance(record.vector, dict) else record.vector for record in records],
+        dtype=np.float32,
+    )
+    return ids, documents, vectors
+
+class LazyChunkView(Sequence):
+    """
+    Vista de solo lectura de los fragmentos indexados que los lee desde Qdrant bajo demanda, en vez de mantener
+    en memoria una copia de los textos que ya guarda el almacén.
+
+    Solo se conservan los ids de los puntos, ordenados por la "position" de su metadata (ver `assign_positions`);
+    el texto y la metadata se piden al acceder a los fragmentos, con una sola consulta por almacén.
+    """
+
+    def __init__(self, vector_store: object, rag_type: str, page_size: int = 256):
+        """
+        Args:
+            vector_store (object): `QdrantVectorStore` o almacén con shards (atributo `shards`).
+            rag_type (str): "super" (devuelve diccionarios con "chunk_text" y "metadata") o "naive" (`Document`).
+            page_size (int): Puntos por página al recorrer el almacén.
+        """
+        self.vector_store = vector_store
+        self.rag_type = rag_type
+        self.page_size = page_size
+        self._ids: Optional[List[Tuple[QdrantVectorStore, Any]]] = None
+
+    def _stores(self) -> List[QdrantVectorStore]:
+        shards = getattr(self.vector_store, "shards", None)
+        return list(shards.values()) if shards is not None else [self.vector_store]
+
+    def _point_ids(self) -> List[Tuple[QdrantVectorStore, Any]]:
+        if self._ids is None:
+            located = list()
+            with store_lock(self.vector_store).read():
+                for store in self._stores():
+                    position_key = f"{store.metadata_payload_key}.position"
+                    offset = None
+                    while True:
+                        page, offset = store.client.scroll(collection_name=store.collection_name, limit=self.page_size,
+                                                           offset=offset, with_payload=[position_key], with_vectors=False)
+                        for record in page:
+                            metadata = record.payload.get(store.metadata_payload_key) or {}
+                            located.append((metadata.get("position", float("inf")), store, record.id))
+                        if offset is None:
+                            break
+            located.sort(key=lambda item: item[0])
+            self._ids = [(store, point_id) for _, store, point_id in located]
+        return self._ids
+
+    def refresh(self) -> None:
+        """Descarta los ids en caché para ver los fragmentos agregados después de crear la vista."""
+        self._ids = None
+
+    def _to_chunk(self, store: QdrantVectorStore, payload: dict):
+        text = payload.get(store.content_payload_key, "")
+        metadata = payload.get(store.metadata_payload_key) or {}
+        if self.rag_type == "super":
+            return {"chunk_text": text, "metadata": metadata}
+        return Document(page_content=text, metadata=metadata)
+
+    def _fetch(self, positions: Sequence[int]) -> List:
+        located = [self._point_ids()[position] for position in positions]
+        by_store: Dict[int, Tuple[QdrantVectorStore, List]] = dict()
+        for store, point_id in located:
+            by_store.setdefault(id(store), (store, list()))[1].append(point_id)
+
+        payloads = dict()
+        with store_lock(self.vector_store).read():
+            for store, ids in by_store.values():
+                for record in store.client.retrieve(collection_name=store.collection_name, ids=ids, with_payload=True):
+                    payloads[(id(store), str(record.id))] = record.payload
+        # Un punto borrado después de leer los ids (ver `refresh`) simplemente se omite.
+        return [self._to_chunk(store, payloads[(id(store), str(point_id))]) for store, point_id in located
+                if (id(store), str(point_id)) in payloads]
+
+    def __len__(self) -> int:
+        return len(self._point_ids())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._fetch(range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._fetch([index])[0]
 
-    return qdrant
\ No newline at end of file
+    def __iter__(self):
+        for start in range(0, len(self), self.page_size):
+            yield from self._fetch(range(start, min(start + self.page_size, len(self))))
@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    """Embeddings densos deterministas y dispersos por hash de palabras, para no descargar modelos."""
+    pytest.importorskip("langchain_qdrant")
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_qdrant import SparseEmbeddings, SparseVector
+
+    import src.chunking.incremental as incremental
+    import src.vector_store_client.vector_store_client as vector_store_client
+
+    class HashingSparseEmbeddings(SparseEmbeddings):
+        def _embed(self, text):
+            counts = dict()
+            for word in text.split():
+                index = hash(word) % 1024
+                counts[index] = counts.get(index, 0.0) + 1.0
+            return SparseVector(indices=list(counts), values=list(counts.values()))
+
+        def embed_documents(self, texts):
+            return [self._embed(text) for text in texts]
+
+        def embed_query(self, text):
+            return self._embed(text)
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(incremental, "get_embedding_model", lambda *args, **kwargs: embeddings)
+    monkeypatch.setattr(vector_store_client, "FastEmbedSparse", lambda model_name: HashingSparseEmbeddings())
+    return embeddings
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from src.embedding.embedding import bounded_segments
+
+
+def test_bounded_segments_handles_long_runs_without_recursion():
+    count = 3000
+    token_counts = np.full(count, 10)
+    distances = np.linspace(0.0, 1.0, count - 1)
+
+    segments = bounded_segments(token_counts, distances, [], min_tokens=0, max_tokens=10)
+
+    assert segments == [(i, i + 1) for i in range(count)]
+
+
+def test_bounded_segments_cuts_at_the_largest_distance_and_merges_small_pieces():
+    token_counts = np.array([10, 10, 10, 10])
+    distances = [0.1, 0.9, 0.2]
+
+    assert bounded_segments(token_counts, distances, [], min_tokens=0, max_tokens=20) == [(0, 2), (2, 4)]
+    assert bounded_segments(token_counts, distances, [1, 2, 3], min_tokens=15, max_tokens=20) == [(0, 2), (2, 4)]
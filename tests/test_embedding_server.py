@@ -0,0 +1,53 @@
+import socket
+import socketserver
+import threading
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.embedding.embedding_server import (DynamicBatcher, EmbeddingServiceClient, _EmbeddingRequestHandler,
+                                            _HEADER, _receive_header, _send_message)
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    """Servidor de embeddings con un modelo falso, sin cargar el modelo real."""
+    path = str(tmp_path / "embeddings.sock")
+    server = socketserver.ThreadingUnixStreamServer(path, _EmbeddingRequestHandler)
+    server.daemon_threads = True
+    server.model_name = "fake"
+    server.batcher = DynamicBatcher(DeterministicFakeEmbedding(size=4))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_malformed_requests_get_an_error_and_keep_the_connection(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(5)
+        connection.connect(socket_path)
+
+        connection.sendall(_HEADER.pack(8) + b"{no json")
+        assert "mal formada" in _receive_header(connection)["error"]
+        _send_message(connection, {"model_name": "fake", "op": "embed"})
+        assert "texts" in _receive_header(connection)["error"]
+        _send_message(connection, {"model_name": "fake", "op": "embed", "texts": "uno"})
+        assert "texts" in _receive_header(connection)["error"]
+
+        _send_message(connection, {"model_name": "fake", "op": "embed", "texts": ["uno", "dos"]})
+        assert _receive_header(connection)["shape"] == [2, 4]
+
+
+def test_client_closes_a_broken_connection_before_reconnecting(socket_path):
+    client = EmbeddingServiceClient("fake", socket_path, timeout=5)
+    assert len(client.embed_query("uno")) == 4
+    connection = client.local.connection
+    connection.shutdown(socket.SHUT_RDWR)
+
+    with pytest.raises(OSError):
+        client.embed_query("dos")
+
+    assert connection.fileno() == -1
+    assert len(client.embed_query("tres")) == 4
+    assert client.server_stats()["texts"] == 2
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_qdrant")
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.retrievers.hierarchical import HierarchicalRetriever
+
+
+def test_probe_is_clamped_to_the_number_of_sections():
+    documents = [Document(page_content=f"chunk {i}", metadata={"title": f"PART {i % 2}"}) for i in range(6)]
+    vectors = np.random.default_rng(0).normal(size=(6, 8))
+    query = vectors[3] / np.linalg.norm(vectors[3])
+
+    for sections_probe in (0, 1, 50):
+        retriever = HierarchicalRetriever.from_vectors(DeterministicFakeEmbedding(size=8), documents, vectors, k=2,
+                                                       sections_probe=sections_probe)
+        indices, _ = retriever.search(query)
+        assert len(indices) == 2
+    assert retriever.documents[indices[0]].page_content == "chunk 3"
+
+
+def test_empty_store_returns_no_documents():
+    retriever = HierarchicalRetriever.from_vectors(DeterministicFakeEmbedding(size=8), [], np.empty((0,)), k=2)
+
+    assert retriever.invoke("query") == []
+    indices, scores = retriever.search(np.ones(8, dtype=np.float32))
+    assert len(indices) == len(scores) == 0
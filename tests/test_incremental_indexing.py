@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("langchain_qdrant")
+
+import src.chunking.incremental as incremental
+from src.vector_store_client.vector_store_client import (add_documents_in_batches, chunks_to_documents,
+                                                          create_qdrant_store, LazyChunkView)
+
+
+CONFIG = {"model_name": "fake", "buffer_size": 1, "threshold": 0.3, "max_previous_chunks": 10}
+
+
+def volume(prefix, sentences):
+    return [" ".join(f"{prefix} sentence number {i} about topic {i % 3}." for i in range(sentences))]
+
+
+def point_ids(store):
+    points, _ = store.client.scroll(store.collection_name, limit=10_000, with_payload=False)
+    return {str(point.id) for point in points}
+
+
+def test_replacing_first_batch_document_replaces_its_points(fake_models):
+    chunker = incremental.IncrementalChunker(CONFIG)
+    chunks = chunker.sync({"a.pdf": volume("alpha", 6), "b.pdf": volume("beta", 6)})["chunks"]
+    store = create_qdrant_store("fake", chunks, batch_size=2, embeddings=fake_models,
+                                collection_name="test_incremental")
+    assert point_ids(store) == {chunk["chunk_id"] for chunk in chunks}
+
+    changes = chunker.update({"a.pdf": volume("gamma", 4)})
+    assert changes["deleted"]
+    store.delete(ids=changes["deleted"])
+    add_documents_in_batches(store, chunks_to_documents(changes["upserted"]), 2)
+
+    expected = {chunk["chunk_id"] for chunk in changes["chunks"]}
+    assert point_ids(store) == expected
+    assert store.client.count(store.collection_name).count == len(changes["chunks"])
+
+
+def test_lazy_view_keeps_document_order_after_replacing_a_document(fake_models):
+    chunker = incremental.IncrementalChunker(CONFIG)
+    chunker.sync({"a.pdf": volume("alpha", 6), "b.pdf": volume("beta", 6), "c.pdf": volume("delta", 6)})
+    store = create_qdrant_store("fake", chunker.chunks, batch_size=3, embeddings=fake_models,
+                                collection_name="test_incremental_order")
+
+    changes = chunker.update({"b.pdf": volume("gamma", 9)})
+    store.delete(ids=changes["deleted"])
+    add_documents_in_batches(store, chunks_to_documents(changes["upserted"]), 3)
+
+    view = LazyChunkView(store, "super")
+    assert [chunk["chunk_text"] for chunk in view] == [chunk["chunk_text"] for chunk in changes["chunks"]]
+
+
+def test_cached_documents_are_resplit_with_the_current_threshold(fake_models, tmp_path):
+    pages = {"a.pdf": volume("alpha", 12)}
+    cached = incremental.IncrementalChunker({**CONFIG, "threshold": 0.0}, str(tmp_path)).sync(pages)["chunks"]
+    assert len(cached) > 1
+
+    restored = incremental.IncrementalChunker({**CONFIG, "threshold": 5.0}, str(tmp_path)).sync(pages)["chunks"]
+    fresh = incremental.IncrementalChunker({**CONFIG, "threshold": 5.0}).sync(pages)["chunks"]
+    assert [chunk["chunk_text"] for chunk in restored] == [chunk["chunk_text"] for chunk in fresh]
+    assert len(restored) == 1
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from src.run_store.run_store import load_run_results, save_run
+
+
+def test_results_are_saved_at_their_question_positions(tmp_path):
+    db_path = str(tmp_path / "runs.sqlite")
+    results = pd.DataFrame({
+        "position": [4, 0, 2],
+        "user_input": ["q4", "q0", "q2"],
+        "response": ["a4", "a0", "a2"],
+        "faithfulness": [0.4, 0.0, 0.2],
+    })
+
+    run_id = save_run(db_path, results, {"rag": "super"})
+
+    saved = load_run_results(db_path, [run_id]).set_index("position")
+    assert saved.loc[[0, 2, 4], "question"].tolist() == ["q0", "q2", "q4"]
+    assert saved.loc[4, "faithfulness"] == 0.4
+
+
+def test_chunk_snapshot_is_reused_until_content_or_config_changes(tmp_path):
+    from src.chunking.chunking import show_chunks_streamlit
+    from src.run_store.run_store import content_hash, list_chunk_snapshots
+
+    db_path = str(tmp_path / "runs.sqlite")
+    config = {"rag": "super", "run_store_path": db_path, "threshold": 0.5}
+    chunks = [{"chunk_text": "uno", "metadata": {}}, {"chunk_text": "dos", "metadata": {}}]
+
+    first = show_chunks_streamlit(chunks, config, content_hash(["uno", "dos"]))
+    assert show_chunks_streamlit(chunks, config, content_hash(["uno", "dos"])) == first
+    assert show_chunks_streamlit(chunks[:1], config, content_hash(["uno"])) != first
+    assert show_chunks_streamlit(chunks, {**config, "threshold": 0.6}, content_hash(["uno", "dos"])) != first
+    assert len(list_chunk_snapshots(db_path)) == 3
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from src.chunking.segmenter import segment_regulatory_text, split_pages_into_sentences, split_sentences
+
+
+@pytest.mark.parametrize("text", [
+    "Round to the nearest 0.5. Values below that are declared as zero.",
+    "The limit may not exceed 2.5. Exceptions are listed in paragraph (c).",
+    "Declare it when the food contains less than 5 g. Declare it as zero otherwise.",
+    "Each serving contains 5 mg. The next nutrient is listed below.",
+    "The container holds 12 fl oz. The label must state it.",
+    "See the definition in § 101.9. The manufacturer shall comply.",
+])
+def test_splits_after_units_and_decimals(text):
+    assert len(segment_regulatory_text(text)) == 2
+
+
+@pytest.mark.parametrize("text", [
+    "As defined in 21 U.S.C. 321(s) the term applies.",
+    "Consistent with Pub. L. 111-353, 124 Stat. 3885 the rule applies.",
+    "Use a tool, e.g. a scale, to weigh 5 g. per serving.",
+    "The rule was published in 45 Fed. Reg. 1234 and applies to the U.S. Food and Drug Administration.",
+    "Subject to the requirements of Sec. 10 of this chapter and No. 5 of the list.",
+    "Contains approx. three servings of 5 mg. per day.",
+])
+def test_keeps_abbreviations_and_citations(text):
+    assert segment_regulatory_text(text) == [text]
+
+
+def test_numbered_paragraph_labels_are_not_sentences():
+    sentences = segment_regulatory_text("(a). The owner shall keep records. 1. Scope of the rule applies here.")
+    assert sentences == ["(a). The owner shall keep records.", "1. Scope of the rule applies here."]
+
+
+def test_open_sentence_is_stitched_across_pages():
+    sentences = split_pages_into_sentences(["The owner shall keep", "records for 2 years. Each packer shall comply."])
+    assert [s["sentence"] for s in sentences] == ["The owner shall keep records for 2 years.", "Each packer shall comply."]
+    assert [s["index"] for s in sentences] == [0, 1]
+
+
+def test_split_sentences_rejects_unknown_splitter():
+    with pytest.raises(ValueError):
+        split_sentences(["Text."], {"sentence_splitter": "nltk"})
+
+
+def test_long_runs_of_abbreviations_are_segmented_in_linear_time():
+    text = " ".join(["See Sec. 5 U.S.C. e.g. approx."] * 20000) + " Done. Next sentence."
+
+    start = time.perf_counter()
+    sentences = segment_regulatory_text(text)
+
+    assert time.perf_counter() - start < 5
+    assert sentences[-1] == "Next sentence."
@@ -0,0 +1,107 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_qdrant")
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+import src.vector_store_client.sharded_store as sharded_store
+from src.vector_store_client.sharded_store import SharedQueryEmbeddings, chunk_source, create_sharded_store, plan_shards
+
+
+@pytest.fixture
+def sharded_models(monkeypatch, fake_models):
+    monkeypatch.setattr(sharded_store, "get_embedding_model", lambda *args, **kwargs: fake_models)
+    return fake_models
+
+
+def super_chunks(source, count):
+    return [{"chunk_text": f"{source} chunk {i}", "metadata": {}, "source": source} for i in range(count)]
+
+
+def store_size(store):
+    return sum(shard.client.count(shard.collection_name).count for shard in store.shards.values())
+
+
+def test_replace_volumes_rebuilds_a_volume_and_drops_its_stale_parts(sharded_models):
+    chunks = super_chunks("a.pdf", 6) + super_chunks("b.pdf", 3)
+    store = create_sharded_store("super", "fake", plan_shards(chunks, chunk_source, 3))
+    assert sorted(store.shards) == ["a-0", "a-1", "b-0"]
+
+    store.replace_volumes(plan_shards(super_chunks("a.pdf", 2), chunk_source, 3))
+
+    assert sorted(store.shards) == ["a-0", "b-0"]
+    assert store.shard_report() == {"a-0": 2, "b-0": 3}
+    assert store_size(store) == 5
+
+
+def test_naive_shards_are_not_duplicated_across_restarts(sharded_models):
+    docs = [Document(page_content=f"page {i}", metadata={"source": "restart.pdf"}) for i in range(4)]
+    for _ in range(2):
+        store = create_sharded_store("naive", "fake", plan_shards(docs, chunk_source))
+        assert store_size(store) == 4
+        for shard in store.shards.values():
+            shard.client.close()
+
+
+def test_shared_query_embeddings_does_not_serialize_distinct_queries():
+    both_inside = threading.Barrier(2, timeout=5)
+
+    class BlockingEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return [self.embed_query(text) for text in texts]
+
+        def embed_query(self, text):
+            both_inside.wait()
+            return [float(len(text))]
+
+    embeddings = SharedQueryEmbeddings(BlockingEmbeddings())
+    threads = [threading.Thread(target=embeddings.embed_query, args=(text,)) for text in ("one", "three")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert not both_inside.broken
+    assert embeddings.embed_query("three") == [5.0]
+
+
+def test_merged_results_are_ranked_by_dense_cosine_similarity(sharded_models):
+    chunks = super_chunks("a.pdf", 5) + super_chunks("b.pdf", 5)
+    store = create_sharded_store("super", "fake", plan_shards(chunks, chunk_source))
+
+    results = store.similarity_search_with_score("b.pdf chunk 2", k=4)
+
+    query = sharded_models.embed_query("b.pdf chunk 2")
+    for document, score in results:
+        vector = sharded_models.embed_query(document.page_content)
+        expected = float(np.dot(vector, query) / (np.linalg.norm(vector) * np.linalg.norm(query)))
+        assert score == pytest.approx(expected, abs=1e-5)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+
+def test_rebuilding_a_naive_shard_removes_its_previous_folder(sharded_models):
+    docs = [Document(page_content=f"page {i}", metadata={"source": "folder.pdf"}) for i in range(3)]
+    store = create_sharded_store("naive", "fake", plan_shards(docs, chunk_source))
+    previous = store.shards["folder-0"].client._client.location
+
+    store.rebuild_shard("folder-0", docs[:2])
+
+    assert not os.path.exists(previous)
+    assert store_size(store) == 2
+    for shard in store.shards.values():
+        shard.client.close()
+
+
+def test_added_documents_go_to_the_shard_of_their_volume(sharded_models):
+    chunks = super_chunks("a.pdf", 4) + super_chunks("b.pdf", 1)
+    store = create_sharded_store("super", "fake", plan_shards(chunks, chunk_source))
+
+    store.add_documents([Document(page_content="a extra", metadata={"source": "a.pdf"}),
+                         Document(page_content="c new", metadata={"source": "c.pdf"})])
+
+    assert store.shard_report() == {"a-0": 5, "b-0": 1, "c-0": 1}
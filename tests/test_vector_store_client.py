@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_qdrant")
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.vector_store_client.vector_store_client import (LazyChunkView, LockedRetriever, ReadWriteLock,
+                                                          create_qdrant_store)
+
+
+class RecordingRetriever(BaseRetriever):
+    calls: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        self.calls.append(("read", time.perf_counter()))
+        return [Document(page_content=query)]
+
+
+def test_reads_wait_for_an_active_write():
+    lock = ReadWriteLock()
+    inner = RecordingRetriever(calls=[])
+    retriever = LockedRetriever(retriever=inner, lock=lock)
+
+    with lock.write():
+        reader = threading.Thread(target=retriever.invoke, args=("query",))
+        reader.start()
+        time.sleep(0.1)
+        assert inner.calls == []
+        write_end = time.perf_counter()
+    reader.join(timeout=5)
+    assert inner.calls and inner.calls[0][1] >= write_end
+
+
+def test_concurrent_reads_share_the_lock():
+    lock = ReadWriteLock()
+    inside = threading.Barrier(2, timeout=5)
+
+    def read():
+        with lock.read():
+            inside.wait()
+
+    threads = [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert not inside.broken
+
+
+def test_lazy_chunk_view_follows_corpus_order(fake_models):
+    chunks = [{"chunk_text": f"chunk {i}", "metadata": {"title": f"title {i}"}} for i in range(40)]
+    store = create_qdrant_store("fake", chunks, batch_size=7, embeddings=fake_models, collection_name="test_lazy")
+    view = LazyChunkView(store, "super", page_size=5)
+
+    texts = [chunk["chunk_text"] for chunk in chunks]
+    assert len(view) == 40
+    assert [chunk["chunk_text"] for chunk in view] == texts
+    assert [chunk["chunk_text"] for chunk in view[-3:]] == texts[-3:]
+    assert [chunk["chunk_text"] for chunk in view[5:20:4]] == texts[5:20:4]
+    assert view[-1]["chunk_text"] == "chunk 39"
+    assert view[12]["metadata"]["title"] == "title 12"